@@ -0,0 +1,111 @@
+import queue
+import socket
+import threading
+import time
+
+
+class LinkEmulator:
+    """
+    TCP proxy that delays the data going through it as a slow link would
+    (e.g. the radio link to a drone): each chunk of data takes the time to
+    transmit it at the given bandwidth (the link carries one chunk at a time in
+    each direction), and then half of the round-trip time to arrive
+
+    Example:
+        link = LinkEmulator(server.port, rtt_ms=80, bandwidth_kbps=2000)
+        link.start()
+        # ... connect to 127.0.0.1:link.port instead of server.port
+        link.stop()
+    """
+
+    chunk_size: int = 16384
+
+    def __init__(
+        self,
+        target_port: int,
+        rtt_ms: float = 0,
+        bandwidth_kbps: float = None,
+        host: str = "127.0.0.1",
+    ):
+        """
+        Parameters:
+            target_port (int): port on "host" to forward the connections to
+            rtt_ms (float, optional): round-trip time added by the link
+            bandwidth_kbps (float, optional): bandwidth of the link in each
+                direction, in kilobits per second (unlimited if None)
+            host (string, optional): address to listen on and forward to
+        """
+        self.target_port = target_port
+        self.rtt_ms = rtt_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.host = host
+        self.port: int = None
+
+        self._socket: socket.socket = None
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.bind((self.host, 0))
+        self._socket.listen(16)
+        self.port = self._socket.getsockname()[1]
+
+        threading.Thread(target=self._accept, name="LinkEmulator", daemon=True).start()
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _accept(self):
+        while self._socket is not None:
+            try:
+                client, _ = self._socket.accept()
+                server = socket.create_connection((self.host, self.target_port))
+            except OSError:
+                return
+
+            for source, destination in ((client, server), (server, client)):
+                self._forward(source, destination)
+
+    def _forward(self, source: socket.socket, destination: socket.socket):
+        # Chunks of data, with the time at which they arrive at the destination
+        in_transit: "queue.Queue" = queue.Queue()
+
+        def receive():
+            link_free_at = 0.0
+            while True:
+                try:
+                    data = source.recv(self.chunk_size)
+                except OSError:
+                    data = b""
+
+                now = time.monotonic()
+                if self.bandwidth_kbps:
+                    link_free_at = max(now, link_free_at) + len(data) * 8 / (
+                        self.bandwidth_kbps * 1000
+                    )
+                else:
+                    link_free_at = now
+                in_transit.put((link_free_at + self.rtt_ms / 2000, data))
+
+                if not data:
+                    return
+
+        def deliver():
+            while True:
+                arrival, data = in_transit.get()
+                delay = arrival - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                try:
+                    if not data:
+                        destination.shutdown(socket.SHUT_WR)
+                        return
+                    destination.sendall(data)
+                except OSError:
+                    source.close()
+                    return
+
+        threading.Thread(target=receive, daemon=True).start()
+        threading.Thread(target=deliver, daemon=True).start()
@@ -0,0 +1,304 @@
+import os
+import socket
+import subprocess
+import threading
+from typing import List
+
+import paramiko
+from paramiko import (
+    AUTH_SUCCESSFUL,
+    OPEN_SUCCEEDED,
+    SFTP_OK,
+    SFTPAttributes,
+    SFTPHandle,
+    SFTPServer,
+    SFTPServerInterface,
+)
+
+
+class StandInHandle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            SFTPServer.set_file_attr(self.filename, attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class StandInSFTP(SFTPServerInterface):
+    """
+    SFTP server on the local file system (relative paths start in the home
+    directory of the StandInServer)
+    """
+
+    def __init__(self, server, stand_in: "StandInServer", *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.home = stand_in.home
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.home, path)
+
+    def list_folder(self, path):
+        path = self._path(path)
+        try:
+            entries = []
+            for filename in os.listdir(path):
+                attributes = SFTPAttributes.from_stat(
+                    os.lstat(os.path.join(path, filename))
+                )
+                attributes.filename = filename
+                entries.append(attributes)
+            return entries
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(self._path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = self._path(path)
+        try:
+            fd = os.open(path, flags, 0o666)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+
+        handle = StandInHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._path(oldpath), self._path(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        return self.rename(oldpath, newpath)
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            SFTPServer.set_file_attr(self._path(path), attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.realpath(self._path(path))
+
+
+class StandInInterface(paramiko.ServerInterface):
+    def __init__(self, stand_in: "StandInServer"):
+        """
+        Accepts any user and any credentials, and runs the commands requested
+        through exec on the local computer
+        """
+        self.stand_in = stand_in
+
+    def get_allowed_auths(self, username):
+        return "none,publickey,password"
+
+    def check_auth_none(self, username):
+        return AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return AUTH_SUCCESSFUL
+
+    def check_auth_password(self, username, password):
+        return AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_env_request(self, channel, name, value):
+        return True
+
+    def check_global_request(self, kind, msg):
+        # Keepalives
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(
+            target=self.stand_in.run_command,
+            args=(channel, command.decode()),
+            daemon=True,
+        ).start()
+        return True
+
+
+class StandInServer:
+    """
+    SSH and SFTP server running in a thread, which runs the commands on the
+    local computer (with the given directory as home directory), to stand in
+    for a target device in the benchmarks
+
+    Example:
+        server = StandInServer("/tmp/home")
+        server.start()
+        # ... connect to 127.0.0.1:server.port
+        server.stop()
+    """
+
+    def __init__(self, home: str, host: str = "127.0.0.1", port: int = 0):
+        """
+        Parameters:
+            home (string): home directory of the commands and SFTP sessions
+            host (string, optional): address to listen on
+            port (int, optional): port to listen on (a free one if 0)
+        """
+        self.home = home
+        self.host = host
+        self.port = port
+
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.environment = {**os.environ, "HOME": home, "SHELL": "/bin/bash"}
+        self.environment.pop("TMUX", None)
+
+        self._socket: socket.socket = None
+        self._transports: List[paramiko.Transport] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(16)
+        self.port = self._socket.getsockname()[1]
+
+        threading.Thread(
+            target=self._accept, name="StandInServer", daemon=True
+        ).start()
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+
+    def _accept(self):
+        while self._socket is not None:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, StandInSFTP, self)
+            with self._lock:
+                self._transports.append(transport)
+            try:
+                transport.start_server(server=StandInInterface(self))
+            except (paramiko.SSHException, EOFError):
+                transport.close()
+
+    def run_command(self, channel: paramiko.Channel, command: str):
+        """
+        Runs a command requested through exec, forwarding its input, output,
+        error output and exit status through the channel
+        """
+        process = subprocess.Popen(
+            ["/bin/bash", "-c", command],
+            cwd=self.home,
+            env=self.environment,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        def forward_output(source, send):
+            while True:
+                data = os.read(source.fileno(), 32768)
+                if not data:
+                    break
+                try:
+                    send(data)
+                except (OSError, EOFError, paramiko.SSHException):
+                    # The channel was closed: stop the command
+                    process.kill()
+                    break
+
+        def forward_input():
+            try:
+                while True:
+                    data = channel.recv(32768)
+                    if not data:
+                        break
+                    process.stdin.write(data)
+                    process.stdin.flush()
+            except (OSError, EOFError, ValueError):
+                pass
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+        threading.Thread(target=forward_input, daemon=True).start()
+        forwarders = [
+            threading.Thread(
+                target=forward_output, args=(process.stdout, channel.sendall)
+            ),
+            threading.Thread(
+                target=forward_output, args=(process.stderr, channel.sendall_stderr)
+            ),
+        ]
+        for forwarder in forwarders:
+            forwarder.start()
+        for forwarder in forwarders:
+            forwarder.join()
+
+        try:
+            channel.send_exit_status(process.wait())
+            channel.close()
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
@@ -0,0 +1,535 @@
+#!/usr/bin/env python
+"""
+Benchmarks of the operations of BirdWatch on the target device, run against a
+local stand-in for the device (an SSH and SFTP server running the commands on
+this computer), optionally behind an emulated slow link
+
+Example:
+    python benchmarks/run_benchmarks.py --rtt-ms 80 --bandwidth-kbps 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, os.path.join(REPOSITORY_DIR, "src"))
+
+import yaml
+
+# Imported before the settings, as in the app
+import Widgets.ThemedCtkWidgets  # noqa: F401
+from DeviceConfig.Device import Device, Files
+from FileManager import FileManager as fm
+from Metrics import Metrics
+from NetworkSelector import NetworkSelector
+from SessionPool import PooledConnection, SessionPool
+from Settings import Settings
+from ShellCommands import ShellCommands as sh
+from ShellCommands import TmuxPaneCommand
+
+from LinkEmulator import LinkEmulator
+from StandInServer import StandInServer
+
+
+class Benchmark:
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], None],
+        setup: Callable[[], None] = None,
+        teardown: Callable[[], None] = None,
+        gui: bool = False,
+    ):
+        """
+        Operation to time
+
+        Parameters:
+            name (string): unique name of the benchmark
+            run (Callable): operation timed in each repetition
+            setup (Callable, optional): called before each repetition (not timed)
+            teardown (Callable, optional): called after each repetition (not timed)
+            gui (bool, optional): whether the operation needs a window
+        """
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.gui = gui
+
+    def measure(self, repeat: int, warmup: int) -> dict:
+        """
+        Runs the operation several times
+
+        Returns:
+            dictionary: median, minimum and maximum time of the runs (in seconds),
+                and median of the requests sent to the device per run
+        """
+        durations = []
+        requests = []
+        for iteration in range(warmup + repeat):
+            if self.setup is not None:
+                self.setup()
+
+            Metrics.reset()
+            start = time.perf_counter()
+            try:
+                self.run()
+                duration = time.perf_counter() - start
+                run_requests = sum(stats.requests for stats in Metrics.stats())
+            finally:
+                if self.teardown is not None:
+                    self.teardown()
+
+            if iteration >= warmup:
+                durations.append(duration)
+                requests.append(run_requests)
+
+        return {
+            "median_s": round(statistics.median(durations), 6),
+            "min_s": round(min(durations), 6),
+            "max_s": round(max(durations), 6),
+            "requests": statistics.median(requests),
+        }
+
+
+class StandInDevice:
+    """
+    Target device whose files are in a scratch directory of this computer,
+    served by a StandInServer (behind a LinkEmulator if the link is slow)
+    """
+
+    username = "birdwatch"
+
+    # Size of the generated files
+    listed_files: int = 500
+    recordings: int = 20
+    files_per_recording: int = 5
+    recording_file_size: int = 256 * 1024
+    copied_file_size: int = 4 * 1024 * 1024
+
+    def __init__(self, rtt_ms: float = 0, bandwidth_kbps: float = None):
+        self.home = tempfile.mkdtemp(prefix="birdwatch-benchmark-")
+        self.rtt_ms = rtt_ms
+        self.bandwidth_kbps = bandwidth_kbps
+
+        self.server = StandInServer(self.home)
+        self.link: LinkEmulator = None
+        self.device: Device = None
+
+    def start(self):
+        # The SSH client authenticates with a key of the scratch home, and the
+        # tmux sessions of the benchmarks use their own server
+        os.environ["HOME"] = self.home
+        os.environ["TMUX_TMPDIR"] = self.home
+        os.environ.pop("TMUX", None)
+
+        self.create_files()
+        self.server.start()
+        port = self.server.port
+        if self.rtt_ms or self.bandwidth_kbps:
+            self.link = LinkEmulator(
+                self.server.port, rtt_ms=self.rtt_ms, bandwidth_kbps=self.bandwidth_kbps
+            )
+            self.link.start()
+            port = self.link.port
+        PooledConnection.ssh_port = port
+        NetworkSelector.ssh_port = port
+
+        self.device = Device(
+            "StandIn",
+            {
+                "files": {
+                    "workspace_path": "~/ws/",
+                    "nodes": "nodes.yaml",
+                    "topics": "topics.yaml",
+                    "recordings": "~/recordings/",
+                    "missions": "~/missions/",
+                    "parameters": "~/parameters/",
+                },
+                "ssh_connection": {
+                    "username": self.username,
+                    "networks": [{"name": "StandIn", "ip": "127.0.0.1"}],
+                },
+            },
+        )
+        # The paths in the home of the user are in the scratch home instead
+        user_home = f"/home/{self.username}/"
+        files = self.device.files
+        files.workspace_path = files.workspace_path.replace(user_home, self.home + "/")
+        for path in vars(files).values():
+            if isinstance(path, Files.Path):
+                path.path = path.path.replace(user_home, self.home + "/")
+
+        Settings.target_devices = [self.device]
+        Settings.current_device = self.device
+        Settings.current_network = self.device.ssh_config.networks[0]
+
+    def stop(self):
+        SessionPool.close_all()
+        if self.link is not None:
+            self.link.stop()
+        self.server.stop()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def create_files(self):
+        import paramiko
+
+        ssh_dir = os.path.join(self.home, ".ssh")
+        os.makedirs(ssh_dir)
+        paramiko.RSAKey.generate(2048).write_private_key_file(
+            os.path.join(ssh_dir, "id_rsa")
+        )
+
+        # tmux configuration expected on the target devices (see the README)
+        with open(self.path(".tmux.conf"), "w") as tmux_conf:
+            tmux_conf.write(
+                "set-option -g base-index 1\nset-window-option -g pane-base-index 1\n"
+            )
+
+        test_files = os.path.join(REPOSITORY_DIR, "test_files")
+        os.makedirs(os.path.join(self.home, "ws"))
+        shutil.copy(os.path.join(test_files, "topics.yaml"), self.path("ws/topics.yaml"))
+        shutil.copy(os.path.join(test_files, "nodes.yaml"), self.path("ws/nodes.yaml"))
+        shutil.copytree(os.path.join(test_files, "parameters"), self.path("parameters"))
+        os.makedirs(self.path("missions"))
+
+        os.makedirs(self.path("listed"))
+        for index in range(self.listed_files):
+            with open(self.path(f"listed/file_{index:04d}.txt"), "w") as file:
+                file.write(f"{index}\n")
+            if index % 10 == 0:
+                os.makedirs(self.path(f"listed/directory_{index:04d}"))
+
+        # ROS 2 bags: a directory per recording
+        for recording in range(self.recordings):
+            directory = self.path(f"recordings/rosbag2_{recording:02d}")
+            os.makedirs(directory)
+            for index in range(self.files_per_recording):
+                with open(os.path.join(directory, f"bag_{index}.db3"), "wb") as file:
+                    file.write(os.urandom(self.recording_file_size))
+
+        with open(self.path("copied.bin"), "wb") as file:
+            file.write(os.urandom(self.copied_file_size))
+
+    def path(self, path: str) -> str:
+        return os.path.join(self.home, path)
+
+
+class BenchmarkSuite:
+    def __init__(self, device: StandInDevice, with_gui: bool = True):
+        """
+        Benchmarks of the operations on the target device that are slow on a
+        slow link
+
+        Parameters:
+            device (StandInDevice): device the benchmarks operate on
+            with_gui (bool, optional): whether to run the benchmarks that need a
+                window
+        """
+        self.device = device
+        self.with_gui = with_gui
+        self.root = None
+        # Reason why the benchmarks that need a window are skipped
+        self.gui_unavailable: str = None if with_gui else "disabled"
+
+        self.benchmarks: List[Benchmark] = [
+            Benchmark("launch_tmux", self.launch_tmux, teardown=self.stop_tmux),
+            Benchmark(
+                "list_contents",
+                lambda: fm.list_contents(self.device.path("listed/")),
+            ),
+            Benchmark(
+                "get_directory_content_size",
+                lambda: fm.get_directory_content_size(self.device.path("recordings/")),
+            ),
+            Benchmark(
+                "copy_file",
+                lambda: fm.copy_file(
+                    self.device.path("copied.bin"), self.device.path("copy.bin")
+                ),
+                teardown=lambda: os.remove(self.device.path("copy.bin")),
+            ),
+            Benchmark(
+                "get_files",
+                self.get_recordings,
+                teardown=lambda: shutil.rmtree(self.device.path("downloaded")),
+            ),
+            Benchmark(
+                "send_file",
+                lambda: fm.send_file(
+                    self.device.path("copied.bin"), self.device.path("sent/copied.bin")
+                ),
+                teardown=lambda: shutil.rmtree(self.device.path("sent")),
+            ),
+            Benchmark("topics_load_file", self.open_topics, gui=True),
+            Benchmark("multi_parameter_list", self.open_parameters, gui=True),
+            Benchmark("backup_recordings_window", self.open_backup_window, gui=True),
+        ]
+
+    def run(self, repeat: int, warmup: int, only: List[str] = None) -> Dict[str, dict]:
+        """
+        Runs the benchmarks
+
+        Parameters:
+            repeat (int): timed runs of each benchmark
+            warmup (int): runs of each benchmark before the timed ones
+            only (list[string], optional): names of the benchmarks to run (all if
+                not given)
+
+        Returns:
+            dictionary: results of each benchmark run, by name
+        """
+        results = {}
+        for benchmark in self.benchmarks:
+            if only and benchmark.name not in only:
+                continue
+            if benchmark.gui and not self.start_gui():
+                print(f"{benchmark.name}: skipped ({self.gui_unavailable})")
+                continue
+
+            results[benchmark.name] = benchmark.measure(repeat, warmup)
+            print(
+                f"{benchmark.name}: {results[benchmark.name]['median_s'] * 1000:.1f} ms, "
+                + f"{results[benchmark.name]['requests']:g} requests"
+            )
+
+        if self.root is not None:
+            self.root.destroy()
+            self.root = None
+        return results
+
+    def start_gui(self) -> bool:
+        # Creates the root window the first time (returns False if not possible)
+        if self.root is not None:
+            return True
+        if self.gui_unavailable is not None:
+            return False
+
+        try:
+            import customtkinter as ctk
+
+            from AsyncManager import AsyncManager
+
+            self.root = ctk.CTk()
+            self.root.withdraw()
+            Settings.set_root_app(self.root)
+            AsyncManager.start(self.root)
+        except Exception as e:
+            self.gui_unavailable = f"no window available: {e}"
+            return False
+        return True
+
+    def wait_for(self, condition: Callable[[], bool], timeout_s: float = 60):
+        # Processes the events of the GUI until the condition is met
+        deadline = time.monotonic() + timeout_s
+        while not condition():
+            if time.monotonic() > deadline:
+                raise TimeoutError("The GUI did not finish loading in time")
+            self.root.update()
+            time.sleep(0.001)
+
+    def get_recordings(self):
+        # Every file of the recordings, to the local device
+        files = []
+        for directory, _, names in os.walk(self.device.path("recordings")):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative_path = os.path.relpath(path, self.device.home)
+                files.append((path, self.device.path(f"downloaded/{relative_path}")))
+        fm.get_files(files)
+
+    def launch_tmux(self):
+        # The nodes of the test nodes file, each one waiting instead of running
+        with open(self.device.path("ws/nodes.yaml")) as nodes_file:
+            nodes: dict = yaml.safe_load(nodes_file)
+        commands = [
+            TmuxPaneCommand("sleep 600", node.get("window", name))
+            for name, node in sorted(nodes.items(), key=lambda item: int(item[1]["order"]))
+        ]
+        sh.launch_tmux(commands, auto_attach=False)
+
+    def stop_tmux(self):
+        sh.stop_tmux()
+
+    def open_topics(self):
+        from TabViews.RecordTopicsTabView import TopicsFrame
+
+        TopicsFrame(self.root).destroy()
+
+    def open_parameters(self):
+        from Widgets.MultiParameterList import MultiParameterList
+
+        parameters_path = Settings.current_device.files.parameters.path
+        MultiParameterList(
+            self.root, parameters_path + "default/", parameters_path
+        ).destroy()
+
+    def open_backup_window(self):
+        from TabViews.RecordTopicsTabView import backupRecordingsWindow
+
+        # As when clicking "View recordings"
+        recordings = [
+            entry
+            for entry in fm.scandir(Settings.current_device.files.recordings.path)
+            if entry.is_dir
+        ]
+        window = backupRecordingsWindow(self.root, recordings)
+        # Until the sizes of all the recordings are shown
+        self.wait_for(
+            lambda: not any(
+                "(...)" in checkbox.cget("text") for checkbox in window.bagfiles
+            )
+        )
+        window.destroy()
+
+
+class Baseline:
+    def __init__(self, path: str):
+        """
+        Results of previous runs of the benchmarks, by link profile (as the
+        times depend on the emulated link)
+
+        Parameters:
+            path (string): path of the JSON file with the results
+        """
+        self.path = path
+        self.profiles: Dict[str, Dict[str, dict]] = {}
+        if os.path.exists(path):
+            with open(path) as baseline_file:
+                self.profiles = json.load(baseline_file).get("profiles", {})
+
+    @staticmethod
+    def profile(rtt_ms: float, bandwidth_kbps: float) -> str:
+        return f"rtt={rtt_ms:g}ms,bandwidth=" + (
+            f"{bandwidth_kbps:g}kbps" if bandwidth_kbps else "unlimited"
+        )
+
+    def save(self, profile: str, results: Dict[str, dict]):
+        self.profiles[profile] = {**self.profiles.get(profile, {}), **results}
+        with open(self.path, "w") as baseline_file:
+            json.dump({"profiles": self.profiles}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+
+    def compare(
+        self,
+        profile: str,
+        results: Dict[str, dict],
+        tolerance: float,
+        slack_ms: float = 5,
+    ) -> List[str]:
+        """
+        Compares the results with the baseline of the same profile
+
+        Parameters:
+            profile (string): link profile of the results
+            results (dictionary): results of each benchmark, by name
+            tolerance (float): fraction by which the median time can be slower
+                than in the baseline
+            slack_ms (float, optional): time by which the median can be slower
+                regardless of the tolerance (for very fast benchmarks)
+
+        Returns:
+            list[string]: description of each regression
+        """
+        baseline = self.profiles.get(profile, {})
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            reference = baseline[name]
+            limit_s = reference["median_s"] * (1 + tolerance) + slack_ms / 1000
+            if result["median_s"] > limit_s:
+                regressions.append(
+                    f"{name}: {result['median_s'] * 1000:.1f} ms, baseline "
+                    + f"{reference['median_s'] * 1000:.1f} ms"
+                )
+            # The requests do not depend on the load of the computer
+            if result["requests"] > reference["requests"]:
+                regressions.append(
+                    f"{name}: {result['requests']:g} requests, baseline "
+                    + f"{reference['requests']:g}"
+                )
+        return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the operations of BirdWatch on a local stand-in for the target device"
+    )
+    parser.add_argument(
+        "--rtt-ms", type=float, default=0, help="Round-trip time added by the emulated link"
+    )
+    parser.add_argument(
+        "--bandwidth-kbps",
+        type=float,
+        default=None,
+        help="Bandwidth of the emulated link in each direction (unlimited if not given)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs of each benchmark")
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Runs of each benchmark before the timed ones"
+    )
+    parser.add_argument(
+        "--only", nargs="+", default=None, help="Names of the benchmarks to run"
+    )
+    parser.add_argument(
+        "--no-gui", action="store_true", help="Skip the benchmarks that need a window"
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=os.path.join(BENCHMARKS_DIR, "baseline.json"),
+        help="File with the results to compare with",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the baseline instead of comparing with it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Fraction by which a benchmark can be slower than the baseline",
+    )
+    args = parser.parse_args()
+
+    device = StandInDevice(rtt_ms=args.rtt_ms, bandwidth_kbps=args.bandwidth_kbps)
+    device.start()
+    try:
+        results = BenchmarkSuite(device, with_gui=not args.no_gui).run(
+            args.repeat, args.warmup, args.only
+        )
+    finally:
+        device.stop()
+
+    baseline = Baseline(args.baseline)
+    profile = Baseline.profile(args.rtt_ms, args.bandwidth_kbps)
+    if args.save_baseline:
+        baseline.save(profile, results)
+        print(f"Baseline for {profile} saved to {args.baseline}")
+        return
+
+    if profile not in baseline.profiles:
+        print(f"No baseline for {profile} (run with --save-baseline to store one)")
+        return
+
+    regressions = baseline.compare(profile, results, args.tolerance)
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import asyncio
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Coroutine
+
+from LogManager import LogManager
+
+
+class AsyncManager:
+    """
+    Runs an asyncio event loop in a dedicated thread, on which the asynchronous
+    API of ShellCommands and FileManager (e.g. "await sh.aexecute(command)") is
+    run, and delivers the results back to the Tk main thread
+
+    Example:
+        async def load():
+            return await asyncio.gather(
+                sh.aexecute("ros2 node list"),
+                fm.alist_directories("~/"),
+            )
+
+        AsyncManager.deliver(
+            widget, load(), lambda result: label.configure(text=result[0])
+        )
+    """
+
+    loop: asyncio.AbstractEventLoop = None
+    executor: ThreadPoolExecutor = None
+    root = None
+
+    # Number of blocking remote calls that can run at the same time
+    max_workers: int = 4
+
+    _thread: threading.Thread = None
+    _tk_callbacks: "queue.Queue" = queue.Queue()
+    _tk_poll_interval_ms: int = 50
+
+    @classmethod
+    def start(cls, root=None):
+        """
+        Starts the event loop thread (if not yet running)
+
+        Parameters:
+            root (optional): Tk root widget on which the results are delivered. If
+                not given, results can only be awaited but not delivered to widgets
+        """
+        if cls.loop is None:
+            cls.loop = asyncio.new_event_loop()
+            cls.executor = ThreadPoolExecutor(
+                max_workers=cls.max_workers, thread_name_prefix="BirdWatchAsync"
+            )
+            cls.loop.set_default_executor(cls.executor)
+
+            cls._thread = threading.Thread(
+                target=cls._run_loop, name="BirdWatchEventLoop", daemon=True
+            )
+            cls._thread.start()
+
+        if root is not None and cls.root is None:
+            cls.root = root
+            cls.root.after(cls._tk_poll_interval_ms, cls._process_tk_callbacks)
+
+    @classmethod
+    def _run_loop(cls):
+        asyncio.set_event_loop(cls.loop)
+        cls.loop.run_forever()
+
+    @classmethod
+    def stop(cls):
+        """
+        Stops the event loop thread
+        """
+        if cls.loop is not None:
+            cls.loop.call_soon_threadsafe(cls.loop.stop)
+            cls._thread.join(timeout=2)
+            cls.executor.shutdown(wait=False)
+            cls.loop = None
+            cls.executor = None
+            cls._thread = None
+        cls.root = None
+
+    @classmethod
+    def submit(cls, coroutine: Coroutine) -> Future:
+        """
+        Schedules a coroutine on the event loop from any thread. The coroutine
+        runs with a copy of the context variables of the calling thread (e.g. the
+        device set with "ShellCommands.on_device")
+
+        Parameters:
+            coroutine (Coroutine): coroutine to run
+
+        Returns:
+            concurrent.futures.Future: future with the result of the coroutine
+        """
+        cls.start()
+        future = Future()
+
+        def copy_result(task: asyncio.Task):
+            if future.cancelled():
+                return
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def create_task():
+            # The task copies the context in which it is created
+            cls.loop.create_task(coroutine).add_done_callback(copy_result)
+
+        cls.loop.call_soon_threadsafe(
+            create_task, context=contextvars.copy_context()
+        )
+        return future
+
+    @classmethod
+    async def run_blocking(cls, function: Callable, *args, **kwargs) -> Any:
+        """
+        Runs a blocking function in the worker threads of the event loop (with
+        the context variables of the calling task)
+
+        Parameters:
+            function (Callable): function to run
+            args, kwargs: arguments for the function
+
+        Returns:
+            The value returned by the function
+        """
+        return await cls.loop.run_in_executor(
+            cls.executor,
+            partial(contextvars.copy_context().run, function, *args, **kwargs),
+        )
+
+    @classmethod
+    def deliver(
+        cls,
+        widget,
+        coroutine: Coroutine,
+        on_result: Callable[[Any], Any],
+        on_error: Callable[[Exception], Any] = None,
+    ) -> Future:
+        """
+        Runs a coroutine on the event loop and calls "on_result" with its result
+        (or "on_error" with the exception raised) in the Tk main thread. Nothing is
+        called if the widget was destroyed in the meantime
+
+        Parameters:
+            widget: widget for which the result is meant
+            coroutine (Coroutine): coroutine to run
+            on_result (Callable): function called with the result
+            on_error (Callable, optional): function called with the exception. If
+                not given, the error is logged
+
+        Returns:
+            concurrent.futures.Future: future with the result of the coroutine
+        """
+        future = cls.submit(coroutine)
+        future.add_done_callback(
+            lambda future: cls.call_in_tk(
+                cls._deliver_result, widget, future, on_result, on_error
+            )
+        )
+        return future
+
+    @classmethod
+    def call_in_tk(cls, function: Callable, *args):
+        """
+        Calls a function in the Tk main thread (can be called from any thread)
+
+        Parameters:
+            function (Callable): function to call
+            args: arguments for the function
+        """
+        cls._tk_callbacks.put((function, args))
+
+    @classmethod
+    def _deliver_result(
+        cls,
+        widget,
+        future: Future,
+        on_result: Callable[[Any], Any],
+        on_error: Callable[[Exception], Any],
+    ):
+        if future.cancelled():
+            return
+        if widget is not None and not widget.winfo_exists():
+            return
+
+        error = future.exception()
+        if error is None:
+            on_result(future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            LogManager.error(f"Asynchronous remote call failed: {error}")
+
+    @classmethod
+    def _process_tk_callbacks(cls):
+        while True:
+            try:
+                function, args = cls._tk_callbacks.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                function(*args)
+            except Exception as e:
+                LogManager.exception(f"Error delivering asynchronous result: {e}")
+
+        if cls.root is not None:
+            cls.root.after(cls._tk_poll_interval_ms, cls._process_tk_callbacks)
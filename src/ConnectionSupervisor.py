@@ -0,0 +1,373 @@
+import enum
+import threading
+import time
+import weakref
+from typing import Dict, List
+
+from LogManager import LogManager
+from SessionPool import PooledConnection, SessionPool
+from Settings import Settings
+from SSHMaster import SSHMaster
+
+
+class LinkState(enum.Enum):
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    # Waiting for the next attempt to reconnect
+    RECONNECTING = "reconnecting"
+
+
+class LinkStatus:
+    def __init__(self, device_name: str):
+        """
+        Health of the SSH link to a device, as seen by the ConnectionSupervisor
+
+        Parameters:
+            device_name (string): name of the device
+        """
+        self.device_name = device_name
+        self.state = LinkState.DISCONNECTED
+
+        # Round-trip times of the last probe and smoothed over the last ones
+        self.rtt_ms: float = None
+        self.smoothed_rtt_ms: float = None
+
+        self.last_error: str = ""
+
+        # Consecutive probes that got no answer while nothing else was received
+        self.missed_probes: int = 0
+
+        # Time (as given by time.monotonic) of the next attempt to reconnect
+        self.retry_at: float = None
+        self.backoff_s: float = 0
+
+    def update_rtt(self, rtt_ms: float):
+        self.rtt_ms = rtt_ms
+        if self.smoothed_rtt_ms is None:
+            self.smoothed_rtt_ms = rtt_ms
+        else:
+            # Same smoothing as the TCP round-trip time estimation
+            self.smoothed_rtt_ms += (rtt_ms - self.smoothed_rtt_ms) / 8
+
+    def __str__(self):
+        if self.state == LinkState.CONNECTED and self.smoothed_rtt_ms is not None:
+            return f"{self.device_name}: connected ({self.smoothed_rtt_ms:.0f} ms)"
+        if self.state == LinkState.RECONNECTING and self.retry_at is not None:
+            return (
+                f"{self.device_name}: reconnecting in "
+                + f"{max(0, self.retry_at - time.monotonic()):.0f} s"
+            )
+        return f"{self.device_name}: {self.state.value}"
+
+
+class ConnectionSupervisor:
+    """
+    Watches the SSH links to the devices in the background: it measures the
+    round-trip time of each open connection every "keepalive_interval_s" seconds
+    (which also keeps the link active), and when the link to the current device
+    drops, it reconnects with an exponential backoff. Commands issued while it
+    is reconnecting wait for its attempt instead of each one starting its own
+
+    Example:
+        ConnectionSupervisor.start()
+        print(ConnectionSupervisor.status(Settings.current_device.name))
+    """
+
+    # Minimum seconds to wait for the answer to a probe. On slow links the wait
+    # grows with the round-trip time, since the answers queue behind other data
+    probe_timeout_s: float = 5
+    probe_timeout_rtts: float = 4
+
+    # Consecutive unanswered probes (with no other data received) after which a
+    # link is considered dead
+    max_missed_probes: int = 3
+
+    # Limits of the time between attempts to reconnect
+    min_backoff_s: float = 1
+    max_backoff_s: float = 30
+
+    _statuses: Dict[str, LinkStatus] = {}
+    _condition = threading.Condition()
+
+    _thread: threading.Thread = None
+    # Probes still waiting for their answer, by connection
+    _pending_probes: "weakref.WeakKeyDictionary[PooledConnection, tuple]" = (
+        weakref.WeakKeyDictionary()
+    )
+    _stop_event = threading.Event()
+    _wake_event = threading.Event()
+
+    @classmethod
+    def start(cls):
+        """
+        Starts supervising the links in a background thread (if not yet running)
+        """
+        if cls.is_running():
+            return
+
+        cls._stop_event.clear()
+        cls._thread = threading.Thread(
+            target=cls._run, name="BirdWatchSupervisor", daemon=True
+        )
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        """
+        Stops supervising the links
+        """
+        cls._stop_event.set()
+        cls._wake_event.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout=2)
+            cls._thread = None
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._thread is not None and cls._thread.is_alive()
+
+    @classmethod
+    def status(cls, device_name: str) -> LinkStatus:
+        """
+        Returns the status of the link to a device
+        """
+        with cls._condition:
+            return cls._statuses.setdefault(device_name, LinkStatus(device_name))
+
+    @classmethod
+    def reconnect_now(cls, device_name: str):
+        """
+        Makes the next attempt to reconnect to a device without waiting for the
+        backoff time
+        """
+        with cls._condition:
+            status = cls._statuses.get(device_name)
+            if status is not None and status.state == LinkState.RECONNECTING:
+                status.retry_at = time.monotonic()
+        cls._wake_event.set()
+
+    @classmethod
+    def report_failure(cls, device, error: Exception):
+        """
+        Tells the supervisor that the connection to a device failed (e.g. when a
+        command could not be run), so that it reconnects right away
+        """
+        if not cls.is_running():
+            return
+
+        with cls._condition:
+            status = cls._statuses.setdefault(device.name, LinkStatus(device.name))
+            if status.state == LinkState.CONNECTED:
+                # The commands wait for the supervisor to reconnect
+                status.state = LinkState.CONNECTING
+                status.last_error = str(error)
+        cls._wake_event.set()
+
+    @classmethod
+    def wait_for_connection(cls, device, timeout_s: float = 20):
+        """
+        If the supervisor is reconnecting to a device, waits for its attempt to
+        finish. Fails right away if it is waiting for the next attempt, so that
+        the GUI does not block while the device is unreachable
+
+        Parameters:
+            device (Device): device to wait for
+            timeout_s (float, optional): maximum time to wait
+
+        Raises:
+            ConnectionError: if there is no connection to the device
+        """
+        if not cls.is_running():
+            return
+
+        deadline = time.monotonic() + timeout_s
+        with cls._condition:
+            status = cls._statuses.get(device.name)
+            if status is None:
+                return
+
+            while status.state == LinkState.CONNECTING:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                cls._condition.wait(remaining)
+
+            if status.state in (LinkState.CONNECTING, LinkState.RECONNECTING):
+                raise ConnectionError(f"{status} ({status.last_error})")
+
+    @classmethod
+    def _run(cls):
+        while not cls._stop_event.is_set():
+            devices = cls._supervised_devices()
+
+            # Check all the devices at the same time, so that a dead link does not
+            # delay the others
+            threads = [
+                threading.Thread(target=cls._check, args=(device,), daemon=True)
+                for device in devices
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            SessionPool.evict_idle()
+
+            cls._wake_event.wait(Settings.keepalive_interval_s)
+            cls._wake_event.clear()
+
+    @classmethod
+    def _supervised_devices(cls) -> List:
+        # The current device is reconnected if its link drops; the others are only
+        # watched while they have an open connection
+        devices = {
+            connection.device.name: connection.device
+            for connection in SessionPool.connections()
+        }
+        if Settings.is_ssh_config_set():
+            devices[Settings.current_device.name] = Settings.current_device
+        return list(devices.values())
+
+    @classmethod
+    def _check(cls, device):
+        status = cls.status(device.name)
+        connection = SessionPool.peek(device)
+        is_current = (
+            Settings.is_ssh_config_set() and Settings.current_device.name == device.name
+        )
+
+        if connection is not None:
+            try:
+                rtt_ms = cls._probe(connection, status)
+            except Exception as e:
+                with cls._condition:
+                    status.missed_probes += 1
+                    missed_probes = status.missed_probes
+                if connection.is_alive() and (
+                    missed_probes < cls.max_missed_probes
+                    or connection.has_open_channels()
+                ):
+                    # Give the link more chances, and never cut off the commands
+                    # and transfers still running on it
+                    LogManager.warning(f"No answer from {device.name}: {e}")
+                    return
+
+                LogManager.warning(f"Lost connection to {device.name}: {e}")
+                SessionPool.discard(connection)
+                with cls._condition:
+                    status.state = LinkState.CONNECTING
+                    status.last_error = str(e)
+                    status.missed_probes = 0
+                    status.rtt_ms = None
+                    status.smoothed_rtt_ms = None
+            else:
+                # The connection to the current device is kept open while supervised,
+                # and its master connection for terminals is started ahead of time
+                if is_current:
+                    connection.last_used = time.monotonic()
+                    SSHMaster.start(device)
+
+                with cls._condition:
+                    status.missed_probes = 0
+                    if rtt_ms is not None:
+                        status.update_rtt(rtt_ms)
+                    if status.state != LinkState.CONNECTED:
+                        status.state = LinkState.CONNECTED
+                        status.backoff_s = 0
+                        cls._condition.notify_all()
+                return
+
+        with cls._condition:
+            if not is_current:
+                status.state = LinkState.DISCONNECTED
+                cls._condition.notify_all()
+                return
+            if status.state == LinkState.RECONNECTING and time.monotonic() < status.retry_at:
+                return
+            status.state = LinkState.CONNECTING
+
+        try:
+            SessionPool.get(device)
+        except Exception as e:
+            with cls._condition:
+                cls._set_reconnecting(
+                    status,
+                    str(e),
+                    backoff_s=min(
+                        max(status.backoff_s * 2, cls.min_backoff_s), cls.max_backoff_s
+                    ),
+                )
+                cls._condition.notify_all()
+            return
+
+        with cls._condition:
+            status.state = LinkState.CONNECTED
+            status.backoff_s = 0
+            status.last_error = ""
+            cls._condition.notify_all()
+
+    @classmethod
+    def _set_reconnecting(cls, status: LinkStatus, error: str, backoff_s: float):
+        # Must be called holding the condition
+        status.state = LinkState.RECONNECTING
+        status.last_error = error
+        status.backoff_s = backoff_s
+        status.retry_at = time.monotonic() + backoff_s
+        status.rtt_ms = None
+        status.smoothed_rtt_ms = None
+
+    @classmethod
+    def _probe(cls, connection: PooledConnection, status: LinkStatus) -> float:
+        """
+        Measures the round-trip time of a connection with a request that the
+        server answers right away. A probe that is not answered in time is kept
+        waiting for the next check instead of sending another one
+
+        Returns:
+            float: round-trip time in milliseconds, or None if the answer did not
+            arrive in time but other data was received meanwhile (e.g. a transfer
+            that the answer is queued behind)
+
+        Raises:
+            ConnectionError: if the connection is closed
+            TimeoutError: if nothing was received from the device
+        """
+        transport = connection.client.get_transport()
+        if transport is None or not transport.is_active():
+            raise ConnectionError("Connection closed")
+
+        with cls._condition:
+            probe = cls._pending_probes.get(connection)
+            if probe is None:
+                result = {}
+                answered = threading.Event()
+
+                def send_probe():
+                    start = time.monotonic()
+                    # Unknown requests are answered with a failure, which is enough
+                    # to measure the round-trip time
+                    transport.global_request("keepalive@openssh.com", wait=True)
+                    result["rtt_ms"] = (time.monotonic() - start) * 1000
+                    answered.set()
+
+                probe = cls._pending_probes[connection] = (answered, result)
+                threading.Thread(target=send_probe, daemon=True).start()
+            timeout_s = cls.probe_timeout_s
+            if status.smoothed_rtt_ms is not None:
+                timeout_s = max(
+                    timeout_s, cls.probe_timeout_rtts * status.smoothed_rtt_ms / 1000
+                )
+
+        answered, result = probe
+        wait_start = time.monotonic()
+        if answered.wait(timeout_s) and transport.is_active():
+            with cls._condition:
+                cls._pending_probes.pop(connection, None)
+            return result["rtt_ms"]
+
+        if not transport.is_active():
+            raise ConnectionError("Connection closed")
+        if connection.last_received >= wait_start:
+            return None
+        raise TimeoutError(f"Nothing received in {timeout_s:.0f} s")
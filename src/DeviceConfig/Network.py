@@ -5,6 +5,9 @@ class Network:
     def __init__(self, name: str, ip: str):
         self.update(name, ip)
 
+        # Round-trip time measured when connecting (None if unknown or unreachable)
+        self.rtt_ms: float = None
+
     def update(self, name: str = None, ip: str = None):
         if name is None:
             name = self.name
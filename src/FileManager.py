@@ -1,35 +1,154 @@
+import os
+import shlex
 import shutil
 import stat
+import tempfile
 from pathlib import Path
 from paramiko.sftp_client import SFTPClient
+from paramiko.ssh_exception import SSHException
 from paramiko.sftp_attr import SFTPAttributes
 from os import stat_result
+import threading
 import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from AsyncManager import AsyncManager
+from LogManager import LogManager
+from Metrics import MeteredSFTPClient, Metrics
+from SessionPool import PooledConnection
+from ShellCommands import CommandError
 from ShellCommands import ShellCommands as sh
-from Settings import Settings
-from typing import Union
+from TransferEngine import FileTransfer, TransferEngine
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+
+class DirectoryEntry:
+    def __init__(self, name: str, kind: str, size: int, mtime: float, mode: int):
+        """
+        Element of a directory, with its attributes as returned by the listing of
+        the directory (without a call per element)
+
+        Parameters:
+            name (string): name of the element
+            kind (string): "file", "directory" or "other" (symbolic links are
+                followed)
+            size (int): size in bytes
+            mtime (float): time of the last modification
+            mode (int): type and permissions (as "st_mode")
+        """
+        self.name = name
+        self.kind = kind
+        self.size = size
+        self.mtime = mtime
+        self.mode = mode
+
+    @property
+    def is_file(self) -> bool:
+        return self.kind == "file"
+
+    @property
+    def is_dir(self) -> bool:
+        return self.kind == "directory"
+
+    @staticmethod
+    def kind_of(mode: int) -> str:
+        if stat.S_ISREG(mode):
+            return "file"
+        elif stat.S_ISDIR(mode):
+            return "directory"
+        return "other"
+
+    @classmethod
+    def from_attributes(
+        cls, name: str, attributes: Union[SFTPAttributes, stat_result]
+    ) -> "DirectoryEntry":
+        return cls(
+            name,
+            cls.kind_of(attributes.st_mode or 0),
+            attributes.st_size or 0,
+            attributes.st_mtime or 0,
+            attributes.st_mode or 0,
+        )
+
+    def __repr__(self):
+        return f"DirectoryEntry({self.name!r}, {self.kind}, {self.size} B)"
 
 
 class FileManager:
-    sftp: SFTPClient = None
-    _cancel_function: bool = None
+    # Cancellation events of the operations running, set by "cancel_function"
+    _cancel_events: Set[threading.Event] = set()
+    _cancel_events_lock = threading.Lock()
+
+    # Exit code of the command of "get_directory_content_size" when the target
+    # device has no GNU find
+    NO_GNU_FIND_EXIT_CODE: int = 3
+
+    # Files added up on the target device between reports of the running total
+    # of "get_directory_content_size"
+    size_progress_files: int = 1000
+    # Threads listing local directories at the same time
+    size_walk_workers: int = 8
+
+    # SFTP clients of the worker threads of the asynchronous API (one per
+    # thread and connection)
+    _thread_data = threading.local()
+
+    # Directories known to exist in each remote device, by name of the device, to
+    # skip creating them again. They are forgotten when deleted or renamed from
+    # here, and created again when writing to them fails (e.g. if they were
+    # removed from outside)
+    _known_directories: Dict[str, Set[str]] = {}
+    _known_directories_lock = threading.Lock()
 
     @classmethod
     def establish(cls):
-        if sh.ssh is None:
-            sh.establish_ssh()
-        cls.sftp = sh.ssh.open_sftp()
-
-        # Get the home directory
-        stdin, stdout, stderr = sh.ssh.exec_command("echo ~/")
-        cls.home_dir = stdout.read().decode("utf-8").strip()
+        """
+        Opens the SFTP client of the target device
+        """
+        cls.get_sftp()
 
     @classmethod
     def close(cls):
-        if cls.sftp is not None:
-            cls.sftp.close()
-            cls.sftp = None
-            cls.home_dir = None
+        """
+        Closes the SFTP client of the target device
+        """
+        if sh.is_remote():
+            sh.get_connection().close_sftp()
+
+    @classmethod
+    def get_connection(cls) -> PooledConnection:
+        """
+        Returns the connection to the target device to use from the current
+        thread: the one of the asynchronous API in its worker threads, and the
+        main one otherwise
+        """
+        if getattr(cls._thread_data, "sftp_clients", None) is None:
+            return sh.get_connection()
+        return sh.get_connection("async")
+
+    @classmethod
+    def get_sftp(cls) -> SFTPClient:
+        """
+        Returns the SFTP client to use from the current thread for the target
+        device. The worker threads of the asynchronous API have their own clients,
+        as an SFTP client cannot wait for responses from several threads at the
+        same time
+
+        Returns:
+            SFTPClient: SFTP client connected to the target device
+        """
+        sftp_clients = getattr(cls._thread_data, "sftp_clients", None)
+        if sftp_clients is None:
+            return sh.get_connection().get_sftp()
+
+        connection = cls.get_connection()
+        sftp = sftp_clients.get(connection)
+        if sftp is None or sftp.sock.closed:
+            sftp = MeteredSFTPClient.from_transport(
+                connection.client.get_transport()
+            )
+            sftp_clients[connection] = sftp
+        return sftp
 
     @classmethod
     def normalize_path(
@@ -49,11 +168,10 @@ class FileManager:
         if isinstance(path, Path):
             path = str(path)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Normalize the path for the remote device
-            if hasattr(cls, "home_dir"):
-                if path.startswith("~/"):
-                    return path.replace("~/", cls.home_dir, 1)
+            if path.startswith("~/"):
+                return path.replace("~/", sh.environment().home_dir, 1)
         else:
             # Normalize the path for the local device
             if not hasattr(cls, "local_home_dir"):
@@ -65,6 +183,57 @@ class FileManager:
         return path
 
     @classmethod
+    @Metrics.measure("fm.scandir")
+    def scandir(cls, path: str, force_local: bool = False) -> List[DirectoryEntry]:
+        """
+        Lists the contents of a directory with their type, size and modification
+        time, from a single listing of the directory (instead of getting the
+        attributes of each element separately)
+
+        Parameters:
+            path (string): Path of the directory to list
+            force_local (bool, optional): If True, lists the contents of the local directory
+
+        Returns:
+            list[DirectoryEntry]: Contents of the directory, sorted by modification time
+        """
+        path = cls.normalize_path(path, force_local=force_local)
+        entries = []
+
+        if sh.is_remote() and not force_local:
+            sftp = cls.get_sftp()
+
+            for attributes in sftp.listdir_attr(path):
+                name = attributes.filename
+
+                # The listing does not follow symbolic links
+                if stat.S_ISLNK(attributes.st_mode or 0):
+                    try:
+                        attributes = sftp.stat(f"{path}/{name}")
+                    except OSError:
+                        # Broken link
+                        pass
+                entries.append(DirectoryEntry.from_attributes(name, attributes))
+        else:
+            with os.scandir(path) as elements:
+                for element in elements:
+                    try:
+                        entries.append(
+                            DirectoryEntry.from_attributes(element.name, element.stat())
+                        )
+                    except OSError:
+                        # Broken link
+                        entries.append(
+                            DirectoryEntry.from_attributes(
+                                element.name, element.stat(follow_symlinks=False)
+                            )
+                        )
+
+        entries.sort(key=lambda entry: entry.mtime)
+        return entries
+
+    @classmethod
+    @Metrics.measure("fm.list_contents")
     def list_contents(cls, path: str, type: str = None, force_local: bool = False):
         """
         Lists the contents of a directory
@@ -74,64 +243,17 @@ class FileManager:
             type (string, optional): Type of content to list. Can be "files", "directories" or None (in which case all contents are listed)
             force_local (bool, optional): If True, lists the contents of the local directory
         """
-        path = cls.normalize_path(path, force_local=force_local)
+        entries = cls.scandir(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
-            # Try to list the contents of the directory in the remote device
-            try:
-                if cls.sftp is None:
-                    cls.establish()
-
-                # Get content and sort by modification time
-                contents = cls.sftp.listdir_attr(path)
-                contents.sort(key=lambda x: x.st_mtime)
-                contents = [elem.filename for elem in contents]
-
-                if type == "files":
-                    return [
-                        file
-                        for file in contents
-                        if stat.S_ISREG(cls.sftp.stat(f"{path}/{file}").st_mode)
-                    ]
-                elif type == "directories":
-                    return [
-                        dir
-                        for dir in contents
-                        if stat.S_ISDIR(cls.sftp.stat(f"{path}/{dir}").st_mode)
-                    ]
-                else:
-                    return contents
-
-            except Exception as e:
-                raise e
+        if type == "files":
+            return [entry.name for entry in entries if entry.is_file]
+        elif type == "directories":
+            return [entry.name for entry in entries if entry.is_dir]
         else:
-            try:
-                contents = sorted(
-                    (p for p in Path(path).iterdir()),
-                    key=lambda x: x.stat().st_mtime if x.exists() else 0,
-                )
-
-                if type == "files":
-                    return [
-                        file.name
-                        # Check if the element is a file
-                        for file in contents
-                        if file.is_file()
-                    ]
-                elif type == "directories":
-                    return [
-                        # Check if the element is a directory
-                        dir.name
-                        for dir in contents
-                        if dir.is_dir()
-                    ]
-                else:
-                    # List all contents
-                    return [elem.name for elem in list(Path(path).iterdir())]
-            except Exception as e:
-                raise e
+            return [entry.name for entry in entries]
 
     @classmethod
+    @Metrics.measure("fm.list_files")
     def list_files(cls, path: str, force_local: bool = False):
         """
         Lists the files in a directory
@@ -143,6 +265,7 @@ class FileManager:
         return cls.list_contents(path, type="files", force_local=force_local)
 
     @classmethod
+    @Metrics.measure("fm.list_directories")
     def list_directories(cls, path: str, force_local: bool = False):
         """
         Lists the directories in a directory
@@ -154,6 +277,7 @@ class FileManager:
         return cls.list_contents(path, type="directories", force_local=force_local)
 
     @classmethod
+    @Metrics.measure("fm.exists")
     def exists(cls, path: str, force_local: bool = False):
         """
         Checks if a file or directory exists
@@ -164,13 +288,12 @@ class FileManager:
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Check if the file or directory exists in the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
+                sftp = cls.get_sftp()
 
-                cls.sftp.stat(path)
+                sftp.stat(path)
                 return True
             except FileNotFoundError:
                 return False
@@ -187,6 +310,7 @@ class FileManager:
                 raise e
 
     @classmethod
+    @Metrics.measure("fm.read_file")
     def read_file(cls, path: str, as_binary: bool = False, force_local: bool = False):
         """
         Opens a file
@@ -198,14 +322,13 @@ class FileManager:
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Try to open the file in the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
+                sftp = cls.get_sftp()
 
                 # Open the file
-                file = cls.sftp.open(path, "r")
+                file = sftp.open(path, "r")
 
                 # Read the content
                 if as_binary:
@@ -233,6 +356,7 @@ class FileManager:
         return content
 
     @classmethod
+    @Metrics.measure("fm.write_file")
     def write_file(cls, path: str, content, force_local: bool = False):
         """
         Writes content to a file
@@ -244,17 +368,19 @@ class FileManager:
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Try to write the file in the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
-
-                # Ensure the destination directory exists
-                cls.mkdir(str(Path(path).parent))
+                sftp = cls.get_sftp()
+                directory = str(Path(path).parent)
 
-                # Open the file
-                file = cls.sftp.open(path, "w")
+                # Open the file, creating its directory only if it does not exist
+                try:
+                    file = sftp.open(path, "w")
+                except FileNotFoundError:
+                    cls._make_missing_directory(directory)
+                    file = sftp.open(path, "w")
+                cls._remember_directory(directory)
 
                 # Write the content
                 file.write(content)
@@ -276,6 +402,7 @@ class FileManager:
                 raise e
 
     @classmethod
+    @Metrics.measure("fm.delete_file")
     def delete_file(cls, path: str, force_local: bool = False):
         """
         Deletes a file
@@ -286,14 +413,14 @@ class FileManager:
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Try to delete the file in the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
+                sftp = cls.get_sftp()
 
                 # Delete the file
-                cls.sftp.remove(path)
+                cls._forget_directory(path)
+                sftp.remove(path)
             except Exception as e:
                 raise e
         else:
@@ -304,6 +431,7 @@ class FileManager:
                 raise e
 
     @classmethod
+    @Metrics.measure("fm.delete_directory")
     def delete_directory(
         cls, path: str, force: bool = False, force_local: bool = False
     ):
@@ -316,57 +444,86 @@ class FileManager:
             force_local (bool, optional): If True, deletes the directory in the local device
         """
         path = cls.normalize_path(path, force_local=force_local)
+        if not path.strip("/"):
+            raise Exception(f"Refusing to delete '{path}'")
 
-        # Check the directories content
-        dir_contents = cls.list_contents(path, force_local=force_local)
-
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Try to delete the directory in the remote device
+            cls._forget_directory(path)
             try:
-                if cls.sftp is None:
-                    cls.establish()
-
-                if dir_contents:
-                    # If the directory is not empty, check if force is True
-                    if force:
-                        # Delete the contents of the directory
-                        for element in dir_contents:
-                            if stat.S_ISDIR(cls.sftp.stat(f"{path}/{element}").st_mode):
-                                cls.delete_directory(
-                                    f"{path}/{element}", force=True, force_local=False
-                                )
-                            else:
-                                cls.sftp.remove(f"{path}/{element}")
-                    else:
-                        raise Exception("Directory is not empty")
-
-                # Delete the directory
-                cls.sftp.rmdir(path)
+                if force:
+                    # Delete the directory and its contents in a single call
+                    cls._remote_delete_tree(path)
+                    return
 
+                sftp = cls.get_sftp()
+                try:
+                    sftp.rmdir(path)
+                except FileNotFoundError:
+                    raise
+                except IOError:
+                    if sftp.listdir(path):
+                        raise Exception("Directory is not empty")
+                    raise
             except Exception as e:
                 raise e
         else:
             try:
-                if dir_contents:
-                    # If the directory is not empty, check if force is True
-                    if force:
-                        # Delete the contents of the directory
-                        for element in dir_contents:
-                            if Path(f"{path}/{element}").is_dir():
-                                cls.delete_directory(
-                                    f"{path}/{element}", force=True, force_local=True
-                                )
-                            else:
-                                Path(f"{path}/{element}").unlink()
-                    else:
-                        raise Exception("Directory is not empty")
-
-                # Delete the directory
-                Path(path).rmdir()
+                if force:
+                    # Delete the directory and its contents
+                    shutil.rmtree(path)
+                elif any(Path(path).iterdir()):
+                    raise Exception("Directory is not empty")
+                else:
+                    # Delete the directory
+                    Path(path).rmdir()
             except Exception as e:
                 raise e
 
     @classmethod
+    def _remote_delete_tree(cls, path: str):
+        """
+        Deletes a directory of the remote device and its contents with "rm -rf",
+        or with SFTP (from the listing of each directory, without getting the
+        attributes of each element) if the command can not be run
+        """
+        quoted_path = shlex.quote(path)
+        try:
+            output = sh.execute(
+                f"if [ -d {quoted_path} ]; then rm -rf -- {quoted_path}; "
+                + "else echo missing; fi"
+            )
+            if output.strip() == "missing":
+                raise FileNotFoundError(f"No such directory: '{path}'")
+            return
+        except CommandError as e:
+            # Errors of the removal itself are not retried
+            if str(e).lstrip().startswith("rm:"):
+                raise
+            error = e
+        except SSHException as e:
+            error = e
+        LogManager.warning(
+            f"Could not delete {path} in the remote device ({str(error).strip()}), "
+            + "deleting it with SFTP"
+        )
+        cls._sftp_delete_tree(path)
+
+    @classmethod
+    def _sftp_delete_tree(cls, path: str):
+        # The attributes of the listing are the ones of the symbolic links
+        # themselves, so the directories they point to are not entered
+        sftp = cls.get_sftp()
+        for attributes in sftp.listdir_attr(path):
+            element_path = f"{path.rstrip('/')}/{attributes.filename}"
+            if stat.S_ISDIR(attributes.st_mode or 0):
+                cls._sftp_delete_tree(element_path)
+            else:
+                sftp.remove(element_path)
+        sftp.rmdir(path)
+
+    @classmethod
+    @Metrics.measure("fm.mkdir")
     def mkdir(cls, path: str, force_local: bool = False):
         """
         Creates a directory
@@ -377,25 +534,22 @@ class FileManager:
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
-            # Try to create the directory in the remote device
-            try:
-                if cls.sftp is None:
-                    cls.establish()
-
-                # Check if the parent directory exists before creating it
-                try:
-                    cls.sftp.stat(str(Path(path).parent))
-                except FileNotFoundError:
-                    cls.mkdir(str(Path(path).parent))
+        if sh.is_remote() and not force_local:
+            # Directories already created or written to are not checked again
+            if cls._is_known_directory(path):
+                return
 
-                # Check if the directory exists before creating it
-                try:
-                    cls.sftp.stat(path)
-                except FileNotFoundError:
-                    cls.sftp.mkdir(path)
-            except Exception as e:
-                raise e
+            # Try to create the directory and its parents in a single call
+            try:
+                sh.execute(f"mkdir -p -- {shlex.quote(path)}")
+            except CommandError as e:
+                # Errors of the creation itself are not retried
+                if str(e).lstrip().startswith("mkdir:"):
+                    raise
+                cls._remote_mkdir(path)
+            except SSHException:
+                cls._remote_mkdir(path)
+            cls._remember_directory(path)
         else:
             try:
                 Path(path).mkdir(parents=True, exist_ok=True)
@@ -403,6 +557,64 @@ class FileManager:
                 raise e
 
     @classmethod
+    def _remote_mkdir(cls, path: str):
+        """
+        Creates a directory of the remote device and its parents with SFTP,
+        checking the parents only if the directory can not be created
+        """
+        sftp = cls.get_sftp()
+        try:
+            sftp.mkdir(path)
+        except FileNotFoundError:
+            cls._remote_mkdir(str(Path(path).parent))
+            sftp.mkdir(path)
+        except IOError:
+            # The directory (or a file with its name) already exists
+            if not stat.S_ISDIR(sftp.stat(path).st_mode):
+                raise
+
+    @classmethod
+    def _device_directories(cls) -> Set[str]:
+        # Directories known to exist in the target device
+        device_name = sh.target_device().name
+        with cls._known_directories_lock:
+            return cls._known_directories.setdefault(device_name, set())
+
+    @classmethod
+    def _is_known_directory(cls, path: str) -> bool:
+        directories = cls._device_directories()
+        with cls._known_directories_lock:
+            return str(Path(path)) in directories
+
+    @classmethod
+    def _remember_directory(cls, path: str):
+        # Its parents exist too
+        directories = cls._device_directories()
+        path = Path(path)
+        with cls._known_directories_lock:
+            while str(path) not in directories and path != path.parent:
+                directories.add(str(path))
+                path = path.parent
+
+    @classmethod
+    def _forget_directory(cls, path: str):
+        # Also the directories inside it
+        directories = cls._device_directories()
+        path = str(Path(path))
+        prefix = path.rstrip("/") + "/"
+        with cls._known_directories_lock:
+            for directory in list(directories):
+                if directory == path or directory.startswith(prefix):
+                    directories.discard(directory)
+
+    @classmethod
+    def _make_missing_directory(cls, path: str):
+        # Creates a directory that was known to exist but no longer does
+        cls._forget_directory(path)
+        cls.mkdir(path)
+
+    @classmethod
+    @Metrics.measure("fm.rename")
     def rename(cls, old_path: str, new_path: str, force_local: bool = False):
         """
         Renames a file or directory
@@ -415,14 +627,16 @@ class FileManager:
         old_path = cls.normalize_path(old_path, force_local=force_local)
         new_path = cls.normalize_path(new_path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Try to rename the file or directory in the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
+                sftp = cls.get_sftp()
 
-                # Rename the file or directory
-                cls.sftp.rename(old_path, new_path)
+                # Rename the file or directory (the one replaced, if any, no
+                # longer has the same contents)
+                cls._forget_directory(old_path)
+                cls._forget_directory(new_path)
+                sftp.rename(old_path, new_path)
             except Exception as e:
                 raise e
         else:
@@ -433,6 +647,7 @@ class FileManager:
                 raise e
 
     @classmethod
+    @Metrics.measure("fm.copy_file")
     def copy_file(
         cls,
         src: str,
@@ -452,36 +667,35 @@ class FileManager:
         src = cls.normalize_path(src, force_local=force_local)
         dest = cls.normalize_path(dest, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
-            # Try to copy the file in the remote device
+        if sh.is_remote() and not force_local:
+            if keep_original:
+                # Copy the file in the remote device itself
+                cls._remote_copy(src, dest)
+                return
+
+            # Try to move the file in the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
+                sftp = cls.get_sftp()
 
                 # Ensure the destination directory exists
                 cls.mkdir(str(Path(dest).parent))
 
-                if keep_original:
-                    # Create local copy of the file
-                    cls.sftp.get(src, "/tmp/tmpfile")
-
-                    # Copy the local file to the destination
-                    cls.sftp.put("/tmp/tmpfile", dest)
-
-                    # Remove the local copy
-                    Path("/tmp/tmpfile").unlink()
-
-                else:
-                    # Check if destination file exists
-                    try:
-                        cls.sftp.stat(dest)
-                        # If it exists, remove it
-                        cls.sftp.remove(dest)
-                    except FileNotFoundError:
-                        pass
+                # Check if destination file exists
+                try:
+                    sftp.stat(dest)
+                    # If it exists, remove it
+                    sftp.remove(dest)
+                except FileNotFoundError:
+                    pass
 
-                    # Copy the file
-                    cls.sftp.rename(src, dest)
+                # Move the file
+                cls._forget_directory(src)
+                try:
+                    sftp.rename(src, dest)
+                except FileNotFoundError:
+                    # The destination directory was removed after it was created
+                    cls._make_missing_directory(str(Path(dest).parent))
+                    sftp.rename(src, dest)
 
             except Exception as e:
                 raise e
@@ -501,8 +715,108 @@ class FileManager:
                 raise e
 
     @classmethod
+    @Metrics.measure("fm.copy_directory")
+    def copy_directory(cls, src: str, dest: str, force_local: bool = False):
+        """
+        Copies a directory and its contents. If the destination directory already
+        exists, the contents are copied into it
+
+        Parameters:
+            src (string): Path of the directory to copy
+            dest (string): Path of the destination directory
+            force_local (bool, optional): If True, copies the directory in the local device
+        """
+        src = cls.normalize_path(src, force_local=force_local)
+        dest = cls.normalize_path(dest, force_local=force_local)
+
+        if sh.is_remote() and not force_local:
+            # Copy the directory in the remote device itself
+            cls._remote_copy(src, dest, recursive=True)
+        else:
+            shutil.copytree(src, dest, dirs_exist_ok=True)
+
+    @classmethod
+    def _remote_copy(cls, src: str, dest: str, recursive: bool = False):
+        """
+        Copies a file (or a directory, if recursive) in the remote device with
+        "cp", so the data does not go through the link. With "--reflink=auto" the
+        copy shares the blocks of the original on filesystems that support it
+        (e.g. Btrfs, XFS), which makes it immediate. If "cp" can not be run, the
+        data is got into a temporary directory of this computer and sent back
+        """
+        if recursive:
+            # The contents of the directory are copied into the destination
+            source = shlex.quote(src.rstrip("/") + "/.")
+            directory = shlex.quote(dest)
+            flags = "-R "
+        else:
+            source = shlex.quote(src)
+            directory = shlex.quote(str(Path(dest).parent))
+            flags = ""
+        target = shlex.quote(dest)
+        command = (
+            f"mkdir -p -- {directory} && "
+            + f"{{ cp {flags}--reflink=auto -- {source} {target} 2>/dev/null || "
+            + f"cp {flags}-- {source} {target}; }}"
+        )
+
+        try:
+            sh.execute(command)
+            return
+        except CommandError as e:
+            # Errors of the copy itself (e.g. a missing source) are not retried
+            if str(e).lstrip().startswith(("cp:", "mkdir:")):
+                raise
+            error = e
+        except SSHException as e:
+            error = e
+        LogManager.warning(
+            f"Could not copy {src} in the remote device ({str(error).strip()}), "
+            + "copying it through this computer"
+        )
+
+        # Each copy uses its own temporary directory
+        with tempfile.TemporaryDirectory(prefix="birdwatch-copy-") as temp_dir:
+            if not recursive:
+                temp_path = os.path.join(temp_dir, Path(src).name)
+                cls.get_files([(src, temp_path)])
+                cls.send_files([(temp_path, dest)])
+                return
+
+            files = []
+            directories = [""]
+            while directories:
+                relative_dir = directories.pop()
+                cls.mkdir(os.path.join(dest, relative_dir))
+                for entry in cls.scandir(os.path.join(src, relative_dir)):
+                    relative_path = os.path.join(relative_dir, entry.name)
+                    if entry.is_dir:
+                        directories.append(relative_path)
+                    elif entry.is_file:
+                        files.append(relative_path)
+
+            cls.get_files(
+                [
+                    (os.path.join(src, path), os.path.join(temp_dir, path))
+                    for path in files
+                ]
+            )
+            cls.send_files(
+                [
+                    (os.path.join(temp_dir, path), os.path.join(dest, path))
+                    for path in files
+                ]
+            )
+
+    @classmethod
+    @Metrics.measure("fm.send_file")
     def send_file(
-        cls, src: str, dest: str, keep_original: bool = True, force_local: bool = False
+        cls,
+        src: str,
+        dest: str,
+        keep_original: bool = True,
+        force_local: bool = False,
+        on_progress: Callable[[FileTransfer], None] = None,
     ):
         """
         Sends a file to the remote device
@@ -512,45 +826,80 @@ class FileManager:
             dest (string): Path of the destination file in the remote device
             keep_original (bool, optional): If True, keeps the original file
             force_local (bool, optional): If True, sends the file to the local device
+            on_progress (function, optional): see "TransferEngine"
         """
-        src = cls.normalize_path(src, force_local=True)
-        dest = cls.normalize_path(dest, force_local=force_local)
+        if sh.is_remote() and not force_local:
+            cls.send_files(
+                [(src, dest)], keep_original=keep_original, on_progress=on_progress
+            )
+        else:
+            src = cls.normalize_path(src, force_local=True)
+            dest = cls.normalize_path(dest, force_local=True)
 
-        # Copy the file to the remote device
-        if Settings.is_ssh_config_set() and not force_local:
-            # Try to send the file to the remote device
-            try:
-                if cls.sftp is None:
-                    cls.establish()
+            # Copy the file to the destination
+            cls.copy_file(src, dest, keep_original=keep_original, force_local=True)
 
-                # Ensure the destination directory exists
-                cls.mkdir(str(Path(dest).parent))
+    @classmethod
+    @Metrics.measure("fm.send_files")
+    def send_files(
+        cls,
+        files: List[Tuple[str, str]],
+        keep_original: bool = True,
+        on_progress: Callable[[FileTransfer], None] = None,
+    ) -> List[FileTransfer]:
+        """
+        Sends several files to the remote device at the same time (see
+        "TransferEngine"). An interrupted transfer continues where it stopped
+        the next time the same file is sent
 
-                # Check if destination file exists
-                try:
-                    cls.sftp.stat(dest)
-                    # If it exists, remove it
-                    cls.sftp.remove(dest)
-                except FileNotFoundError:
-                    pass
+        Parameters:
+            files (list[tuple[string, string]]): Local path of each file to send
+                and path of its destination in the remote device
+            keep_original (bool, optional): If True, keeps the original files
+            on_progress (function, optional): see "TransferEngine"
 
-                # Send the file
-                cls.sftp.put(src, dest)
-            except Exception as e:
-                raise e
-        else:
-            # Copy the file to the destination
-            try:
-                cls.copy_file(src, dest, keep_original=keep_original, force_local=True)
-            except Exception as e:
-                raise e
+        Returns:
+            list[FileTransfer]: transfer of each file
 
-        # Remove the original file
+        Raises:
+            Exception: if a file could not be sent (once the others were)
+        """
+        if not sh.is_remote():
+            raise Exception("No SSH configuration set")
+
+        files = [
+            (cls.normalize_path(src, force_local=True), cls.normalize_path(dest))
+            for src, dest in files
+        ]
+
+        # Ensure the destination directories exist
+        for directory in sorted({str(Path(dest).parent) for _, dest in files}):
+            cls.mkdir(directory)
+
+        transfers = TransferEngine(
+            files,
+            upload=True,
+            on_progress=on_progress,
+            connection=cls.get_connection(),
+            make_directory=cls._make_missing_directory,
+        ).run()
+
+        # Remove the original files
         if not keep_original:
-            Path(src).unlink()
+            for src, _ in files:
+                Path(src).unlink()
+
+        return transfers
 
     @classmethod
-    def get_file(cls, src: str, dest: str, keep_original: bool = True):
+    @Metrics.measure("fm.get_file")
+    def get_file(
+        cls,
+        src: str,
+        dest: str,
+        keep_original: bool = True,
+        on_progress: Callable[[FileTransfer], None] = None,
+    ):
         """
         Gets a file from the remote device
 
@@ -558,27 +907,66 @@ class FileManager:
             src (string): Path of the file in the remote device
             dest (string): Local path of the destination file
             keep_original (bool, optional): If True, keeps the original file
+            on_progress (function, optional): see "TransferEngine"
         """
-        if not Settings.is_ssh_config_set():
-            raise Exception("No SSH configuration set")
+        cls.get_files(
+            [(src, dest)], keep_original=keep_original, on_progress=on_progress
+        )
 
-        if cls.sftp is None:
-            cls.establish()
+    @classmethod
+    @Metrics.measure("fm.get_files")
+    def get_files(
+        cls,
+        files: List[Tuple[str, str]],
+        keep_original: bool = True,
+        on_progress: Callable[[FileTransfer], None] = None,
+    ) -> List[FileTransfer]:
+        """
+        Gets several files from the remote device at the same time (see
+        "TransferEngine"). An interrupted transfer continues where it stopped
+        the next time the same file is got
 
-        # Ensure the destination directory exists
-        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        Parameters:
+            files (list[tuple[string, string]]): Path of each file in the remote
+                device and local path of its destination
+            keep_original (bool, optional): If True, keeps the original files
+            on_progress (function, optional): see "TransferEngine"
+
+        Returns:
+            list[FileTransfer]: transfer of each file
 
-        src = cls.normalize_path(src)
-        dest = cls.normalize_path(dest, force_local=True)
+        Raises:
+            Exception: if a file could not be got (once the others were)
+        """
+        if not sh.is_remote():
+            raise Exception("No SSH configuration set")
 
-        # Get the file
-        cls.sftp.get(src, dest)
+        files = [
+            (cls.normalize_path(src), cls.normalize_path(dest, force_local=True))
+            for src, dest in files
+        ]
 
-        # Remove the original file
+        # Ensure the destination directories exist
+        for _, dest in files:
+            Path(dest).parent.mkdir(parents=True, exist_ok=True)
+
+        transfers = TransferEngine(
+            files,
+            upload=False,
+            on_progress=on_progress,
+            connection=cls.get_connection(),
+        ).run()
+
+        # Remove the original files
         if not keep_original:
-            cls.sftp.remove(src)
+            sftp = cls.get_sftp()
+            for src, _ in files:
+                sftp.remove(src)
+
+        return transfers
 
     @classmethod
+    @Metrics.measure("fm.get_attributes")
     def get_attributes(
         cls, path: str, force_local: bool = False, human_readable: bool = False
     ) -> Union[SFTPAttributes, stat_result, dict]:
@@ -597,13 +985,12 @@ class FileManager:
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
+        if sh.is_remote() and not force_local:
             # Get the file attributes from the remote device
             try:
-                if cls.sftp is None:
-                    cls.establish()
+                sftp = cls.get_sftp()
 
-                stats = cls.sftp.stat(path)
+                stats = sftp.stat(path)
 
             except Exception as e:
                 raise e
@@ -641,14 +1028,7 @@ class FileManager:
         stats_dict["mode"] = stat.filemode(attributes.st_mode)
 
         # Convert the size to human readable format
-        if attributes.st_size < 1024:
-            stats_dict["size"] = f"{attributes.st_size} B"
-        elif attributes.st_size < 1024**2:
-            stats_dict["size"] = f"{attributes.st_size / 1024:.2f} KB"
-        elif attributes.st_size < 1024**3:
-            stats_dict["size"] = f"{attributes.st_size / 1024 ** 2:.2f} MB"
-        else:
-            stats_dict["size"] = f"{attributes.st_size / 1024 ** 3:.2f} GB"
+        stats_dict["size"] = cls.format_size(attributes.st_size)
 
         # Add the user ID to the dictionary
         stats_dict["uid"] = attributes.st_uid
@@ -664,7 +1044,22 @@ class FileManager:
 
         return stats_dict
 
+    @staticmethod
+    def format_size(size: int) -> str:
+        """
+        Converts a size in bytes to human readable format (e.g. "1.23 MB")
+        """
+        if size < 1024:
+            return f"{size} B"
+        elif size < 1024**2:
+            return f"{size / 1024:.2f} KB"
+        elif size < 1024**3:
+            return f"{size / 1024 ** 2:.2f} MB"
+        else:
+            return f"{size / 1024 ** 3:.2f} GB"
+
     @classmethod
+    @Metrics.measure("fm.get_file_size")
     def get_file_size(
         cls, path: str, force_local: bool = False, human_readable: bool = False
     ) -> Union[int, str]:
@@ -689,8 +1084,13 @@ class FileManager:
             ).st_size
 
     @classmethod
+    @Metrics.measure("fm.get_directory_content_size")
     def get_directory_content_size(
-        cls, path: str, force_local: bool = False, human_readable: bool = False
+        cls,
+        path: str,
+        force_local: bool = False,
+        human_readable: bool = False,
+        cancel_event: threading.Event = None,
     ) -> Union[int, str]:
         """
         Gets the size of the contents of a directory
@@ -699,63 +1099,308 @@ class FileManager:
             path (string): Path of the directory to get the size from
             force_local (bool, optional): If True, gets the size of the contents of the directory in the local device
             human_readable (bool, optional): If True, returns the size in human readable format
+            cancel_event (threading.Event, optional): If given, setting it cancels this operation only (otherwise, only "cancel_function" cancels it)
 
         Returns:
             int or string: Size of the contents of the directory. If human_readable is True, the size is returned in human readable format (e.g. "1.23 MB"), else the size is returned in bytes (int)
         """
         path = cls.normalize_path(path, force_local=force_local)
 
-        if Settings.is_ssh_config_set() and not force_local:
-            try:
-                if cls.sftp is None:
-                    cls.establish()
-            except Exception as e:
-                raise e
-
-        cls._cancel_function = False
-        size = 0
+        if cancel_event is None:
+            cancel_event = threading.Event()
+        with cls._cancel_events_lock:
+            cls._cancel_events.add(cancel_event)
 
-        # Get the size of the contents of the directory in the remote device
-        for file in cls.list_files(path, force_local=force_local):
-            if cls._cancel_function is True:
-                cls._cancel_function = None
-                raise Exception("Operation cancelled")
-            size += cls.get_file_size(f"{path}/{file}", force_local=force_local)
-
-        # Get the size of the contents of the directory
-        for directory in cls.list_directories(path, force_local=force_local):
-            if cls._cancel_function is True:
-                cls._cancel_function = None
-                raise Exception("Operation cancelled")
-            try:
-                size += cls.get_directory_content_size(
-                    f"{path}/{directory}", force_local=force_local
-                )
-            except Exception as e:
-                raise e
+        try:
+            # Computed on the device itself in a single call, or walking the local
+            # directories in parallel
+            if sh.is_remote() and not force_local:
+                size = cls._remote_directory_content_size(path, cancel_event)
+            else:
+                size = cls._local_directory_content_size(path, cancel_event)
+        finally:
+            with cls._cancel_events_lock:
+                cls._cancel_events.discard(cancel_event)
 
         if human_readable:
-            if size < 1024:
-                return f"{size} B"
-            elif size < 1024**2:
-                return f"{size / 1024:.2f} KB"
-            elif size < 1024**3:
-                return f"{size / 1024 ** 2:.2f} MB"
-            else:
-                return f"{size / 1024 ** 3:.2f} GB"
+            return cls.format_size(size)
         else:
             return size
 
+    @staticmethod
+    def _check_cancelled(cancel_event: threading.Event):
+        if cancel_event.is_set():
+            raise Exception("Operation cancelled")
+
+    @classmethod
+    def _remote_directory_content_size(
+        cls, path: str, cancel_event: threading.Event
+    ) -> int:
+        """
+        Adds up the sizes of the files under a directory of the target device
+        (following symbolic links) with a single command. The running total is
+        printed every "size_progress_files" files, so that the operation can be
+        cancelled while it runs. Without GNU find (e.g. on busybox), the
+        directories are listed through SFTP instead
+        """
+        quoted_path = shlex.quote(path)
+        # GNU find is detected on "/" so that a missing directory fails right away
+        # instead of being listed through SFTP
+        command = (
+            f"if ! find / -maxdepth 0 -printf '' 2>/dev/null; then "
+            + f"exit {cls.NO_GNU_FIND_EXIT_CODE}; fi; "
+            + f"find -L {quoted_path} -maxdepth 0 > /dev/null || exit 1; "
+            + f"find -L {quoted_path} -type f -printf '%s\\n' 2>/dev/null"
+            + " | awk '{ size += $1 }"
+            + f" NR % {cls.size_progress_files} == 0"
+            + ' { printf "%.0f\\n", size; fflush() }'
+            + ' END { printf "%.0f\\n", size }\''
+        )
+
+        size = None
+        with sh.execute_stream(command) as process:
+            for line in process:
+                cls._check_cancelled(cancel_event)
+                if line.strip():
+                    size = int(line)
+
+        if process.exit_code == cls.NO_GNU_FIND_EXIT_CODE:
+            return cls._sftp_directory_content_size(path, cancel_event)
+        if process.exit_code != 0 or size is None:
+            raise CommandError(
+                process.stderr or f"Could not get the size of {path}"
+            )
+        return size
+
+    @classmethod
+    def _sftp_directory_content_size(
+        cls, path: str, cancel_event: threading.Event
+    ) -> int:
+        """
+        Adds up the sizes of the files under a directory of the target device
+        (following symbolic links), listing each directory through SFTP
+        """
+        sftp = cls.get_sftp()
+        size = 0
+        # Real paths of the directories to list, so that loops of links are not
+        # followed. Only the links are resolved, the real path of any other
+        # element being the one of its directory followed by its name
+        pending = [sftp.normalize(path)]
+        visited = set(pending)
+        while pending:
+            cls._check_cancelled(cancel_event)
+            directory = pending.pop()
+            for attributes in sftp.listdir_attr(directory):
+                element = os.path.join(directory, attributes.filename)
+                if stat.S_ISLNK(attributes.st_mode or 0):
+                    try:
+                        attributes = sftp.stat(element)
+                        if stat.S_ISDIR(attributes.st_mode or 0):
+                            element = sftp.normalize(element)
+                    except OSError:
+                        # Broken link
+                        continue
+
+                if stat.S_ISDIR(attributes.st_mode or 0):
+                    if element not in visited:
+                        visited.add(element)
+                        pending.append(element)
+                elif stat.S_ISREG(attributes.st_mode or 0):
+                    size += attributes.st_size
+        return size
+
+    @classmethod
+    def _local_directory_content_size(
+        cls, path: str, cancel_event: threading.Event
+    ) -> int:
+        """
+        Adds up the sizes of the files under a local directory (following symbolic
+        links), listing its subdirectories in parallel
+        """
+
+        def scan(directory: str):
+            size = 0
+            subdirectories = []
+            with os.scandir(directory) as elements:
+                for element in elements:
+                    try:
+                        if element.is_dir():
+                            subdirectories.append(element.path)
+                        elif element.is_file():
+                            size += element.stat().st_size
+                    except OSError:
+                        # Broken link or element removed in the meantime
+                        pass
+            return size, subdirectories
+
+        size = 0
+        # Directories already listed, so that loops of links are not followed
+        root_stats = os.stat(path)
+        visited = {(root_stats.st_dev, root_stats.st_ino)}
+
+        with ThreadPoolExecutor(max_workers=cls.size_walk_workers) as executor:
+            pending = {executor.submit(scan, path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if cancel_event.is_set():
+                        for other in pending:
+                            other.cancel()
+                    cls._check_cancelled(cancel_event)
+
+                    directory_size, subdirectories = future.result()
+                    size += directory_size
+                    for subdirectory in subdirectories:
+                        try:
+                            stats = os.stat(subdirectory)
+                        except OSError:
+                            continue
+                        if (stats.st_dev, stats.st_ino) in visited:
+                            continue
+                        visited.add((stats.st_dev, stats.st_ino))
+                        pending.add(executor.submit(scan, subdirectory))
+
+        return size
+
     @classmethod
     def cancel_function(cls) -> bool:
         """
-        Cancels the current operation
+        Cancels the operations running (to cancel a single one, pass it a
+        "cancel_event" and set it instead)
 
         Returns:
-            bool: True if the operation was cancelled, False otherwise
+            bool: True if an operation was cancelled, False otherwise
         """
-        if cls._cancel_function is not None:
-            cls._cancel_function = True
-            return True
-        else:
-            return False
+        with cls._cancel_events_lock:
+            cancel_events = list(cls._cancel_events)
+        for cancel_event in cancel_events:
+            cancel_event.set()
+        return len(cancel_events) > 0
+
+    @classmethod
+    async def _run_async(cls, function: Callable, *args, **kwargs):
+        """
+        Runs a FileManager function in a worker thread of the AsyncManager, using
+        the connection dedicated to the asynchronous API
+        """
+        return await AsyncManager.run_blocking(
+            cls._call_in_async_worker, function, *args, **kwargs
+        )
+
+    @classmethod
+    def _call_in_async_worker(cls, function: Callable, *args, **kwargs):
+        if getattr(cls._thread_data, "sftp_clients", None) is None:
+            # The clients of closed connections are dropped with them
+            cls._thread_data.sftp_clients = weakref.WeakKeyDictionary()
+
+        return function(*args, **kwargs)
+
+    @classmethod
+    async def ascandir(
+        cls, path: str, force_local: bool = False
+    ) -> List[DirectoryEntry]:
+        """
+        Asynchronous version of "scandir"
+        """
+        return await cls._run_async(cls.scandir, path, force_local=force_local)
+
+    @classmethod
+    async def alist_contents(
+        cls, path: str, type: str = None, force_local: bool = False
+    ):
+        """
+        Asynchronous version of "list_contents"
+        """
+        return await cls._run_async(
+            cls.list_contents, path, type=type, force_local=force_local
+        )
+
+    @classmethod
+    async def alist_files(cls, path: str, force_local: bool = False):
+        """
+        Asynchronous version of "list_files"
+        """
+        return await cls._run_async(cls.list_files, path, force_local=force_local)
+
+    @classmethod
+    async def alist_directories(cls, path: str, force_local: bool = False):
+        """
+        Asynchronous version of "list_directories"
+        """
+        return await cls._run_async(
+            cls.list_directories, path, force_local=force_local
+        )
+
+    @classmethod
+    async def aexists(cls, path: str, force_local: bool = False):
+        """
+        Asynchronous version of "exists"
+        """
+        return await cls._run_async(cls.exists, path, force_local=force_local)
+
+    @classmethod
+    async def aread_file(
+        cls, path: str, as_binary: bool = False, force_local: bool = False
+    ):
+        """
+        Asynchronous version of "read_file"
+        """
+        return await cls._run_async(
+            cls.read_file, path, as_binary=as_binary, force_local=force_local
+        )
+
+    @classmethod
+    async def awrite_file(cls, path: str, content, force_local: bool = False):
+        """
+        Asynchronous version of "write_file"
+        """
+        return await cls._run_async(
+            cls.write_file, path, content, force_local=force_local
+        )
+
+    @classmethod
+    async def aget_attributes(
+        cls, path: str, force_local: bool = False, human_readable: bool = False
+    ) -> Union[SFTPAttributes, stat_result, dict]:
+        """
+        Asynchronous version of "get_attributes"
+        """
+        return await cls._run_async(
+            cls.get_attributes,
+            path,
+            force_local=force_local,
+            human_readable=human_readable,
+        )
+
+    @classmethod
+    async def aget_file_size(
+        cls, path: str, force_local: bool = False, human_readable: bool = False
+    ) -> Union[int, str]:
+        """
+        Asynchronous version of "get_file_size"
+        """
+        return await cls._run_async(
+            cls.get_file_size,
+            path,
+            force_local=force_local,
+            human_readable=human_readable,
+        )
+
+    @classmethod
+    async def aget_directory_content_size(
+        cls,
+        path: str,
+        force_local: bool = False,
+        human_readable: bool = False,
+        cancel_event: threading.Event = None,
+    ) -> Union[int, str]:
+        """
+        Asynchronous version of "get_directory_content_size"
+        """
+        return await cls._run_async(
+            cls.get_directory_content_size,
+            path,
+            force_local=force_local,
+            human_readable=human_readable,
+            cancel_event=cancel_event,
+        )
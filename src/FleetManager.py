@@ -0,0 +1,276 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Tuple
+
+import yaml
+
+from DeviceConfig.Device import Device
+from FileManager import FileManager as fm
+from LogManager import LogManager
+from ShellCommands import ShellCommands as sh
+from ShellCommands import TmuxPaneCommand
+from ShutdownEngine import NodeStopResult
+
+
+class DeviceResult:
+    def __init__(
+        self, device_name: str, success: bool, message: str, duration_s: float
+    ):
+        """
+        Result of an operation on one of the devices of the fleet
+
+        Parameters:
+            device_name (string): name of the device
+            success (bool): True if the operation finished without errors
+            message (string): description of the result or of the error
+            duration_s (float): time taken by the operation on the device
+        """
+        self.device_name = device_name
+        self.success = success
+        self.message = message
+        self.duration_s = duration_s
+
+    def __str__(self):
+        return f"{self.device_name}: {self.message} ({self.duration_s:.1f} s)"
+
+
+class FleetManager:
+    """
+    Runs operations on several target devices at the same time, so that an
+    operation on the whole fleet takes as long as on the slowest device instead
+    of the sum of all of them
+
+    Example:
+        results = FleetManager.launch(Settings.target_devices)
+        for result in results:
+            print(result)
+    """
+
+    # Maximum number of devices operated on at the same time
+    max_parallel: int = 8
+
+    # Default time in seconds after which the devices that did not finish are
+    # reported as timed out
+    deadline_s: float = 60
+
+    @classmethod
+    def run_on_devices(
+        cls,
+        devices: List[Device],
+        operation: Callable[[Device], str],
+        deadline_s: float = None,
+    ) -> List[DeviceResult]:
+        """
+        Runs an operation on each device in parallel (with the commands and file
+        operations done by it targeting that device)
+
+        Parameters:
+            devices (list[Device]): devices on which to run the operation
+            operation (Callable): function called with each device, which returns
+                a description of the result and raises an exception on error
+            deadline_s (float, optional): time after which the devices that did not
+                finish are reported as timed out (the operation keeps running on
+                them in the background)
+
+        Returns:
+            list[DeviceResult]: result for each device, in the same order as devices
+        """
+        if deadline_s is None:
+            deadline_s = cls.deadline_s
+        if not devices:
+            return []
+
+        start = time.monotonic()
+
+        def run(device: Device) -> Tuple[bool, str, float]:
+            device_start = time.monotonic()
+            try:
+                with sh.on_device(device):
+                    message = operation(device)
+                return True, message, time.monotonic() - device_start
+            except Exception as e:
+                LogManager.error(f"{device.name}: {e}")
+                return False, str(e), time.monotonic() - device_start
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(devices), cls.max_parallel),
+            thread_name_prefix="BirdWatchFleet",
+        )
+        # The workers keep the context (e.g. the action being measured) of the caller
+        futures = [
+            executor.submit(contextvars.copy_context().run, run, device)
+            for device in devices
+        ]
+        wait(futures, timeout=deadline_s)
+
+        # Do not wait for the devices that did not finish in time
+        executor.shutdown(wait=False)
+
+        results = []
+        for device, future in zip(devices, futures):
+            if future.done():
+                results.append(DeviceResult(device.name, *future.result()))
+            else:
+                future.cancel()
+                results.append(
+                    DeviceResult(
+                        device.name,
+                        False,
+                        f"Timed out after {deadline_s:.0f} s",
+                        time.monotonic() - start,
+                    )
+                )
+
+        succeeded = sum(result.success for result in results)
+        LogManager.info(
+            f"Fleet operation finished on {succeeded}/{len(results)} devices "
+            + f"in {time.monotonic() - start:.1f} s"
+        )
+        return results
+
+    @classmethod
+    def launch_plan(cls, device: Device) -> Tuple[List[TmuxPaneCommand], str]:
+        """
+        Reads the nodes file of a device (from the device itself) and returns the
+        nodes to run on it, in the same way as the Mission tab does
+
+        Parameters:
+            device (Device): device whose nodes to run
+
+        Returns:
+            tuple: commands to run (list[TmuxPaneCommand]) and command to run in
+            each pane before them (string)
+        """
+        with sh.on_device(device):
+            nodes_config: dict = yaml.safe_load(fm.read_file(device.files.nodes.path))
+
+        # Nodes without "run" field run by default
+        nodes = [
+            (name, values)
+            for name, values in nodes_config.items()
+            if values.get("run", True) is True
+        ]
+        nodes.sort(key=lambda node: int(node[1].get("order", 10**9)))
+
+        tmux_commands = []
+        for name, values in nodes:
+            command = values["command"]
+            if device.files.source is not None:
+                command = f"source {device.files.source.path} && {command}"
+
+            tmux_commands.append(TmuxPaneCommand.from_node(name, values, command))
+
+        # source the workspace before launching the node
+        pre_launch_cmd = (
+            "source " + device.files.workspace_path + "install/setup.{bash,zsh}"
+        )
+
+        return tmux_commands, pre_launch_cmd
+
+    @classmethod
+    def launch(
+        cls,
+        devices: List[Device],
+        session_name: str = "BirdWatch",
+        deadline_s: float = None,
+    ) -> List[DeviceResult]:
+        """
+        Runs the nodes of the nodes file of each device on it, in a tmux session
+        (without attaching to it)
+
+        Parameters:
+            devices (list[Device]): devices on which to run the nodes
+            session_name (string, optional): name of the tmux sessions
+            deadline_s (float, optional): see "run_on_devices"
+
+        Returns:
+            list[DeviceResult]: result for each device
+        """
+
+        def launch_on_device(device: Device) -> str:
+            tmux_commands, pre_launch_cmd = cls.launch_plan(device)
+            if sh.launch_tmux(
+                tmux_commands,
+                session_name=session_name,
+                pre_launch_cmd=pre_launch_cmd,
+                auto_attach=False,
+            ):
+                return f'Session "{session_name}" was already running'
+            return f"Launched {len(tmux_commands)} nodes"
+
+        return cls.run_on_devices(devices, launch_on_device, deadline_s)
+
+    @classmethod
+    def stop(
+        cls,
+        devices: List[Device],
+        session_name: str = "BirdWatch",
+        deadline_s: float = None,
+    ) -> List[DeviceResult]:
+        """
+        Stops the nodes in the tmux session on each device (see "soft_stop") and
+        then closes the session
+
+        Parameters:
+            devices (list[Device]): devices on which to stop the session
+            session_name (string, optional): name of the tmux sessions
+            deadline_s (float, optional): see "run_on_devices"
+
+        Returns:
+            list[DeviceResult]: result for each device
+        """
+
+        def stop_on_device(device: Device) -> str:
+            results = sh.stop_nodes(session_name, kill_session=True)
+            if results is None:
+                return f'Session "{session_name}" was not running'
+            return f'Stopped session "{session_name}": ' + cls.describe_stop(results)
+
+        return cls.run_on_devices(devices, stop_on_device, deadline_s)
+
+    @classmethod
+    def soft_stop(
+        cls,
+        devices: List[Device],
+        session_name: str = "BirdWatch",
+        deadline_s: float = None,
+    ) -> List[DeviceResult]:
+        """
+        Stops the nodes in each pane of the tmux session on each device, sending
+        'Ctrl+C' (and then SIGTERM and SIGKILL to the ones that do not exit)
+
+        Parameters:
+            devices (list[Device]): devices on which to stop the nodes
+            session_name (string, optional): name of the tmux sessions
+            deadline_s (float, optional): see "run_on_devices"
+
+        Returns:
+            list[DeviceResult]: result for each device
+        """
+
+        def soft_stop_on_device(device: Device) -> str:
+            results = sh.soft_stop_tmux(session_name)
+            if not results:
+                return f'No panes found for session "{session_name}"'
+            return cls.describe_stop(results)
+
+        return cls.run_on_devices(devices, soft_stop_on_device, deadline_s)
+
+    @staticmethod
+    def describe_stop(results: List[NodeStopResult]) -> str:
+        """
+        Summary of how the nodes of a device were stopped
+        """
+        stopped = [result for result in results if result.signal != "none"]
+        if not stopped:
+            return "no nodes were running"
+        slowest_s = max(result.duration_s for result in stopped)
+        text = (
+            f"stopped {len(stopped)} node{'s' if len(stopped) > 1 else ''} "
+            + f"in {slowest_s:.1f} s"
+        )
+        escalated = [str(result) for result in stopped if result.escalated]
+        if escalated:
+            text += " (" + "; ".join(escalated) + ")"
+        return text
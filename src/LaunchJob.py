@@ -0,0 +1,215 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, List
+
+from AsyncManager import AsyncManager
+from LogManager import LogManager
+from ShellCommands import ShellCommands as sh
+from ShellCommands import TmuxPaneCommand
+
+
+class NodeProgress:
+    def __init__(self, name: str):
+        """
+        Progress of the launch of a node
+
+        Parameters:
+            name (string): name of the node
+        """
+        self.name = name
+        # "waiting", "started", "ready", "failed" or "cancelled"
+        self.state = "waiting"
+        # Seconds since the launch started (None until the event happens)
+        self.started_s: float = None
+        self.finished_s: float = None
+        # Reason of the failure
+        self.message = ""
+
+
+class LaunchJob:
+    # Seconds to wait for the launch to stop once cancelled
+    cancel_timeout_s: float = 10
+
+    def __init__(
+        self,
+        commands: List[TmuxPaneCommand],
+        session_name: str = "BirdWatch",
+        pre_launch_cmd: str = "",
+        auto_attach: bool = True,
+    ):
+        """
+        Launch of the nodes running in the background (see
+        "ShellCommands.launch_tmux"), so that the GUI can be used while the nodes
+        are started. The progress of each node is updated as soon as the events
+        arrive from the target device, and the launch of the nodes not yet started
+        can be cancelled
+
+        Parameters:
+            commands (list[TmuxPaneCommand]): nodes to launch
+            session_name (string, optional): name of the tmux session
+            pre_launch_cmd (string, optional): command to run in each pane before
+                the node
+            auto_attach (bool, optional): if True, a terminal attached to the session
+                is opened once the launch finishes
+
+        Example:
+            job = LaunchJob(commands, pre_launch_cmd=source_cmd)
+            job.add_listener(lambda node: print(node.name, node.state))
+            job.start()
+            ...
+            job.cancel()
+        """
+        self.commands = commands
+        self.session_name = session_name
+        self.pre_launch_cmd = pre_launch_cmd
+        self.auto_attach = auto_attach
+
+        self.nodes: "OrderedDict[str, NodeProgress]" = OrderedDict(
+            (command.name, NodeProgress(command.name))
+            for command in commands
+            if command.name
+        )
+        self.lock = threading.Lock()
+        self.listeners: List[Callable[[NodeProgress], None]] = []
+
+        # Created on the target device to cancel the launch
+        self.cancel_file = f"/tmp/birdwatch-launch-{uuid.uuid4().hex}.cancel"
+        self.cancelled = False
+        self.cancel_thread: threading.Thread = None
+
+        # Context of the caller of "start" (e.g. the target device), in which the
+        # launch is cancelled too
+        self.context: contextvars.Context = None
+
+        self.start_time: float = None
+        self.end_time: float = None
+        self.future: Future = None
+
+    @property
+    def running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    @property
+    def elapsed_s(self) -> float:
+        """
+        Seconds since the launch started (until it finished)
+        """
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    def add_listener(self, listener: Callable[[NodeProgress], None]):
+        """
+        Adds a function called (from a worker thread) with the progress of a node
+        each time it changes
+        """
+        self.listeners.append(listener)
+
+    def start(self) -> Future:
+        """
+        Starts the launch in a worker thread of the AsyncManager (on the device
+        targeted by the caller)
+
+        Returns:
+            concurrent.futures.Future: future with the result of
+            "ShellCommands.launch_tmux" (True if the session already existed)
+        """
+        self.start_time = time.monotonic()
+        self.context = contextvars.copy_context()
+        self.future = AsyncManager.submit(AsyncManager.run_blocking(self.run))
+        return self.future
+
+    def run(self) -> bool:
+        try:
+            return sh.launch_tmux(
+                self.commands,
+                self.session_name,
+                self.pre_launch_cmd,
+                auto_attach=self.auto_attach,
+                on_event=self.on_event,
+                cancel_file=self.cancel_file,
+            )
+        finally:
+            self.end_time = time.monotonic()
+            with self.lock:
+                cancelled = self.cancelled
+                cancel_thread = self.cancel_thread
+
+            # The nodes that did not start were cancelled
+            for node in self.nodes.values():
+                if node.state == "waiting" and cancelled:
+                    self.update(node, "cancelled")
+
+            if cancelled:
+                # The cancel file is only removed once it was created
+                if cancel_thread is not None:
+                    cancel_thread.join(timeout=self.cancel_timeout_s)
+                try:
+                    sh.execute(f"rm -f {self.cancel_file}")
+                except Exception as e:
+                    LogManager.warning(f"Could not remove {self.cancel_file}: {e}")
+
+    def cancel(self) -> Future:
+        """
+        Stops the launch of the nodes not yet started (the ones already running
+        keep running). It can be called from the Tk main thread
+
+        Returns:
+            concurrent.futures.Future: future of the launch (see "start"), which
+            finishes once the remaining nodes are cancelled, or None if the launch
+            was never started
+        """
+        # The flag and the thread are set together, as "run" may be finishing
+        with self.lock:
+            if not self.running or self.cancelled:
+                return self.future
+            LogManager.info("Cancelling the launch of the remaining nodes")
+
+            # On the device of the launch, and without waiting behind the jobs of
+            # the worker threads (e.g. other launches)
+            self.cancel_thread = threading.Thread(
+                target=self.context.copy().run,
+                args=(self.create_cancel_file,),
+                name="BirdWatchLaunchCancel",
+                daemon=True,
+            )
+            self.cancel_thread.start()
+            self.cancelled = True
+        return self.future
+
+    def create_cancel_file(self):
+        try:
+            sh.execute(f"touch {self.cancel_file}")
+        except Exception as e:
+            LogManager.error(f"Could not cancel the launch: {e}")
+
+    def on_event(self, event: str, node_name: str, reason: str):
+        node = self.nodes.get(node_name)
+        if node is None:
+            return
+
+        if event == "failed":
+            LogManager.error(f"{node_name} failed: {reason}")
+        elif event == "cancelled":
+            LogManager.info(f"Launch of {node_name} cancelled")
+        self.update(node, event, reason)
+
+    def update(self, node: NodeProgress, state: str, message: str = ""):
+        now_s = self.elapsed_s
+        with self.lock:
+            node.state = state
+            node.message = message
+            if state == "started":
+                node.started_s = now_s
+            else:
+                node.finished_s = now_s
+
+        for listener in list(self.listeners):
+            try:
+                listener(node)
+            except Exception as e:
+                LogManager.exception(f"Error notifying launch progress: {e}")
@@ -0,0 +1,248 @@
+import shlex
+from typing import Dict, List
+
+from LogManager import LogManager
+
+
+class ReadinessCondition:
+    KINDS = ("topic", "port", "log", "file")
+
+    def __init__(self, kind: str, value: str):
+        """
+        Condition that tells that a node is ready, so that the nodes that depend
+        on it can be started
+
+        Parameters:
+            kind (string): "topic" (a message is published on the topic), "port"
+                (a TCP or UDP port is open), "log" (the output of the node matches
+                a regular expression) or "file" (a file exists)
+            value (string): topic, port number, regular expression or path
+        """
+        if kind not in self.KINDS:
+            raise ValueError(
+                f'Unknown readiness condition "{kind}" (expected one of '
+                + ", ".join(self.KINDS)
+                + ")"
+            )
+        self.kind = kind
+        self.value = str(value)
+
+    @classmethod
+    def from_dictionary(cls, ready: dict) -> "ReadinessCondition":
+        """
+        Reads the condition from the "ready" field of a node (e.g. {"port": 14540})
+        """
+        if not isinstance(ready, dict) or len(ready) != 1:
+            raise ValueError(
+                '"ready" must have exactly one of the fields ' + ", ".join(cls.KINDS)
+            )
+        kind, value = next(iter(ready.items()))
+        return cls(kind, value)
+
+    def check_command(
+        self, pane_target: str, ros_version: str = "2", pre_launch_cmd: str = ""
+    ) -> str:
+        """
+        Returns a shell command that succeeds if the condition is met (it may
+        take a few seconds to fail)
+
+        Parameters:
+            pane_target (string): tmux pane in which the node runs
+            ros_version (string, optional): "1" or "2"
+            pre_launch_cmd (string, optional): command run in the pane before the
+                node (e.g. to source the workspace)
+        """
+        if self.kind == "topic":
+            echo = (
+                f"rostopic echo -n 1 {shlex.quote(self.value)}"
+                if ros_version == "1"
+                else f"ros2 topic echo --once {shlex.quote(self.value)}"
+            )
+            if pre_launch_cmd:
+                echo = f"{pre_launch_cmd} >/dev/null 2>&1; {echo}"
+            return f"timeout 5 bash -c {shlex.quote(echo)} >/dev/null 2>&1"
+        elif self.kind == "port":
+            return (
+                f"ss -Hlntu {shlex.quote(f'sport = :{int(self.value)}')} 2>/dev/null"
+                + " | grep -q ."
+            )
+        elif self.kind == "log":
+            return (
+                f"tmux capture-pane -p -J -t {shlex.quote(pane_target)} -S - 2>/dev/null"
+                + f" | grep -Eq {shlex.quote(self.value)}"
+            )
+        else:
+            if self.value.startswith("~/"):
+                return f'test -e "$HOME"/{shlex.quote(self.value[2:])}'
+            return f"test -e {shlex.quote(self.value)}"
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.value}"
+
+
+class LaunchScheduler:
+    """
+    Generates the part of the launch script that starts each node as soon as
+    the nodes it depends on are ready, instead of one after the other. The
+    script runs on the target device, so waiting for the conditions does not
+    need any round trip. It prints a line per event, separated by tabs:
+    "started <node>", "ready <node>", "failed <node> <reason>" and
+    "cancelled <node>"
+
+    A node fails if its condition is not met in time or if a node it depends on
+    failed (in which case it is not started). Once the cancel file exists, the
+    nodes not yet started are cancelled
+    """
+
+    # Seconds between checks of the readiness conditions
+    poll_interval_s: float = 0.2
+
+    @classmethod
+    def order(cls, commands: list) -> List[int]:
+        """
+        Checks the dependencies of the commands to launch
+
+        Parameters:
+            commands (list[TmuxPaneCommand]): nodes to launch
+
+        Returns:
+            list[int]: indices of the commands, each one after those it depends on
+
+        Raises:
+            ValueError: if the dependencies have a cycle
+        """
+        indices: Dict[str, int] = {
+            command.name: index for index, command in enumerate(commands)
+        }
+        ordered: List[int] = []
+        state: Dict[int, str] = {}
+
+        def visit(index: int, path: List[str]):
+            if state.get(index) == "done":
+                return
+            if state.get(index) == "visiting":
+                raise ValueError(
+                    "Nodes depend on each other: "
+                    + " -> ".join(path + [commands[index].name])
+                )
+            state[index] = "visiting"
+            for dependency in commands[index].depends_on:
+                if dependency in indices:
+                    visit(indices[dependency], path + [commands[index].name])
+            state[index] = "done"
+            ordered.append(index)
+
+        for index in range(len(commands)):
+            visit(index, [])
+        return ordered
+
+    @classmethod
+    def script(
+        cls,
+        commands: list,
+        pane_targets: List[str],
+        start_commands: List[str],
+        ros_version: str = "2",
+        pre_launch_cmd: str = "",
+        cancel_file: str = None,
+    ) -> str:
+        """
+        Returns the shell script that runs the commands in their panes (which
+        must exist already)
+
+        Parameters:
+            commands (list[TmuxPaneCommand]): nodes to launch
+            pane_targets (list[string]): tmux pane of each command
+            start_commands (list[string]): shell command that runs each command in
+                its pane
+            ros_version (string, optional): "1" or "2", for the topic conditions
+            pre_launch_cmd (string, optional): command run in each pane before the
+                node
+            cancel_file (string, optional): file on the target device whose
+                creation cancels the launch of the remaining nodes
+        """
+        cls.order(commands)
+        indices = {command.name: index for index, command in enumerate(commands)}
+        poll = f"sleep {cls.poll_interval_s}"
+
+        lines = [
+            "set +e",
+            'bw_dir=$(mktemp -d "${TMPDIR:-/tmp}/birdwatch-launch.XXXXXX")',
+            f"bw_cancel={shlex.quote(cancel_file or '')}",
+            "bw_cancelled() {",
+            '  [ -n "$bw_cancel" ] && [ -e "$bw_cancel" ]',
+            "}",
+            "bw_wait() {",
+            '  while [ ! -e "$bw_dir/$1.ready" ]; do',
+            '    [ -e "$bw_dir/$1.failed" ] && return 1',
+            "    bw_cancelled && return 1",
+            f"    {poll}",
+            "  done",
+            "}",
+            "bw_fail() {",
+            '  touch "$bw_dir/$1.failed"',
+            "  if bw_cancelled; then",
+            "    printf 'cancelled\\t%s\\n' \"$2\"",
+            "  else",
+            "    printf 'failed\\t%s\\t%s\\n' \"$2\" \"$3\"",
+            "  fi",
+            "}",
+        ]
+
+        for index, (command, pane_target, start_command) in enumerate(
+            zip(commands, pane_targets, start_commands)
+        ):
+            name = shlex.quote(command.name)
+            job = []
+
+            # Wait for the nodes it depends on (ignoring those not launched)
+            for dependency in command.depends_on:
+                if dependency in indices:
+                    job.append(
+                        f"bw_wait {indices[dependency]} || "
+                        + f"{{ bw_fail {index} {name} "
+                        + f"{shlex.quote(f'{dependency} failed')}; exit 0; }}"
+                    )
+                else:
+                    LogManager.warning(
+                        f"{command.name} depends on {dependency}, which is not "
+                        + "launched, so it does not wait for it"
+                    )
+
+            job.append(f"! bw_cancelled || {{ bw_fail {index} {name} ''; exit 0; }}")
+            job.append(
+                f"{start_command} || "
+                + f"{{ bw_fail {index} {name} 'could not be started'; exit 0; }}"
+            )
+            job.append(f"printf 'started\\t%s\\n' {name}")
+
+            if command.ready is not None:
+                job += [
+                    f"bw_deadline=$(( $(date +%s) + {int(command.ready_timeout_s)} ))",
+                    "until "
+                    + command.ready.check_command(
+                        pane_target, ros_version, pre_launch_cmd
+                    )
+                    + "; do",
+                    '  if bw_cancelled || [ "$(date +%s)" -gt "$bw_deadline" ]; then',
+                    f"    bw_fail {index} {name} "
+                    + shlex.quote(
+                        f"not ready after {command.ready_timeout_s:g} s "
+                        + f"(waiting for {command.ready})"
+                    )
+                    + "; exit 0",
+                    "  fi",
+                    f"  {poll}",
+                    "done",
+                ]
+            elif command.delay_ms > 0:
+                job.append(f"sleep {command.delay_ms / 1000}")
+
+            job += [
+                f'touch "$bw_dir/{index}.ready"',
+                f"printf 'ready\\t%s\\n' {name}",
+            ]
+            lines += ["("] + ["  " + line for line in job] + [") &"]
+
+        lines += ["wait", 'rm -rf "$bw_dir"']
+        return "\n".join(lines)
@@ -0,0 +1,266 @@
+import datetime
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Tuple
+
+from paramiko.sftp_client import SFTPClient
+
+
+class Measurement:
+    def __init__(self, operation: str):
+        """
+        Timing and traffic of a single call of an operation (e.g. a command or a
+        file read)
+
+        Parameters:
+            operation (string): name of the operation
+        """
+        self.operation = operation
+        self.start = time.monotonic()
+        self.duration_s: float = None
+        self.error = False
+
+        # Requests sent to the device (each one waits for its response)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class OperationStats:
+    # Upper bounds of the latency histogram buckets, in milliseconds
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self, action: str, operation: str):
+        """
+        Aggregated measurements of an operation called by a high-level action
+
+        Parameters:
+            action (string): action of the user that caused the calls (e.g.
+                "launch"), or "" if not known
+            operation (string): name of the operation
+        """
+        self.action = action
+        self.operation = operation
+
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # Calls per bucket of BUCKETS_MS, with the last one for slower calls
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def add(self, measurement: Measurement):
+        self.count += 1
+        self.errors += measurement.error
+        self.total_s += measurement.duration_s
+        self.max_s = max(self.max_s, measurement.duration_s)
+        self.requests += measurement.requests
+        self.bytes_sent += measurement.bytes_sent
+        self.bytes_received += measurement.bytes_received
+
+        duration_ms = measurement.duration_s * 1000
+        bucket = next(
+            (
+                index
+                for index, bound in enumerate(self.BUCKETS_MS)
+                if duration_ms <= bound
+            ),
+            len(self.BUCKETS_MS),
+        )
+        self.buckets[bucket] += 1
+
+    def percentile_ms(self, fraction: float) -> float:
+        """
+        Returns the upper bound of the bucket containing the given fraction
+        (between 0 and 1) of the calls, or the slowest call if it is beyond the
+        last bucket
+        """
+        threshold = fraction * self.count
+        accumulated = 0
+        for bound, calls in zip(self.BUCKETS_MS, self.buckets):
+            accumulated += calls
+            if accumulated >= threshold:
+                return bound
+        return self.max_s * 1000
+
+    def to_dictionary(self) -> dict:
+        return {
+            "action": self.action,
+            "operation": self.operation,
+            "count": self.count,
+            "errors": self.errors,
+            "total_s": round(self.total_s, 6),
+            "max_s": round(self.max_s, 6),
+            "requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            # Cumulative, as in Prometheus histograms
+            "buckets_ms": {
+                **{
+                    str(bound): sum(self.buckets[: index + 1])
+                    for index, bound in enumerate(self.BUCKETS_MS)
+                },
+                "+Inf": self.count,
+            },
+        }
+
+
+class Metrics:
+    """
+    Measures the time, requests and bytes of the operations on the target
+    device (commands and file operations), grouped by the high-level action of
+    the user that caused them, to find out how many round trips each action
+    costs
+
+    Example:
+        with Metrics.action("refresh topics"):
+            topics = sh.execute("ros2 topic list")
+
+        for stats in Metrics.stats():
+            print(stats.action, stats.operation, stats.count, stats.requests)
+    """
+
+    _stats: Dict[Tuple[str, str], OperationStats] = {}
+    _lock = threading.Lock()
+
+    _action: ContextVar[str] = ContextVar("action", default="")
+    _measurement: ContextVar[Measurement] = ContextVar("measurement", default=None)
+
+    @classmethod
+    @contextmanager
+    def action(cls, name: str) -> Iterator[None]:
+        """
+        Attributes the operations done inside the block (also in the worker
+        threads of the asynchronous API started from it) to a high-level action.
+        Can also be used as a decorator
+        """
+        token = cls._action.set(name)
+        try:
+            yield
+        finally:
+            cls._action.reset(token)
+
+    @classmethod
+    @contextmanager
+    def measure(cls, operation: str) -> Iterator[Measurement]:
+        """
+        Measures the operation done inside the block. Operations done inside
+        another one are counted as part of the outer one. Can also be used as a
+        decorator
+
+        Example:
+            with Metrics.measure("execute") as measurement:
+                output = run(command)
+                measurement.bytes_received += len(output)
+        """
+        outer = cls._measurement.get()
+        if outer is not None:
+            yield outer
+            return
+
+        measurement = Measurement(operation)
+        token = cls._measurement.set(measurement)
+        try:
+            yield measurement
+        except BaseException:
+            measurement.error = True
+            raise
+        finally:
+            cls._measurement.reset(token)
+            measurement.duration_s = time.monotonic() - measurement.start
+            cls._add(cls._action.get(), measurement)
+
+    @classmethod
+    def count_request(cls, bytes_sent: int):
+        """
+        Counts a request sent to the device by the operation being measured
+        """
+        measurement = cls._measurement.get()
+        if measurement is not None:
+            measurement.requests += 1
+            measurement.bytes_sent += bytes_sent
+
+    @classmethod
+    def count_response(cls, bytes_received: int):
+        """
+        Counts bytes received from the device by the operation being measured
+        """
+        measurement = cls._measurement.get()
+        if measurement is not None:
+            measurement.bytes_received += bytes_received
+
+    @classmethod
+    def stats(cls) -> List[OperationStats]:
+        """
+        Returns the aggregated measurements, from the slowest in total
+        """
+        with cls._lock:
+            stats = list(cls._stats.values())
+        return sorted(stats, key=lambda stats: stats.total_s, reverse=True)
+
+    @classmethod
+    def reset(cls):
+        """
+        Removes all the measurements
+        """
+        with cls._lock:
+            cls._stats = {}
+
+    @classmethod
+    def flush(cls, path: str):
+        """
+        Appends the aggregated measurements to a file, as a line of JSON
+        (counters accumulate since the start or the last reset)
+
+        Parameters:
+            path (string): path of the metrics file
+        """
+        with cls._lock:
+            operations = [stats.to_dictionary() for stats in cls._stats.values()]
+
+        line = json.dumps(
+            {
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "operations": operations,
+            }
+        )
+        with open(path, "a") as metrics_file:
+            metrics_file.write(line + "\n")
+
+    @classmethod
+    def _add(cls, action: str, measurement: Measurement):
+        key = (action, measurement.operation)
+        with cls._lock:
+            stats = cls._stats.get(key)
+            if stats is None:
+                stats = cls._stats[key] = OperationStats(*key)
+            stats.add(measurement)
+
+
+class MeteredSFTPClient(SFTPClient):
+    """
+    SFTP client that counts each request and the bytes of each packet for the
+    operation being measured by Metrics
+
+    Example:
+        sftp = MeteredSFTPClient.from_transport(client.get_transport())
+    """
+
+    def _send_packet(self, t, packet):
+        super()._send_packet(t, packet)
+        # Length, type and content of the packet, which is sent as raw bytes
+        # for the version handshake
+        if not isinstance(packet, bytes):
+            packet = packet.asbytes()
+        Metrics.count_request(5 + len(packet))
+
+    def _read_packet(self):
+        t, data = super()._read_packet()
+        Metrics.count_response(5 + len(data))
+        return t, data
@@ -0,0 +1,113 @@
+import socket
+import threading
+import time
+from typing import List, Tuple
+
+from LogManager import LogManager
+from Settings import Settings
+
+
+class NetworkSelector:
+    """
+    Chooses the network through which to connect to a device by trying all of
+    its networks at the same time and keeping the first one that answers, so
+    that finding a reachable network takes one round-trip time instead of
+    waiting for the timeout of each unreachable one in turn. The round-trip
+    time measured on each network is kept in its "rtt_ms" attribute
+
+    Example:
+        network_index, sock = NetworkSelector.race(device)
+        client.connect(device.ssh_config.networks[network_index].ip, sock=sock)
+    """
+
+    ssh_port: int = 22
+
+    # Seconds after which a network that did not answer is unreachable
+    timeout_s: float = 5
+
+    @classmethod
+    def race(cls, device) -> Tuple[int, socket.socket]:
+        """
+        Opens a TCP connection to the SSH port of the device on all its networks
+        at the same time, selects the network that answers first (in Settings if
+        it is the current device) and returns its connection, ready to start the
+        SSH handshake on it. The other networks keep being measured in the
+        background, and their connections are closed
+
+        Parameters:
+            device (Device): device to connect to
+
+        Returns:
+            tuple: index of the selected network (int) and its connection (socket)
+
+        Raises:
+            ConnectionError: if none of the networks answered
+        """
+        networks = device.ssh_config.networks
+        start = time.monotonic()
+
+        lock = threading.Lock()
+        decided = threading.Event()
+        winner: List[Tuple[int, socket.socket]] = []
+        errors: List[str] = []
+
+        def try_network(index: int):
+            network = networks[index]
+            sock = None
+            try:
+                sock = socket.create_connection(
+                    (network.ip, cls.ssh_port), timeout=cls.timeout_s
+                )
+                # The TCP handshake takes one round trip
+                rtt_ms = (time.monotonic() - start) * 1000
+
+                # Wait for the banner of the SSH server (without reading it, so that
+                # the handshake can go on), in case something else accepted the
+                # connection on the way (e.g. a proxy)
+                sock.settimeout(max(0.1, cls.timeout_s - (time.monotonic() - start)))
+                if sock.recv(4, socket.MSG_PEEK) != b"SSH-":
+                    raise ConnectionError("No SSH server answered")
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                network.rtt_ms = None
+                with lock:
+                    errors.append(f"{network.name}: {e}")
+                    if len(errors) == len(networks):
+                        decided.set()
+                return
+
+            network.rtt_ms = rtt_ms
+            with lock:
+                if not winner and not decided.is_set():
+                    winner.append((index, sock))
+                    decided.set()
+                    return
+            sock.close()
+
+        for index in range(len(networks)):
+            threading.Thread(target=try_network, args=(index,), daemon=True).start()
+
+        decided.wait(cls.timeout_s + 1)
+        with lock:
+            # Connections made after this point are closed by their threads
+            decided.set()
+            if not winner:
+                raise ConnectionError(
+                    f"No network of {device.name} is reachable ("
+                    + (", ".join(errors) or "timed out")
+                    + ")"
+                )
+            network_index, sock = winner[0]
+
+        network = networks[network_index]
+        LogManager.info(
+            f"Selected network {network.name} for {device.name} "
+            + f"({network.rtt_ms:.0f} ms)"
+        )
+        if Settings.current_device is device:
+            Settings.set_current_network(network_index)
+        else:
+            device.ssh_config.select_network(network_index)
+
+        return network_index, sock
@@ -0,0 +1,293 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from AsyncManager import AsyncManager
+from ConnectionSupervisor import ConnectionSupervisor, LinkState
+from LogManager import LogManager
+from Settings import Settings
+
+
+class PeriodicTask:
+    def __init__(
+        self,
+        name: str,
+        function: Callable[[], Any],
+        interval_s: float,
+        priority: int,
+        visible_when: Callable[[], bool] = None,
+        remote: bool = True,
+        max_interval_s: float = 60,
+    ):
+        """
+        Function run periodically by the PollingScheduler
+
+        Parameters:
+            name (string): unique name of the task
+            function (Callable): function to run (in a worker thread)
+            interval_s (float): time between runs when everything goes well
+            priority (int): PollingScheduler.HIGH, NORMAL or LOW
+            visible_when (Callable, optional): called in the Tk main thread; the
+                task is paused while it returns False
+            remote (bool, optional): if True, the task is paused while the link to
+                the target device is down
+            max_interval_s (float, optional): limit of the time between runs when
+                backing off
+        """
+        self.name = name
+        self.function = function
+        self.interval_s = interval_s
+        self.priority = priority
+        self.visible_when = visible_when
+        self.remote = remote
+        self.max_interval_s = max_interval_s
+
+        self.visible = True
+        self.running = False
+        # Number of runs in a row that raised an exception
+        self.errors = 0
+        # Time (as given by time.monotonic) of the next run
+        self.next_run = time.monotonic()
+
+    def next_interval_s(self, rtt_factor: float) -> float:
+        """
+        Time until the next run: doubled after each error in a row, and longer
+        the slower the link is (the lower the priority, the longer)
+        """
+        return min(
+            self.max_interval_s,
+            self.interval_s * 2**self.errors * rtt_factor**self.priority,
+        )
+
+
+class PollingScheduler:
+    """
+    Runs the periodic tasks of the GUI (e.g. gathering the state of the target
+    device) in the background. Tasks are paused while their widgets are not
+    shown (e.g. in another tab, or with the window minimized) or the link is
+    down, run less often when the link is slow or they fail, and a task never
+    runs again before its previous run finished
+
+    Example:
+        PollingScheduler.register(
+            "disk", check_disk, interval_s=5, widget=disk_label
+        )
+    """
+
+    # Priorities: HIGH tasks are not slowed down by the round-trip time
+    HIGH: int = 0
+    NORMAL: int = 1
+    LOW: int = 2
+
+    # Round-trip time (in milliseconds) from which the tasks are run less often
+    reference_rtt_ms: float = 100
+    max_rtt_factor: float = 8
+
+    # Seconds between checks of which tasks are due
+    tick_s: float = 0.25
+    max_workers: int = 2
+
+    _tasks: Dict[str, PeriodicTask] = {}
+    _lock = threading.Lock()
+
+    _thread: threading.Thread = None
+    _executor: ThreadPoolExecutor = None
+    _stop_event = threading.Event()
+    _wake_event = threading.Event()
+    _updating_visibility = False
+
+    @classmethod
+    def register(
+        cls,
+        name: str,
+        function: Callable[[], Any],
+        interval_s: float,
+        priority: int = NORMAL,
+        widget=None,
+        visible_when: Callable[[], bool] = None,
+        remote: bool = True,
+        max_interval_s: float = 60,
+    ) -> PeriodicTask:
+        """
+        Runs a function periodically (replacing the task with the same name, if
+        any), starting right away
+
+        Parameters:
+            name (string): unique name of the task
+            function (Callable): function to run (in a worker thread)
+            interval_s (float): time between runs
+            priority (int, optional): HIGH, NORMAL or LOW
+            widget (optional): the task is paused while this widget is not shown,
+                and removed once it is destroyed
+            visible_when (Callable, optional): alternatively to "widget", function
+                called in the Tk main thread that returns False to pause the task
+            remote (bool, optional): if True, the task is paused while the link to
+                the target device is down
+            max_interval_s (float, optional): limit of the time between runs when
+                backing off
+
+        Returns:
+            PeriodicTask: registered task
+        """
+        if widget is not None and visible_when is None:
+            visible_when = widget.winfo_viewable
+
+        task = PeriodicTask(
+            name,
+            function,
+            interval_s,
+            priority,
+            visible_when=visible_when,
+            remote=remote,
+            max_interval_s=max_interval_s,
+        )
+        with cls._lock:
+            cls._tasks[name] = task
+        cls.start()
+        cls._wake_event.set()
+
+        return task
+
+    @classmethod
+    def unregister(cls, name: str):
+        """
+        Stops running a task (a run in progress finishes)
+        """
+        with cls._lock:
+            cls._tasks.pop(name, None)
+
+    @classmethod
+    def run_now(cls, name: str):
+        """
+        Runs a task as soon as possible instead of waiting for its interval
+        """
+        with cls._lock:
+            task = cls._tasks.get(name)
+            if task is not None:
+                task.next_run = time.monotonic()
+        cls._wake_event.set()
+
+    @classmethod
+    def start(cls):
+        """
+        Starts running the tasks in the background (if not yet running)
+        """
+        with cls._lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+
+            cls._stop_event.clear()
+            cls._executor = ThreadPoolExecutor(
+                max_workers=cls.max_workers, thread_name_prefix="BirdWatchPolling"
+            )
+            cls._thread = threading.Thread(
+                target=cls._run, name="BirdWatchScheduler", daemon=True
+            )
+            cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        """
+        Stops running the tasks
+        """
+        cls._stop_event.set()
+        cls._wake_event.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout=2)
+            cls._thread = None
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False)
+            cls._executor = None
+
+    @classmethod
+    def rtt_factor(cls) -> float:
+        """
+        How much slower than the reference round-trip time the link to the
+        target device is (at least 1)
+        """
+        if not Settings.is_ssh_config_set():
+            return 1
+        rtt_ms = ConnectionSupervisor.status(Settings.current_device.name).smoothed_rtt_ms
+        if rtt_ms is None:
+            return 1
+        return min(cls.max_rtt_factor, max(1, rtt_ms / cls.reference_rtt_ms))
+
+    @classmethod
+    def link_up(cls) -> bool:
+        """
+        Checks if the link to the target device is up (always True if the
+        commands run locally or the links are not supervised)
+        """
+        if not Settings.is_ssh_config_set() or not ConnectionSupervisor.is_running():
+            return True
+        return (
+            ConnectionSupervisor.status(Settings.current_device.name).state
+            == LinkState.CONNECTED
+        )
+
+    @classmethod
+    def _run(cls):
+        while not cls._stop_event.is_set():
+            cls._request_visibility_update()
+
+            now = time.monotonic()
+            link_up = cls.link_up()
+            rtt_factor = cls.rtt_factor()
+
+            with cls._lock:
+                due = [
+                    task
+                    for task in cls._tasks.values()
+                    if not task.running
+                    and task.visible
+                    and (link_up or not task.remote)
+                    and task.next_run <= now
+                ]
+                due.sort(key=lambda task: task.priority)
+                for task in due:
+                    task.running = True
+
+            for task in due:
+                cls._executor.submit(cls._execute, task, rtt_factor)
+
+            cls._wake_event.wait(cls.tick_s)
+            cls._wake_event.clear()
+
+    @classmethod
+    def _execute(cls, task: PeriodicTask, rtt_factor: float):
+        try:
+            task.function()
+            task.errors = 0
+        except Exception as e:
+            task.errors += 1
+            LogManager.debug(f"Periodic task {task.name} failed ({task.errors}): {e}")
+        finally:
+            task.next_run = time.monotonic() + task.next_interval_s(rtt_factor)
+            task.running = False
+
+    @classmethod
+    def _request_visibility_update(cls):
+        # Widgets can only be queried in the Tk main thread
+        if AsyncManager.root is None or cls._updating_visibility:
+            return
+        cls._updating_visibility = True
+        AsyncManager.call_in_tk(cls._update_visibility)
+
+    @classmethod
+    def _update_visibility(cls):
+        with cls._lock:
+            tasks = list(cls._tasks.values())
+
+        for task in tasks:
+            if task.visible_when is None:
+                continue
+            try:
+                task.visible = bool(task.visible_when())
+            except Exception:
+                # The widget was destroyed
+                with cls._lock:
+                    if cls._tasks.get(task.name) is task:
+                        del cls._tasks[task.name]
+
+        cls._updating_visibility = False
@@ -0,0 +1,152 @@
+import tkinter
+from typing import Callable, List
+
+import Widgets.ThemedCtkWidgets as tcw
+from AsyncManager import AsyncManager
+from DeviceConfig.Device import Device
+from FleetManager import DeviceResult, FleetManager
+from Settings import Settings
+
+
+class FleetWindow(tcw.CTkToplevel):
+    def __init__(self, master):
+        """
+        Window to run, stop or soft stop the nodes on several target devices at
+        the same time, showing the result on each of them
+
+        Parameters:
+            master: The parent widget.
+
+        Example:
+            fleet_window = None
+
+            def open_fleet_window():
+                if fleet_window is None or not fleet_window.winfo_exists():
+                    fleet_window = FleetWindow(master)
+        """
+        super().__init__(master)
+
+        self.title("Fleet")
+        self.columnconfigure((0, 1, 2), weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.label = tcw.CTkLabel(
+            self, text="Select the target devices to operate on at the same time:"
+        )
+        self.label.grid(row=0, column=0, columnspan=3, padx=20, pady=(20, 10), sticky="nw")
+
+        # One row per device, with a checkbox and a label for the result
+        self.devices_frame = tcw.CTkScrollableFrame(self)
+        self.devices_frame.columnconfigure(1, weight=1)
+        self.devices_frame.grid(
+            row=1, column=0, columnspan=3, padx=20, pady=(0, 10), sticky="nsew"
+        )
+
+        self.devices: List[Device] = [
+            device for device in Settings.target_devices if device.ssh_config is not None
+        ]
+        self.devices_selected: List[tkinter.BooleanVar] = []
+        self.result_labels: List[tcw.CTkLabel] = []
+
+        for row, device in enumerate(self.devices):
+            self.devices_selected.append(tkinter.BooleanVar(value=True))
+
+            checkbox = tcw.CTkCheckBox(
+                self.devices_frame,
+                text=device.name,
+                variable=self.devices_selected[-1],
+                command=self.update_buttons,
+            )
+            checkbox.grid(row=row, column=0, padx=10, pady=5, sticky="nw")
+
+            self.result_labels.append(tcw.CTkLabel(self.devices_frame, text=""))
+            self.result_labels[-1].grid(row=row, column=1, padx=10, pady=5, sticky="nw")
+
+        # Buttons for each operation
+        self.run_btn = tcw.CTkButton(
+            self,
+            text="Run",
+            command=lambda: self.run_operation(FleetManager.launch),
+            tooltip_text="Runs the nodes of each selected device (as set in its\n"
+            + "nodes file) in a Tmux session called 'BirdWatch'",
+        )
+        self.run_btn.grid(row=2, column=0, padx=(20, 5), pady=(0, 20), sticky="ew")
+
+        self.stop_btn = tcw.CTkButton(
+            self,
+            text="Stop",
+            command=lambda: self.run_operation(FleetManager.stop),
+            tooltip_text="Closes the Tmux session 'BirdWatch' in each selected device",
+        )
+        self.stop_btn.grid(row=2, column=1, padx=5, pady=(0, 20), sticky="ew")
+
+        self.soft_stop_btn = tcw.CTkButton(
+            self,
+            text="Soft Stop",
+            command=lambda: self.run_operation(FleetManager.soft_stop),
+            tooltip_text="Stops each node in the Tmux session 'BirdWatch' of each\n"
+            + "selected device by sending 'Ctrl+C' to each pane",
+        )
+        self.soft_stop_btn.grid(row=2, column=2, padx=(5, 20), pady=(0, 20), sticky="ew")
+
+        self.running = False
+        self.update_buttons()
+
+    def selected_devices(self) -> List[Device]:
+        return [
+            device
+            for device, selected in zip(self.devices, self.devices_selected)
+            if selected.get()
+        ]
+
+    def update_buttons(self):
+        """
+        Enables the buttons if any device is selected and no operation is running
+        """
+        state = (
+            "normal" if self.selected_devices() and not self.running else "disabled"
+        )
+        for button in (self.run_btn, self.stop_btn, self.soft_stop_btn):
+            button.configure(state=state)
+
+    def run_operation(
+        self, operation: Callable[[List[Device]], List[DeviceResult]]
+    ):
+        """
+        Runs a FleetManager operation on the selected devices in the background
+        and shows the results once it finishes
+        """
+        devices = self.selected_devices()
+
+        self.running = True
+        self.update_buttons()
+        for device, label in zip(self.devices, self.result_labels):
+            label.configure(text="..." if device in devices else "")
+
+        AsyncManager.deliver(
+            self,
+            AsyncManager.run_blocking(operation, devices),
+            self.show_results,
+            self.show_error,
+        )
+
+    def show_results(self, results: List[DeviceResult]):
+        for result in results:
+            label = self.result_labels[
+                [device.name for device in self.devices].index(result.device_name)
+            ]
+            label.configure(
+                text=("" if result.success else "Error: ")
+                + f"{result.message} ({result.duration_s:.1f} s)"
+            )
+
+        self.running = False
+        self.update_buttons()
+
+    def show_error(self, error: Exception):
+        for label in self.result_labels:
+            if label.cget("text") == "...":
+                label.configure(text=f"Error: {error}")
+
+        self.running = False
+        self.update_buttons()
@@ -0,0 +1,178 @@
+import tkinter
+
+import customtkinter as ctk
+
+import Widgets.ThemedCtkWidgets as tcw
+from LaunchJob import LaunchJob
+
+
+class LaunchTimelineWindow(tcw.CTkToplevel):
+    # Milliseconds between updates of the timeline
+    refresh_interval_ms: int = 200
+
+    # Size of the rows of the timeline, in pixels
+    row_height: int = 28
+    name_width: int = 160
+    message_width: int = 260
+
+    STATE_COLORS = {
+        "waiting": "#7f8c8d",
+        "started": "#3498db",
+        "ready": "#2ecc71",
+        "failed": "#e74c3c",
+        "cancelled": "#95a5a6",
+    }
+
+    def __init__(self, master, job: LaunchJob):
+        """
+        Window showing, while the nodes are launched in the background, when each
+        one was started and became ready (or failed) as bars on a timeline, with a
+        button to cancel the launch of the nodes not yet started
+
+        Parameters:
+            master: The parent widget.
+            job (LaunchJob): launch to show
+
+        Example:
+            job = LaunchJob(commands)
+            job.start()
+            timeline_window = LaunchTimelineWindow(master, job)
+        """
+        super().__init__(master)
+
+        self.job = job
+
+        self.title("Launch")
+        self.geometry("800x" + str(min(600, 130 + self.row_height * len(job.nodes))))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.status_label = tcw.CTkLabel(self, text="Launching...")
+        self.status_label.grid(
+            row=0, column=0, columnspan=2, padx=20, pady=(10, 0), sticky="w"
+        )
+
+        self.canvas = tkinter.Canvas(
+            self,
+            highlightthickness=0,
+            background=self._apply_appearance_mode(
+                ctk.ThemeManager.theme["CTkFrame"]["fg_color"]
+            ),
+        )
+        self.canvas.grid(
+            row=1, column=0, columnspan=2, padx=20, pady=10, sticky="nsew"
+        )
+        self.text_color = self._apply_appearance_mode(
+            ctk.ThemeManager.theme["CTkLabel"]["text_color"]
+        )
+
+        self.cancel_btn = tcw.CTkButton(
+            self,
+            text="Cancel launch",
+            command=self.job.cancel,
+            tooltip_text="Does not start the nodes that are still waiting\n"
+            + "(the ones already started keep running)",
+        )
+        self.cancel_btn.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="w")
+
+        self.close_btn = tcw.CTkButton(self, text="Close", command=self.destroy)
+        self.close_btn.grid(row=2, column=1, padx=20, pady=(0, 20), sticky="e")
+
+        self.update_timeline()
+
+    def update_timeline(self):
+        if not self.winfo_exists():
+            return
+
+        elapsed_s = self.job.elapsed_s
+        with self.job.lock:
+            nodes = [
+                (node.name, node.state, node.started_s, node.finished_s, node.message)
+                for node in self.job.nodes.values()
+            ]
+
+        self.draw(nodes, elapsed_s)
+
+        if self.job.running:
+            self.status_label.configure(
+                text=("Cancelling" if self.job.cancelled else "Launching")
+                + f"... {elapsed_s:.1f} s"
+            )
+            self.after(self.refresh_interval_ms, self.update_timeline)
+        else:
+            self.cancel_btn.configure(state="disabled")
+            error = self.job.future.exception() if self.job.future else None
+            if self.job.cancelled:
+                text = f"Launch cancelled after {elapsed_s:.1f} s"
+            elif error is not None:
+                text = f"Launch finished with errors after {elapsed_s:.1f} s"
+            else:
+                text = f"Launch finished in {elapsed_s:.1f} s"
+            self.status_label.configure(text=text)
+
+    def draw(self, nodes: list, elapsed_s: float):
+        self.canvas.delete("all")
+
+        width = max(
+            self.canvas.winfo_width(), self.name_width + self.message_width + 100
+        )
+        bars_width = width - self.name_width - self.message_width
+        # Pixels per second (at least 10 seconds are shown)
+        scale = bars_width / max(elapsed_s, 10)
+
+        for row, (name, state, started_s, finished_s, message) in enumerate(nodes):
+            top = row * self.row_height + 4
+            bottom = top + self.row_height - 8
+            middle = (top + bottom) / 2
+            color = self.STATE_COLORS.get(state, self.STATE_COLORS["waiting"])
+
+            self.canvas.create_text(
+                0, middle, text=name, anchor="w", fill=self.text_color
+            )
+
+            if started_s is not None:
+                end_s = finished_s if finished_s is not None else elapsed_s
+                self.canvas.create_rectangle(
+                    self.name_width + started_s * scale,
+                    top,
+                    self.name_width + max(end_s * scale, started_s * scale + 2),
+                    bottom,
+                    fill=color,
+                    width=0,
+                )
+
+            if state == "ready":
+                text = f"ready at {finished_s:.1f} s"
+            elif state == "started":
+                text = f"started at {started_s:.1f} s"
+            elif state == "failed":
+                text = f"failed: {message}" if message else "failed"
+            else:
+                text = state
+            self.canvas.create_text(
+                self.name_width + bars_width + 10,
+                middle,
+                text=text,
+                anchor="w",
+                fill=color,
+                width=self.message_width - 10,
+            )
+
+        # Time axis
+        axis_y = len(nodes) * self.row_height + 10
+        self.canvas.create_line(
+            self.name_width,
+            axis_y,
+            self.name_width + bars_width,
+            axis_y,
+            fill=self.text_color,
+        )
+        step_s = 1 if elapsed_s <= 10 else 5 if elapsed_s <= 60 else 30
+        tick_s = 0
+        while tick_s * scale <= bars_width:
+            x = self.name_width + tick_s * scale
+            self.canvas.create_line(x, axis_y, x, axis_y + 4, fill=self.text_color)
+            self.canvas.create_text(
+                x, axis_y + 6, text=f"{tick_s} s", anchor="n", fill=self.text_color
+            )
+            tick_s += step_s
@@ -0,0 +1,117 @@
+import customtkinter as ctk
+
+import Widgets.ThemedCtkWidgets as tcw
+from Metrics import Metrics
+
+
+class MetricsWindow(tcw.CTkToplevel):
+    # Milliseconds between updates of the table
+    refresh_interval_ms: int = 1000
+
+    def __init__(self, master):
+        """
+        Window showing, for each user action and remote operation, how many
+        calls, requests and bytes it took and how long the calls lasted, as
+        measured by Metrics
+
+        Parameters:
+            master: The parent widget.
+
+        Example:
+            metrics_window = None
+
+            def open_metrics_window():
+                if metrics_window is None or not metrics_window.winfo_exists():
+                    metrics_window = MetricsWindow(master)
+        """
+        super().__init__(master)
+
+        self.title("Metrics")
+        self.geometry("900x400")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.textbox = tcw.CTkTextbox(
+            self, wrap="none", font=ctk.CTkFont(family="monospace")
+        )
+        self.textbox.grid(
+            row=0, column=0, columnspan=2, padx=20, pady=(20, 10), sticky="nsew"
+        )
+
+        self.reset_btn = tcw.CTkButton(
+            self,
+            text="Reset",
+            command=self.reset,
+            tooltip_text="Removes all the measurements",
+        )
+        self.reset_btn.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="w")
+
+        self.close_btn = tcw.CTkButton(self, text="Close", command=self.destroy)
+        self.close_btn.grid(row=1, column=1, padx=20, pady=(0, 20), sticky="e")
+
+        self.update_job = None
+        self.update_table()
+
+    def update_table(self):
+        if not self.winfo_exists():
+            return
+
+        rows = [
+            (
+                "Action",
+                "Operation",
+                "Calls",
+                "Errors",
+                "p50 ms",
+                "p95 ms",
+                "Max ms",
+                "Requests",
+                "Sent",
+                "Received",
+            )
+        ]
+        for stats in Metrics.stats():
+            rows.append(
+                (
+                    stats.action or "-",
+                    stats.operation,
+                    str(stats.count),
+                    str(stats.errors),
+                    f"{stats.percentile_ms(0.5):.0f}",
+                    f"{stats.percentile_ms(0.95):.0f}",
+                    f"{stats.max_s * 1000:.0f}",
+                    str(stats.requests),
+                    self.format_bytes(stats.bytes_sent),
+                    self.format_bytes(stats.bytes_received),
+                )
+            )
+
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        lines = [
+            "  ".join(
+                # Names aligned to the left, numbers to the right
+                value.ljust(width) if column < 2 else value.rjust(width)
+                for column, (value, width) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        ]
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", "\n".join(lines))
+        self.textbox.configure(state="disabled")
+
+        self.update_job = self.after(self.refresh_interval_ms, self.update_table)
+
+    def reset(self):
+        Metrics.reset()
+        self.after_cancel(self.update_job)
+        self.update_table()
+
+    @staticmethod
+    def format_bytes(size: int) -> str:
+        for unit in ("B", "kB", "MB"):
+            if size < 1024:
+                return f"{size:.0f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GB"
@@ -0,0 +1,179 @@
+import re
+import threading
+from collections import deque
+from typing import Deque, List, Tuple
+
+import customtkinter as ctk
+
+import Widgets.ThemedCtkWidgets as tcw
+from AsyncManager import AsyncManager
+from ShellCommands import CommandError
+from TmuxControl import TmuxControl, TmuxControlConnection
+
+
+class NodeOutputWindow(tcw.CTkToplevel):
+    # Lines shown at most (the oldest ones are removed)
+    max_lines: int = 1000
+    # Milliseconds between insertions of the new lines in the text
+    flush_interval_ms: int = 200
+
+    ERROR_PATTERN = re.compile(
+        r"\[(ERROR|FATAL)\]|\b(error|exception|traceback|fatal|failed|died)\b",
+        re.IGNORECASE,
+    )
+    WARNING_PATTERN = re.compile(r"\[WARN(ING)?\]|\bwarning\b", re.IGNORECASE)
+
+    def __init__(self, master, node_name: str, session_name: str = "BirdWatch"):
+        """
+        Window showing the last lines written by a node in its tmux pane, and
+        the new ones as they are written, with errors and warnings highlighted
+
+        Parameters:
+            master: The parent widget.
+            node_name (str): name of the node (as in the nodes file)
+            session_name (str, optional): tmux session in which the node runs
+
+        Example:
+            output_window = None
+
+            def open_output_window():
+                if output_window is None or not output_window.winfo_exists():
+                    output_window = NodeOutputWindow(master, "MAVROS")
+        """
+        super().__init__(master)
+
+        self.node_name = node_name
+        self.session_name = session_name
+
+        self.title(f"Output of {node_name}")
+        self.geometry("800x400")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.status_label = tcw.CTkLabel(self, text=f"Looking for {node_name}...")
+        self.status_label.grid(row=0, column=0, padx=20, pady=(10, 0), sticky="w")
+
+        self.textbox = tcw.CTkTextbox(
+            self, wrap="none", font=ctk.CTkFont(family="monospace")
+        )
+        self.textbox.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
+        self.textbox.tag_config("error", foreground="#ff6b6b")
+        self.textbox.tag_config("warning", foreground="#f0c674")
+        self.textbox.configure(state="disabled")
+
+        self.close_btn = tcw.CTkButton(self, text="Close", command=self.destroy)
+        self.close_btn.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="e")
+
+        # Lines received and not yet shown (written from the connection thread)
+        self.pending_lines: Deque[str] = deque(maxlen=self.max_lines)
+        self.pending_lock = threading.Lock()
+        self.lines_shown = 0
+
+        self.pane_id: str = None
+        self.connection: TmuxControlConnection = None
+        # The pane is subscribed to from a worker thread, possibly after the
+        # window was closed
+        self.subscription_lock = threading.Lock()
+        self.closed = False
+
+        self.bind("<Destroy>", self.on_destroy)
+
+        AsyncManager.deliver(
+            self,
+            AsyncManager.run_blocking(self.find_pane),
+            self.show_pane,
+            self.show_error,
+        )
+
+    def find_pane(self) -> Tuple[str, List[str]]:
+        """
+        Finds the pane of the node and starts receiving its output (in a worker
+        thread)
+
+        Returns:
+            tuple: target of the pane (string) and its last lines (list[string])
+        """
+        session = TmuxControl.session(self.session_name)
+        if session is None:
+            raise CommandError(f'Tmux session "{self.session_name}" is not running')
+        window, pane = session.node_pane(self.node_name)
+        if pane is None:
+            raise CommandError(
+                f'{self.node_name} was not launched in session "{self.session_name}"'
+            )
+
+        connection = TmuxControl.connection(self.session_name)
+        with self.subscription_lock:
+            if self.closed:
+                raise CommandError("The window was closed")
+            self.pane_id = pane.pane_id
+            self.connection = connection
+            # The new lines are only the ones written after the last lines
+            last_lines = connection.subscribe(
+                pane.pane_id, self.on_output, self.max_lines
+            )
+        last_lines = last_lines.result(timeout=TmuxControl.timeout_s)
+
+        state = "finished" if pane.dead else f"running {pane.command}"
+        return f"{session.target(window, pane)} ({state})", last_lines
+
+    def show_pane(self, result: Tuple[str, List[str]]):
+        target, last_lines = result
+        self.status_label.configure(text=f"{self.node_name} in pane {target}")
+        self.insert_lines(last_lines)
+        self.flush_lines()
+
+    def show_error(self, error: Exception):
+        self.status_label.configure(text=f"{error}")
+
+    def on_output(self, lines: List[str]):
+        with self.pending_lock:
+            self.pending_lines.extend(lines)
+
+    def flush_lines(self):
+        # Inserts the lines received since the last time all at once
+        if not self.winfo_exists():
+            return
+
+        with self.pending_lock:
+            lines = list(self.pending_lines)
+            self.pending_lines.clear()
+        self.insert_lines(lines)
+
+        self.after(self.flush_interval_ms, self.flush_lines)
+
+    def insert_lines(self, lines: List[str]):
+        if not lines:
+            return
+
+        # Only scroll to the new lines if the end was shown
+        at_end = self.textbox.yview()[1] >= 1.0
+
+        self.textbox.configure(state="normal")
+        for line in lines:
+            if self.ERROR_PATTERN.search(line):
+                tags = ("error",)
+            elif self.WARNING_PATTERN.search(line):
+                tags = ("warning",)
+            else:
+                tags = ()
+            self.textbox.insert("end", line + "\n", tags)
+        self.lines_shown += len(lines)
+
+        # Keep only the last lines
+        excess = self.lines_shown - self.max_lines
+        if excess > 0:
+            self.textbox.delete("1.0", f"{excess + 1}.0")
+            self.lines_shown -= excess
+        self.textbox.configure(state="disabled")
+
+        if at_end:
+            self.textbox.see("end")
+
+    def on_destroy(self, event):
+        if event.widget is not self:
+            return
+        with self.subscription_lock:
+            self.closed = True
+            if self.connection is not None:
+                self.connection.unsubscribe(self.pane_id, self.on_output)
@@ -1,2 +1,6 @@
 from .ConfirmationWindow import ConfirmationWindow
+from .FleetWindow import FleetWindow
+from .LaunchTimelineWindow import LaunchTimelineWindow
 from .MessageWindow import MessageWindow
+from .MetricsWindow import MetricsWindow
+from .NodeOutputWindow import NodeOutputWindow
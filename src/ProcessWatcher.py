@@ -0,0 +1,135 @@
+import shlex
+import threading
+from typing import Any, Callable, Optional
+
+from AsyncManager import AsyncManager
+from LogManager import LogManager
+from ShellCommands import ShellCommands as sh
+
+
+class ProcessWatcher:
+    # Seconds between checks on the device
+    check_interval_s: float = 0.5
+
+    # Seconds after which the state is sent again even if it did not change, so
+    # that the watcher stops once nobody reads its output
+    heartbeat_interval_s: float = 5
+
+    # Seconds before starting the watcher again after it stopped (e.g. because
+    # the connection dropped), checking the state once in the meantime
+    retry_interval_s: float = 5
+
+    def __init__(self, pattern: str, on_change: Callable[[Optional[bool]], Any]):
+        """
+        Watches whether a process is running on the target device. A single
+        long-lived command on the device checks it and only sends the state when
+        it changes, instead of running a new command each time. If the watcher
+        cannot run, the state is checked with a single command every
+        "retry_interval_s" seconds until it is started again
+
+        Parameters:
+            pattern (string): pattern of the command line of the process (as
+                given to "pgrep -f")
+            on_change (Callable): called in the Tk main thread when the state
+                changes, with True if the process is running, False if it is not,
+                or None if the state could not be checked
+
+        Example:
+            watcher = ProcessWatcher("ros2 bag record", lambda running: print(running))
+            watcher.start()
+        """
+        self.pattern = pattern
+        self.on_change = on_change
+
+        # Last state given to "on_change"
+        self.running: Optional[bool] = None
+
+        self._device = None
+        self._process = None
+        self._thread: threading.Thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """
+        Starts watching the process on the current target device, in the
+        background
+        """
+        self._device = sh.target_device()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="BirdWatchProcessWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching the process
+        """
+        self._stop_event.set()
+        if self._process is not None:
+            self._process.close()
+
+    def poll(self) -> Optional[bool]:
+        """
+        Checks once if the process is running
+
+        Returns:
+            bool: True if it is running, or None if it could not be checked
+        """
+        try:
+            output = sh.execute(
+                f"pgrep -f {shlex.quote(self._own_pattern())} >/dev/null "
+                + "&& echo 1 || echo 0"
+            )
+            return output.strip() == "1"
+        except Exception:
+            return None
+
+    def watch_command(self) -> str:
+        """
+        Returns the command that prints the state ("1" if the process is running
+        or "0" if not) when it changes and every "heartbeat_interval_s" seconds
+        """
+        checks_per_heartbeat = max(
+            1, round(self.heartbeat_interval_s / self.check_interval_s)
+        )
+        return (
+            "last=; n=0; while :; do "
+            + f"if pgrep -f {shlex.quote(self._own_pattern())} >/dev/null; "
+            + "then state=1; else state=0; fi; "
+            + f'if [ "$state" != "$last" ] || [ $n -ge {checks_per_heartbeat} ]; '
+            # Writing fails once the output is closed, which ends the watcher
+            + "then echo $state || exit; last=$state; n=0; fi; "
+            + f"n=$((n+1)); sleep {self.check_interval_s}; done"
+        )
+
+    def _own_pattern(self) -> str:
+        # Equivalent pattern that does not match the command line of the command
+        # searching for it (e.g. "[r]os2 bag record")
+        return f"[{self.pattern[0]}]{self.pattern[1:]}"
+
+    def _run(self):
+        with sh.on_device(self._device):
+            while not self._stop_event.is_set():
+                try:
+                    self._process = sh.execute_stream(self.watch_command())
+                    for line in self._process:
+                        if self._stop_event.is_set():
+                            break
+                        self._set_state(line.strip() == "1")
+                except Exception as e:
+                    LogManager.debug(f"Watcher of '{self.pattern}' stopped: {e}")
+                finally:
+                    if self._process is not None:
+                        self._process.close()
+
+                if self._stop_event.is_set():
+                    break
+
+                self._set_state(self.poll())
+                self._stop_event.wait(self.retry_interval_s)
+
+    def _set_state(self, running: Optional[bool]):
+        if running != self.running:
+            self.running = running
+            AsyncManager.call_in_tk(self.on_change, running)
@@ -0,0 +1,157 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Dict, Set
+
+from LogManager import LogManager
+from Settings import Settings
+
+
+class SSHMaster:
+    """
+    Keeps an OpenSSH master connection (ControlMaster) open to each device, so
+    that the ssh processes started for terminals, tmux sessions and rsync go
+    through it instead of each one connecting and authenticating again
+
+    Example:
+        SSHMaster.start(device)
+        subprocess.run(
+            f"ssh {SSHMaster.ssh_options(device)} -t {SSHMaster.destination(device)} htop",
+            shell=True,
+        )
+    """
+
+    _control_dir: str = None
+    # By path of the socket
+    _masters: Dict[str, subprocess.Popen] = {}
+    _destinations: Dict[str, str] = {}
+    # Masters that could not be started without user interaction (e.g. asking
+    # for a password), which are not started again in the background
+    _failed: Set[str] = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def destination(cls, device) -> str:
+        """
+        Returns the "user@ip" of the device on its selected network
+        """
+        ssh_config = device.ssh_config
+        return (
+            f"{ssh_config.username}@{ssh_config.networks[ssh_config.selected_network].ip}"
+        )
+
+    @classmethod
+    def control_path(cls, device) -> str:
+        """
+        Returns the path of the socket of the master connection to the device on
+        its selected network
+        """
+        network = device.ssh_config.networks[device.ssh_config.selected_network]
+
+        with cls._lock:
+            if cls._control_dir is None:
+                # Short path, as the length of socket paths is limited
+                cls._control_dir = tempfile.mkdtemp(prefix="birdwatch-ssh-")
+
+            # Remembered to close the master connection on exit, also if it was
+            # started by a terminal
+            name = re.sub(r"[^\w.-]", "_", f"{device.name}-{network.name}")
+            control_path = os.path.join(cls._control_dir, name)
+            cls._destinations[control_path] = cls.destination(device)
+        return control_path
+
+    @classmethod
+    def ssh_options(cls, device) -> str:
+        """
+        Returns the options of ssh to go through the master connection to the
+        device (or to become the master connection if it is not running)
+        """
+        return (
+            f"-o ControlMaster=auto -o ControlPath={cls.control_path(device)} "
+            + f"-o ControlPersist={int(Settings.connection_idle_timeout_s)}"
+        )
+
+    @classmethod
+    def start(cls, device, retry_failed: bool = False):
+        """
+        Starts the master connection to the device in the background, if it is not
+        running yet
+
+        Parameters:
+            device (Device): device to connect to
+            retry_failed (bool, optional): try again even if the last attempt
+                failed because it needed user interaction
+        """
+        if shutil.which("ssh") is None:
+            return
+
+        control_path = cls.control_path(device)
+
+        with cls._lock:
+            process = cls._masters.get(control_path)
+            if os.path.exists(control_path) or (
+                process is not None and process.poll() is None
+            ):
+                # Running (maybe started by a terminal), or still authenticating
+                return
+            if process is not None and process.returncode != 0:
+                cls._failed.add(control_path)
+
+            if control_path in cls._failed and not retry_failed:
+                return
+            cls._failed.discard(control_path)
+
+            # "-f" makes ssh go to the background once authenticated, and
+            # "BatchMode" makes it fail instead of asking for a password
+            cls._masters[control_path] = subprocess.Popen(
+                [
+                    "ssh",
+                    "-MNf",
+                    "-o", "BatchMode=yes",
+                    "-o", "StrictHostKeyChecking=accept-new",
+                    "-o", "ConnectTimeout=5",
+                    "-o", f"ServerAliveInterval={max(1, int(Settings.keepalive_interval_s))}",
+                    "-o", f"ControlPath={control_path}",
+                    "-o", f"ControlPersist={int(Settings.connection_idle_timeout_s)}",
+                    cls._destinations[control_path],
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )  # fmt: skip
+        LogManager.info(f"Starting SSH master connection to {device.name}")
+
+    @classmethod
+    def stop_all(cls):
+        """
+        Stops all the master connections: they do not accept new sessions and
+        close once the terminals still using them are closed
+        """
+        with cls._lock:
+            processes = list(cls._masters.values())
+            destinations = dict(cls._destinations)
+            control_dir = cls._control_dir
+            cls._masters.clear()
+            cls._destinations.clear()
+            cls._failed.clear()
+            cls._control_dir = None
+
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+        for control_path, destination in destinations.items():
+            if os.path.exists(control_path):
+                subprocess.run(
+                    ["ssh", "-o", f"ControlPath={control_path}", "-O", "stop"]
+                    + [destination],
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    timeout=5,
+                )
+
+        if control_dir is not None:
+            shutil.rmtree(control_dir, ignore_errors=True)
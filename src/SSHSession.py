@@ -0,0 +1,472 @@
+import select
+import shlex
+import threading
+import uuid
+import weakref
+from typing import Dict, Iterator, List, Tuple
+
+import paramiko
+
+from LogManager import LogManager
+
+
+class RemoteShellError(Exception):
+    pass
+
+
+class ShellEnvironment:
+    # Prints the home directory, the paths of tmux and ros2 (empty if not found)
+    # and all the environment variables, separated by null characters
+    SNAPSHOT_COMMAND = (
+        "printf '%s\\0' ~/ \"$(command -v tmux)\" \"$(command -v ros2)\"; env -0"
+    )
+
+    def __init__(
+        self,
+        variables: Dict[str, str],
+        home_dir: str,
+        tmux_path: str = "",
+        ros2_path: str = "",
+    ):
+        """
+        Snapshot of the environment seen by the commands run on a device
+
+        Parameters:
+            variables (dictionary): environment variables
+            home_dir (string): home directory, ending with "/"
+            tmux_path (string, optional): path of tmux, empty if not installed
+            ros2_path (string, optional): path of ros2, empty if not installed
+        """
+        self.variables = variables
+        self.home_dir = home_dir
+        self.tmux_path = tmux_path
+        self.ros2_path = ros2_path
+
+    @property
+    def ros_version(self) -> str:
+        return self.variables.get("ROS_VERSION", "")
+
+    @property
+    def ros_distro(self) -> str:
+        return self.variables.get("ROS_DISTRO", "")
+
+    @property
+    def tmux_available(self) -> bool:
+        return self.tmux_path != ""
+
+    @property
+    def ros2_available(self) -> bool:
+        return self.ros2_path != ""
+
+    @classmethod
+    def parse(cls, output: bytes) -> "ShellEnvironment":
+        """
+        Creates the snapshot from the output of SNAPSHOT_COMMAND
+
+        Parameters:
+            output (bytes): stdout of SNAPSHOT_COMMAND
+        """
+        fields = output.decode("utf-8", errors="replace").split("\0")
+        home_dir, tmux_path, ros2_path = fields[:3]
+
+        variables = {}
+        for field in fields[3:]:
+            name, separator, value = field.partition("=")
+            if separator:
+                variables[name] = value
+
+        return cls(variables, home_dir, tmux_path, ros2_path)
+
+
+class RemoteProcess:
+    def __init__(self, client: paramiko.SSHClient, command: str):
+        """
+        Command running on the remote device on its own channel, whose output can
+        be read while it runs. stdout and stderr are drained at the same time, so
+        the command never stalls because one of them is full
+
+        Parameters:
+            client (paramiko.SSHClient): connected client on which to run the command
+            command (string): Command to execute
+
+        Example:
+            process = RemoteProcess(client, "ls -l /")
+            for line in process:
+                print(line, end="")
+            print(process.exit_code, process.stderr)
+        """
+        self.channel = client.get_transport().open_session()
+        self.channel.exec_command(command)
+
+        # Set once the command finishes
+        self.exit_code: int = None
+
+        self._stderr = bytearray()
+
+    @property
+    def stderr(self) -> str:
+        """
+        Error output received so far
+        """
+        return self._stderr.decode("utf-8", errors="replace")
+
+    def __iter__(self) -> Iterator[str]:
+        return self.lines()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def lines(self) -> Iterator[str]:
+        """
+        Yields the lines of stdout (including the line break) as they arrive
+        """
+        buffer = bytearray()
+        for chunk in self._read_stdout():
+            buffer += chunk
+            line_end = buffer.rfind(b"\n") + 1
+            if line_end > 0:
+                yield from (
+                    line.decode("utf-8", errors="replace")
+                    for line in bytes(buffer[:line_end]).splitlines(keepends=True)
+                )
+                del buffer[:line_end]
+
+        if buffer:
+            yield buffer.decode("utf-8", errors="replace")
+
+    def communicate(self) -> Tuple[bytes, bytes, int]:
+        """
+        Waits for the command to finish
+
+        Returns:
+            tuple: stdout (bytes), stderr (bytes) and exit code (int) of the command
+        """
+        stdout = b"".join(self._read_stdout())
+        return stdout, bytes(self._stderr), self.exit_code
+
+    def wait(self) -> int:
+        """
+        Waits for the command to finish, discarding the rest of its stdout
+
+        Returns:
+            int: exit code of the command
+        """
+        for _ in self._read_stdout():
+            pass
+        return self.exit_code
+
+    def write(self, data: str):
+        """
+        Sends data to the stdin of the command
+        """
+        self.channel.sendall(data.encode("utf-8"))
+
+    def close(self):
+        """
+        Closes the channel, stopping the reading of the output
+        """
+        self.channel.close()
+
+    def _read_stdout(self) -> Iterator[bytes]:
+        try:
+            while True:
+                if self.channel.recv_ready():
+                    chunk = self.channel.recv(32768)
+                    if chunk:
+                        yield chunk
+                elif self.channel.recv_stderr_ready():
+                    self._stderr += self.channel.recv_stderr(32768)
+                elif self.channel.eof_received or self.channel.closed:
+                    # The exit status can arrive before the rest of the output,
+                    # so the output is read until the end of the channel
+                    break
+                else:
+                    select.select([self.channel], [], [], 1.0)
+
+            while self.channel.recv_stderr_ready():
+                self._stderr += self.channel.recv_stderr(32768)
+
+            if self.exit_code is None:
+                self.exit_code = self.channel.recv_exit_status()
+        finally:
+            # Also reached if the caller stops iterating before the end
+            self.close()
+
+
+class RemoteShell:
+    def __init__(self, client: paramiko.SSHClient):
+        """
+        Long-lived shell on the remote device. Commands are written to the
+        standard input of the shell one after another, and their end is detected
+        by a unique sentinel printed after each of them (together with their exit
+        code), which avoids opening a new channel and starting a new shell for
+        every command
+
+        Parameters:
+            client (paramiko.SSHClient): connected client on which to open the shell
+        """
+        self.channel = client.get_transport().open_session()
+
+        # The shell is started by the login shell of the user, so the environment
+        # is the same as the one seen by commands run with "exec_command"
+        self.channel.exec_command('exec "${SHELL:-/bin/sh}" -s')
+
+        # Directory for the output of each command, removed when the shell exits
+        self.channel.sendall(
+            b'bw_out_dir=$(mktemp -d 2>/dev/null) || '
+            + b'{ bw_out_dir=/tmp/birdwatch-shell-$$; mkdir -p "$bw_out_dir"; }\n'
+            + b"trap 'rm -rf \"$bw_out_dir\"' EXIT\n"
+        )
+
+        self.lock = threading.Lock()
+
+    def run(self, command: str) -> Tuple[bytes, bytes, int]:
+        """
+        Runs a command on the shell and waits for it to finish
+
+        Parameters:
+            command (string): Command to execute
+
+        Returns:
+            tuple: stdout (bytes), stderr (bytes) and exit code (int) of the command
+        """
+        token = f"__birdwatch_{uuid.uuid4().hex}__"
+
+        # Run the command in a subshell, so that changes in directory, variables
+        # or an "exit" do not affect the following commands. Its output goes to
+        # files of its own, so background jobs it starts do not write into the
+        # output of the following commands; then the files are printed followed
+        # by the sentinel, to both stdout and stderr
+        output = f'"$bw_out_dir/{token}"'
+        script = (
+            f"( eval {shlex.quote(command)} ) </dev/null >{output}.out 2>{output}.err\n"
+            f"bw_status=$?\n"
+            f"cat {output}.out; printf '%s %d\\n' {token} $bw_status\n"
+            f"cat {output}.err >&2; printf '%s\\n' {token} >&2\n"
+            f"rm -f {output}.out {output}.err\n"
+        )
+
+        with self.lock:
+            if not self.is_alive():
+                raise RemoteShellError("Remote shell is closed")
+
+            self.channel.sendall(script.encode("utf-8"))
+
+            token_bytes = token.encode("utf-8")
+            stdout = bytearray()
+            stderr = bytearray()
+            stdout_end = -1
+            stderr_end = -1
+
+            # Read stdout and stderr at the same time until both sentinels arrive
+            while stdout_end < 0 or stderr_end < 0:
+                # Only the new data (and the end of the previous one, in case the
+                # sentinel was split) is searched, so long outputs are fast
+                if self.channel.recv_ready():
+                    start = max(0, len(stdout) - len(token_bytes))
+                    stdout += self.channel.recv(32768)
+                    if stdout_end < 0:
+                        stdout_end = stdout.find(token_bytes, start)
+                elif self.channel.recv_stderr_ready():
+                    start = max(0, len(stderr) - len(token_bytes))
+                    stderr += self.channel.recv_stderr(32768)
+                    if stderr_end < 0:
+                        stderr_end = stderr.find(token_bytes, start)
+                elif self.channel.exit_status_ready() or self.channel.closed:
+                    raise RemoteShellError("Remote shell exited unexpectedly")
+                else:
+                    select.select([self.channel], [], [], 1.0)
+
+            # Wait for the end of the line containing the exit code
+            while not stdout.endswith(b"\n"):
+                stdout += self.channel.recv(32768)
+            while not stderr.endswith(b"\n"):
+                stderr += self.channel.recv_stderr(32768)
+
+            exit_code = int(stdout[stdout_end + len(token_bytes) :].split()[0])
+
+            return bytes(stdout[:stdout_end]), bytes(stderr[:stderr_end]), exit_code
+
+    def is_alive(self) -> bool:
+        """
+        Checks if the shell can still receive commands
+        """
+        return not (self.channel.closed or self.channel.exit_status_ready())
+
+    def close(self):
+        self.channel.close()
+
+
+class SSHSession:
+    def __init__(
+        self,
+        client: paramiko.SSHClient,
+        persistent_shell: bool = True,
+        max_shells: int = 2,
+    ):
+        """
+        Commands and channels related to an established SSH connection
+
+        Parameters:
+            client (paramiko.SSHClient): connected client
+            persistent_shell (bool, optional): if True, commands are run on
+                long-lived remote shells instead of a new channel per command
+            max_shells (int, optional): maximum number of long-lived shells kept
+                open at the same time (commands run in parallel from different
+                threads each need their own shell)
+        """
+        self.client = client
+        self.persistent_shell = persistent_shell
+        self.max_shells = max_shells
+
+        self._shells: List[RemoteShell] = []
+        self._idle_shells: List[RemoteShell] = []
+        self._shells_condition = threading.Condition()
+
+        # Commands started on their own channel, while they are referenced
+        self._processes: "weakref.WeakSet[RemoteProcess]" = weakref.WeakSet()
+
+        self._environment: ShellEnvironment = None
+        self._environment_lock = threading.Lock()
+
+    def environment(self) -> ShellEnvironment:
+        """
+        Returns the environment of the remote device, which is captured with a
+        single command the first time it is needed and then cached for as long
+        as the connection lasts
+
+        Returns:
+            ShellEnvironment: snapshot of the remote environment
+        """
+        with self._environment_lock:
+            if self._environment is None:
+                stdout, stderr, exit_code = self.run(ShellEnvironment.SNAPSHOT_COMMAND)
+                if exit_code != 0:
+                    raise RemoteShellError(
+                        f"Could not get the remote environment: {stderr.decode('utf-8')}"
+                    )
+                self._environment = ShellEnvironment.parse(stdout)
+            return self._environment
+
+    def invalidate_environment(self):
+        """
+        Discards the cached environment, so that it is captured again when needed
+        """
+        with self._environment_lock:
+            self._environment = None
+
+    def run(self, command: str) -> Tuple[bytes, bytes, int]:
+        """
+        Runs a command on the remote device, on a long-lived shell if possible
+
+        Parameters:
+            command (string): Command to execute
+
+        Returns:
+            tuple: stdout (bytes), stderr (bytes) and exit code (int) of the command
+        """
+        if not self.persistent_shell:
+            return self.exec(command)
+
+        try:
+            shell = self._acquire_shell()
+        except paramiko.SSHException as e:
+            # Keep working with a channel per command if the shell cannot be started
+            LogManager.warning(
+                f"Could not start persistent remote shell, falling back to a channel per command: {e}"
+            )
+            self.persistent_shell = False
+            return self.exec(command)
+
+        try:
+            return shell.run(command)
+        except Exception:
+            # A shell in an unknown state cannot be reused
+            self._discard_shell(shell)
+            raise
+        finally:
+            self._release_shell(shell)
+
+    def exec(self, command: str) -> Tuple[bytes, bytes, int]:
+        """
+        Runs a command on the remote device on a new channel
+
+        Parameters:
+            command (string): Command to execute
+
+        Returns:
+            tuple: stdout (bytes), stderr (bytes) and exit code (int) of the command
+        """
+        return self.stream(command).communicate()
+
+    def stream(self, command: str) -> RemoteProcess:
+        """
+        Starts a command on the remote device on a new channel, without waiting
+        for it to finish
+
+        Parameters:
+            command (string): Command to execute
+
+        Returns:
+            RemoteProcess: running command, whose output can be iterated line by line
+        """
+        process = RemoteProcess(self.client, command)
+        with self._shells_condition:
+            self._processes.add(process)
+        return process
+
+    def has_open_channels(self) -> bool:
+        """
+        Checks if a command is running on the session, either on a long-lived shell
+        or on its own channel (e.g. a stream that is still being read)
+        """
+        with self._shells_condition:
+            return len(self._idle_shells) < len(self._shells) or any(
+                not process.channel.closed for process in list(self._processes)
+            )
+
+    def _acquire_shell(self) -> RemoteShell:
+        with self._shells_condition:
+            while True:
+                # Drop shells that died while idle
+                for shell in [s for s in self._idle_shells if not s.is_alive()]:
+                    self._idle_shells.remove(shell)
+                    self._shells.remove(shell)
+
+                if self._idle_shells:
+                    return self._idle_shells.pop()
+
+                if len(self._shells) < self.max_shells:
+                    shell = RemoteShell(self.client)
+                    self._shells.append(shell)
+                    return shell
+
+                self._shells_condition.wait()
+
+    def _release_shell(self, shell: RemoteShell):
+        with self._shells_condition:
+            if shell in self._shells:
+                self._idle_shells.append(shell)
+            self._shells_condition.notify()
+
+    def _discard_shell(self, shell: RemoteShell):
+        with self._shells_condition:
+            if shell in self._shells:
+                self._shells.remove(shell)
+            shell.close()
+
+    def close(self):
+        """
+        Closes all the long-lived shells and the connection
+        """
+        with self._shells_condition:
+            for shell in self._shells:
+                shell.close()
+            self._shells = []
+            self._idle_shells = []
+            self._shells_condition.notify_all()
+
+        self.client.close()
@@ -0,0 +1,383 @@
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import paramiko
+from paramiko.sftp_client import SFTPClient
+
+from AsyncManager import AsyncManager
+from LogManager import LogManager
+from Metrics import MeteredSFTPClient
+from NetworkSelector import NetworkSelector
+from Settings import Settings
+from SSHSession import SSHSession
+
+
+class ActivitySocket:
+    def __init__(self, sock: socket.socket):
+        """
+        Wrapper of the TCP connection of an SSH client that records when data was
+        last received on it, so that any traffic (and not only the answers to
+        keepalive requests) shows that the link is alive
+
+        Parameters:
+            sock (socket): connected socket
+        """
+        self._sock = sock
+        self.last_received = time.monotonic()
+
+    def recv(self, *args, **kwargs) -> bytes:
+        data = self._sock.recv(*args, **kwargs)
+        if data:
+            self.last_received = time.monotonic()
+        return data
+
+    def __getattr__(self, name: str):
+        return getattr(self._sock, name)
+
+
+class PooledConnection:
+    # Port of the SSH server of the devices
+    ssh_port: int = 22
+
+    def __init__(
+        self,
+        device,
+        network_index: int,
+        persistent_shell: bool = True,
+        max_shells: int = 2,
+        sock: socket.socket = None,
+    ):
+        """
+        SSH connection to a device through one of its networks, together with the
+        session and the SFTP client opened on it
+
+        Parameters:
+            device (Device): device to connect to
+            network_index (int): index of the network of the device to connect through
+            persistent_shell (bool, optional): see SSHSession
+            max_shells (int, optional): see SSHSession
+            sock (socket, optional): TCP connection to the device already open on
+                the network, on which to start the SSH handshake
+        """
+        self.device = device
+        self.network = device.ssh_config.networks[network_index]
+
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        try:
+            LogManager.info(
+                f"Connecting to {device.name} on {device.ssh_config.username}@{self.network.ip}..."
+            )
+            if sock is None:
+                sock = socket.create_connection((self.network.ip, self.ssh_port), 5)
+            self._sock = ActivitySocket(sock)
+            self.client.connect(
+                self.network.ip,
+                port=self.ssh_port,
+                username=device.ssh_config.username,
+                timeout=5,
+                sock=self._sock,
+            )
+            LogManager.info("Connection successful")
+        except Exception as e:
+            LogManager.error(f"Failed to establish SSH connection: {e}")
+            self.client.close()
+            if sock is not None:
+                sock.close()
+            raise
+
+        # Keep the link active even when no commands are run
+        self.client.get_transport().set_keepalive(
+            max(1, int(Settings.keepalive_interval_s))
+        )
+
+        self.session = SSHSession(
+            self.client, persistent_shell=persistent_shell, max_shells=max_shells
+        )
+        self.last_used = time.monotonic()
+
+        self._sftp: SFTPClient = None
+        self._sftp_lock = threading.Lock()
+
+        # SFTP clients opened with "open_sftp", while they are referenced
+        self._opened_sftp: "weakref.WeakSet[SFTPClient]" = weakref.WeakSet()
+
+    def get_sftp(self) -> SFTPClient:
+        """
+        Returns the SFTP client of the connection, opening it the first time
+        """
+        with self._sftp_lock:
+            if self._sftp is None or self._sftp.sock.closed:
+                self._sftp = MeteredSFTPClient.from_transport(
+                    self.client.get_transport()
+                )
+            return self._sftp
+
+    def open_sftp(self) -> SFTPClient:
+        """
+        Opens a new SFTP client on its own channel of the connection, for operations
+        that must not share the one returned by "get_sftp" (e.g. parallel transfers).
+        The connection is not evicted while it is open
+
+        Returns:
+            SFTPClient: new client, to be closed by the caller
+        """
+        sftp = MeteredSFTPClient.from_transport(self.client.get_transport())
+        with self._sftp_lock:
+            self._opened_sftp.add(sftp)
+        return sftp
+
+    def close_sftp(self):
+        """
+        Closes the SFTP client of the connection (it is opened again when needed)
+        """
+        with self._sftp_lock:
+            if self._sftp is not None:
+                self._sftp.close()
+                self._sftp = None
+
+    def is_alive(self) -> bool:
+        """
+        Checks if the connection is still open
+        """
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    @property
+    def last_received(self) -> float:
+        """
+        Time (as given by time.monotonic) when data was last received from the device
+        """
+        return self._sock.last_received
+
+    def has_open_channels(self) -> bool:
+        """
+        Checks if anything is still using the connection: commands running on it or
+        SFTP clients opened with "open_sftp"
+        """
+        with self._sftp_lock:
+            opened_sftp = list(self._opened_sftp)
+        return self.session.has_open_channels() or any(
+            not sftp.sock.closed for sftp in opened_sftp
+        )
+
+    def close(self):
+        """
+        Closes the SFTP client, the session and the connection
+        """
+        self.close_sftp()
+        self.session.close()
+
+
+class SessionPool:
+    """
+    Keeps the SSH connections to several devices open at the same time, so
+    that switching between devices (or operating on several at once) does not
+    need to reconnect every time. Connections are identified by device, network
+    and role (e.g. "main" for the GUI and "async" for the asynchronous API)
+
+    Example:
+        connection = SessionPool.get(device)
+        stdout, stderr, exit_code = connection.session.run("ls")
+    """
+
+    # Number of long-lived shells per connection, by role (the asynchronous
+    # API runs as many commands at the same time as it has worker threads)
+    max_shells: Dict[str, int] = {"main": 2, "async": AsyncManager.max_workers}
+
+    _connections: "OrderedDict[Tuple[str, str, str], PooledConnection]" = OrderedDict()
+    _connecting_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(
+        cls, device, network_index: int = None, role: str = "main"
+    ) -> PooledConnection:
+        """
+        Returns an open connection to a device, connecting if needed
+
+        Parameters:
+            device (Device): device to connect to
+            network_index (int, optional): index of the network to connect
+                through. If not given, the selected network of the device is used
+                (or, if "auto_select_network" is set in Settings and there is no
+                connection open on it, the fastest reachable network)
+            role (string, optional): connections with different roles to the same
+                device are kept separately
+
+        Returns:
+            PooledConnection: open connection
+        """
+        sock = None
+        if network_index is None:
+            network_index = device.ssh_config.selected_network
+            if (
+                Settings.auto_select_network
+                and len(device.ssh_config.networks) > 1
+                and not cls._is_connected(device, network_index)
+            ):
+                network_index, sock = NetworkSelector.race(device)
+        key = (device.name, device.ssh_config.networks[network_index].name, role)
+
+        with cls._lock:
+            connecting_lock = cls._connecting_locks.setdefault(key, threading.Lock())
+
+        # Connections to different devices can be established at the same time
+        with connecting_lock:
+            with cls._lock:
+                connection = cls._connections.pop(key, None)
+                if connection is not None and connection.is_alive():
+                    connection.last_used = time.monotonic()
+                    cls._connections[key] = connection
+                    evicted = cls._pop_evictable(keep=key)
+                else:
+                    evicted = [connection] if connection is not None else []
+                    connection = None
+
+            if connection is None:
+                connection = PooledConnection(
+                    device,
+                    network_index,
+                    persistent_shell=Settings.persistent_shell,
+                    max_shells=cls.max_shells.get(role, 2),
+                    sock=sock,
+                )
+
+                with cls._lock:
+                    cls._connections[key] = connection
+                    evicted += cls._pop_evictable(keep=key)
+            elif sock is not None:
+                # Another thread connected while the networks were being tried
+                sock.close()
+
+        for evicted_connection in evicted:
+            LogManager.info(
+                f"Closing connection to {evicted_connection.device.name}"
+            )
+            evicted_connection.close()
+
+        return connection
+
+    @classmethod
+    def peek(
+        cls, device, network_index: int = None, role: str = "main"
+    ) -> PooledConnection:
+        """
+        Returns the connection to a device if it is open, without connecting nor
+        counting it as used
+
+        Returns:
+            PooledConnection: connection, or None if there is none
+        """
+        if network_index is None:
+            network_index = device.ssh_config.selected_network
+        key = (device.name, device.ssh_config.networks[network_index].name, role)
+
+        with cls._lock:
+            return cls._connections.get(key)
+
+    @classmethod
+    def _is_connected(cls, device, network_index: int) -> bool:
+        # Whether any connection (of any role) to the device is open on the network
+        network_name = device.ssh_config.networks[network_index].name
+        with cls._lock:
+            return any(
+                key[:2] == (device.name, network_name) and connection.is_alive()
+                for key, connection in cls._connections.items()
+            )
+
+    @classmethod
+    def evict_idle(cls):
+        """
+        Closes the connections that have not been used for the idle timeout set
+        in Settings
+        """
+        with cls._lock:
+            evicted = cls._pop_evictable()
+        for connection in evicted:
+            connection.close()
+
+    @classmethod
+    def _pop_evictable(
+        cls, keep: Tuple[str, str, str] = None
+    ) -> List[PooledConnection]:
+        # Must be called holding the lock. The connections are ordered from least
+        # to most recently used. "last_used" is only updated by "get", so the
+        # connections still in use (e.g. by a stream started long ago) are kept,
+        # as well as the one with the key "keep" (being returned by "get")
+        evictable = [
+            key
+            for key, connection in cls._connections.items()
+            if key != keep and not connection.has_open_channels()
+        ]
+        evicted = []
+
+        # The idle connections
+        now = time.monotonic()
+        for key in list(evictable):
+            connection = cls._connections[key]
+            if now - connection.last_used > Settings.connection_idle_timeout_s:
+                evicted.append(cls._connections.pop(key))
+                evictable.remove(key)
+
+        # The least recently used ones, until there are not too many
+        for key in evictable:
+            if len(cls._connections) <= Settings.max_connections:
+                break
+            evicted.append(cls._connections.pop(key))
+        return evicted
+
+    @classmethod
+    def close(cls, device_name: str, role: str = None):
+        """
+        Closes the connections to a device
+
+        Parameters:
+            device_name (string): name of the device
+            role (string, optional): if given, only the connections with this
+                role are closed
+        """
+        with cls._lock:
+            closed = [
+                cls._connections.pop(key)
+                for key in list(cls._connections)
+                if key[0] == device_name and (role is None or key[2] == role)
+            ]
+        for connection in closed:
+            connection.close()
+
+    @classmethod
+    def discard(cls, connection: PooledConnection):
+        """
+        Closes a connection, removing it from the pool if it is still there (so
+        that the other connections to the same device are kept open)
+        """
+        with cls._lock:
+            for key, pooled_connection in list(cls._connections.items()):
+                if pooled_connection is connection:
+                    del cls._connections[key]
+        connection.close()
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes all the connections
+        """
+        with cls._lock:
+            closed = list(cls._connections.values())
+            cls._connections.clear()
+        for connection in closed:
+            connection.close()
+
+    @classmethod
+    def connections(cls) -> List[PooledConnection]:
+        """
+        Returns the open connections, from least to most recently used
+        """
+        with cls._lock:
+            return list(cls._connections.values())
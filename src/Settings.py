@@ -1,3 +1,4 @@
+import os
 import socket
 from typing import List
 
@@ -23,6 +24,19 @@ class Settings:
     target_devices: List[Device] = []
     local_ip: str = None
 
+    persistent_shell: bool = True
+    max_connections: int = 8
+    connection_idle_timeout_s: float = 600
+    keepalive_interval_s: float = 5
+    auto_select_network: bool = False
+    metrics_file: str = None
+    metrics_flush_interval_s: float = 60
+    shutdown_sigint_timeout_s: float = 10
+    shutdown_sigterm_timeout_s: float = 5
+    transfer_channels: int = 4
+    transfer_max_requests: int = 64
+    transfer_verify_checksum: bool = True
+
     root_app = None
 
     @classmethod
@@ -82,6 +96,75 @@ class Settings:
         else:
             cls.qgroundcontrol = None
 
+        # Run remote commands on long-lived shells instead of a new channel each
+        if "persistent_shell" in configData:
+            cls.persistent_shell = bool(configData["persistent_shell"])
+        else:
+            cls.persistent_shell = True
+
+        # Limits of the SSH connections kept open to the target devices
+        if "max_connections" in configData:
+            cls.max_connections = int(configData["max_connections"])
+        else:
+            cls.max_connections = 8
+        if "connection_idle_timeout_s" in configData:
+            cls.connection_idle_timeout_s = float(
+                configData["connection_idle_timeout_s"]
+            )
+        else:
+            cls.connection_idle_timeout_s = 600
+        if "keepalive_interval_s" in configData:
+            cls.keepalive_interval_s = float(configData["keepalive_interval_s"])
+        else:
+            cls.keepalive_interval_s = 5
+
+        # Connect through the fastest reachable network instead of the selected one
+        if "auto_select_network" in configData:
+            cls.auto_select_network = bool(configData["auto_select_network"])
+        else:
+            cls.auto_select_network = False
+
+        # File to which the measurements of the remote operations are written
+        if configData.get("metrics_file"):
+            cls.metrics_file = os.path.expanduser(str(configData["metrics_file"]))
+        else:
+            cls.metrics_file = None
+        if "metrics_flush_interval_s" in configData:
+            cls.metrics_flush_interval_s = float(
+                configData["metrics_flush_interval_s"]
+            )
+        else:
+            cls.metrics_flush_interval_s = 60
+
+        # Time given to the nodes to exit after 'Ctrl+C' and SIGTERM when stopped
+        if "shutdown_sigint_timeout_s" in configData:
+            cls.shutdown_sigint_timeout_s = float(
+                configData["shutdown_sigint_timeout_s"]
+            )
+        else:
+            cls.shutdown_sigint_timeout_s = 10
+        if "shutdown_sigterm_timeout_s" in configData:
+            cls.shutdown_sigterm_timeout_s = float(
+                configData["shutdown_sigterm_timeout_s"]
+            )
+        else:
+            cls.shutdown_sigterm_timeout_s = 5
+
+        # Files transferred at the same time, read requests sent ahead for each
+        # one and whether their checksums are compared (see "TransferEngine")
+        if "transfer_channels" in configData:
+            cls.transfer_channels = int(configData["transfer_channels"])
+        else:
+            cls.transfer_channels = 4
+        if "transfer_max_requests" in configData:
+            cls.transfer_max_requests = int(configData["transfer_max_requests"])
+        else:
+            cls.transfer_max_requests = 64
+        if "transfer_verify_checksum" in configData:
+            cls.transfer_verify_checksum = bool(configData["transfer_verify_checksum"])
+        else:
+            cls.transfer_verify_checksum = True
+
     @classmethod
     def get_local_ip(cls) -> str:
         """
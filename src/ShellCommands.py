@@ -1,85 +1,399 @@
+import os
+import shlex
+import shutil
 import subprocess
+import threading
 from collections import OrderedDict
-from time import sleep
-from typing import List
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Union
 
 import paramiko
 
+from AsyncManager import AsyncManager
+from ConnectionSupervisor import ConnectionSupervisor
+from DeviceConfig.Device import Device
+from LaunchScheduler import LaunchScheduler, ReadinessCondition
 from LogManager import LogManager
+from Metrics import Metrics
+from SessionPool import PooledConnection, SessionPool
 from Settings import Settings
+from SSHMaster import SSHMaster
+from ShutdownEngine import NodeStopResult, ShutdownEngine
+from SSHSession import RemoteProcess, ShellEnvironment, SSHSession
 
 
 class CommandError(Exception):
     pass
 
 
+class LocalProcess:
+    def __init__(self, command: str, with_input: bool = False):
+        """
+        Command running on the local device, with the same interface as
+        RemoteProcess: stdout can be iterated line by line while stderr is
+        collected in the background
+
+        Parameters:
+            command (string): Command to execute
+            with_input (bool, optional): if True, data can be sent to the stdin
+                of the command with "write"
+        """
+        self.process = subprocess.Popen(
+            "cd && " + command,
+            shell=True,
+            stdin=subprocess.PIPE if with_input else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        # Set once the command finishes
+        self.exit_code: int = None
+
+        self._stderr = bytearray()
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    @property
+    def stderr(self) -> str:
+        """
+        Error output received so far
+        """
+        return self._stderr.decode("utf-8", errors="replace")
+
+    def __iter__(self) -> Iterator[str]:
+        return self.lines()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def lines(self) -> Iterator[str]:
+        """
+        Yields the lines of stdout (including the line break) as they arrive
+        """
+        for line in self.process.stdout:
+            yield line.decode("utf-8", errors="replace")
+        self.wait()
+
+    def communicate(self):
+        """
+        Waits for the command to finish
+
+        Returns:
+            tuple: stdout (bytes), stderr (bytes) and exit code (int) of the command
+        """
+        stdout = self.process.stdout.read()
+        self.wait()
+        return stdout, bytes(self._stderr), self.exit_code
+
+    def wait(self) -> int:
+        """
+        Waits for the command to finish, discarding the rest of its stdout
+
+        Returns:
+            int: exit code of the command
+        """
+        for _ in self.process.stdout:
+            pass
+        self.exit_code = self.process.wait()
+        self._stderr_thread.join()
+        return self.exit_code
+
+    def write(self, data: str):
+        """
+        Sends data to the stdin of the command (if started with "with_input")
+        """
+        self.process.stdin.write(data.encode("utf-8"))
+        self.process.stdin.flush()
+
+    def close(self):
+        """
+        Stops the command if it is still running
+        """
+        if self.process.poll() is None:
+            self.process.terminate()
+
+    def _read_stderr(self):
+        for chunk in iter(lambda: self.process.stderr.read1(32768), b""):
+            self._stderr += chunk
+
+
 class TmuxPaneCommand:
-    def __init__(self, command: str, window: str, delay_ms: int = 0):
+    def __init__(
+        self,
+        command: str,
+        window: str,
+        delay_ms: int = 0,
+        name: str = None,
+        depends_on: List[str] = None,
+        ready: ReadinessCondition = None,
+        ready_timeout_s: float = 60,
+    ):
         self.command = command
         self.window = window
         self.delay_ms = delay_ms
+        # Name of the node run by the command, stored in the pane so that it can
+        # be found later
+        self.name = name
+        # Nodes that must be ready before running the command, and condition for
+        # this one to be ready (see LaunchScheduler)
+        self.depends_on = list(depends_on) if depends_on else []
+        self.ready = ready
+        self.ready_timeout_s = ready_timeout_s
+
+    @classmethod
+    def from_node(
+        cls, name: str, values: dict, command: str = None
+    ) -> "TmuxPaneCommand":
+        """
+        Creates the command of a node of the nodes file
+
+        Parameters:
+            name (string): name of the node
+            values (dict): fields of the node in the nodes file
+            command (string, optional): command to run instead of the one of the
+                node (e.g. with the source of the workspace added)
+
+        Raises:
+            ValueError: if the "depends_on" or "ready" fields are not valid
+        """
+        depends_on = values.get("depends_on", [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        if not isinstance(depends_on, list):
+            raise ValueError(f'"depends_on" of {name} must be a list of nodes')
+
+        return cls(
+            command=values["command"] if command is None else command,
+            window=values["window"] if "window" in values else "",
+            delay_ms=int(values["delay_ms"]) if "delay_ms" in values else 0,
+            name=name,
+            depends_on=[str(node) for node in depends_on],
+            ready=(
+                ReadinessCondition.from_dictionary(values["ready"])
+                if values.get("ready") is not None
+                else None
+            ),
+            ready_timeout_s=float(values.get("ready_timeout_s", 60)),
+        )
+
+
+class TmuxScript:
+    def __init__(self):
+        """
+        Builds a shell script that runs a sequence of tmux commands, so that a
+        whole tmux session can be set up with a single call to the target device.
+        Consecutive tmux commands are chained into a single tmux invocation
+        (separated by "\\;"), and delays are done with "sleep" in the script itself
+
+        Example:
+            script = TmuxScript()
+            script.tmux("new-session", "-d", "-s", "BirdWatch")
+            script.tmux("set", "-g", "mouse", "on")
+            script.sleep(500)
+            script.tmux("send-keys", "-t", "BirdWatch:1.1", "ls", "C-m")
+            ShellCommands.execute(script.render())
+        """
+        self.lines: List[str] = []
+        self.chain: List[List[str]] = []
+
+    def tmux(self, *args: str):
+        """
+        Adds a tmux command
+
+        Parameters:
+            args (strings): arguments of the tmux command (without "tmux")
+        """
+        self.chain.append([self.escape(str(arg)) for arg in args])
+
+    def sleep(self, delay_ms: int):
+        """
+        Adds a delay after the previous commands
+
+        Parameters:
+            delay_ms (int): time to wait in milliseconds
+        """
+        if delay_ms > 0:
+            self.flush()
+            self.lines.append(f"sleep {delay_ms / 1000}")
+
+    def shell(self, line: str):
+        """
+        Adds a line of shell code after the previous commands
+
+        Parameters:
+            line (string): shell code to add
+        """
+        self.flush()
+        self.lines.append(line)
+
+    def flush(self):
+        """
+        Writes the pending chain of tmux commands as a single tmux invocation
+        """
+        if self.chain:
+            self.lines.append(
+                "tmux "
+                + " \\; ".join(
+                    " ".join(shlex.quote(arg) for arg in command)
+                    for command in self.chain
+                )
+            )
+            self.chain = []
+
+    def render(self) -> str:
+        """
+        Returns:
+            string: the shell script
+        """
+        self.flush()
+        return "\n".join(self.lines)
+
+    @staticmethod
+    def escape(arg: str) -> str:
+        """
+        tmux takes an argument ending in a semicolon as a command separator, so
+        a trailing semicolon needs to be escaped to be taken literally
+        """
+        if arg.endswith(";"):
+            return arg[:-1] + "\\;"
+        return arg
 
 
 class ShellCommands:
-    ssh: paramiko.SSHClient = None
+    # Device on which the commands are run, if not the current one in Settings
+    # (set with "on_device"; each thread and asyncio task has its own value)
+    _target_device: ContextVar = ContextVar("target_device", default=None)
+
+    _local_environment: ShellEnvironment = None
+
+    @classmethod
+    @contextmanager
+    def on_device(cls, device: Device):
+        """
+        Runs the commands (and FileManager operations) of the current thread or
+        asyncio task on another device than the current one in Settings. The
+        connections to each device are kept open by the SessionPool
+
+        Parameters:
+            device (Device): target device
+
+        Example:
+            with sh.on_device(other_device):
+                sh.execute("ls")
+        """
+        token = cls._target_device.set(device)
+        try:
+            yield
+        finally:
+            cls._target_device.reset(token)
+
+    @classmethod
+    def target_device(cls) -> Device:
+        """
+        Returns the device on which the commands are run
+        """
+        device = cls._target_device.get()
+        return device if device is not None else Settings.current_device
+
+    @classmethod
+    def is_remote(cls) -> bool:
+        """
+        Checks if the commands are run on a remote device (or locally)
+        """
+        device = cls.target_device()
+        return device is not None and device.ssh_config is not None
+
+    @classmethod
+    def get_connection(cls, role: str = "main") -> PooledConnection:
+        """
+        Returns the connection to the target device, connecting if needed
+
+        Parameters:
+            role (string, optional): "main" for the connection used by "execute",
+                or "async" for the one used by the asynchronous API
+        """
+        device = cls.target_device()
+
+        # Wait for the supervisor if it is reconnecting instead of reconnecting here
+        ConnectionSupervisor.wait_for_connection(device)
+        return SessionPool.get(device, role=role)
 
     @classmethod
     def establish_ssh(cls):
         """
         Established an SSH connection with the configuration in Settings
         """
-        if cls.ssh is None:
-            # Create client
-            cls.ssh = paramiko.SSHClient()
-            cls.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        cls.get_connection()
 
-        # Establish connection to current remote device
+    @classmethod
+    def _run_on_session(
+        cls, function: Callable[[SSHSession], Any], role: str = "main"
+    ) -> Any:
+        """
+        Calls a function with the session of the target device. If it fails
+        because the connection dropped, reconnects and calls it again
+        """
+        connection = cls.get_connection(role)
         try:
-            LogManager.info(
-                f"Connecting to {Settings.current_device.name} on {Settings.current_device.ssh_config.username}@{Settings.current_device.ssh_config.networks[Settings.current_device.ssh_config.selected_network].ip}..."
-            )
-            cls.ssh.connect(
-                Settings.current_device.ssh_config.networks[
-                    Settings.current_device.ssh_config.selected_network
-                ].ip,
-                username=Settings.current_device.ssh_config.username,
-                timeout=5,
-            )
-            LogManager.info("Connection successful")
+            return function(connection.session)
         except Exception as e:
-            LogManager.error(f"Failed to establish SSH connection: {e}")
-            raise
+            if connection.is_alive():
+                raise
+
+            # Only the dead connection is closed: the streams and transfers running
+            # on the other connections to the device keep going
+            SessionPool.discard(connection)
+            ConnectionSupervisor.report_failure(cls.target_device(), e)
+            return function(cls.get_connection(role).session)
+
+    @classmethod
+    def environment(cls) -> ShellEnvironment:
+        """
+        Returns the environment (variables, home directory, ROS version, available
+        tools...) of the target device, or of the local one if no device is
+        selected. It is only captured once per connection
+
+        Example:
+            if sh.environment().ros_version == "1":
+                ...
+        """
+        if cls.is_remote():
+            return cls._run_on_session(lambda session: session.environment())
+        else:
+            if cls._local_environment is None:
+                cls._local_environment = ShellEnvironment(
+                    dict(os.environ),
+                    str(Path.home()) + "/",
+                    shutil.which("tmux") or "",
+                    shutil.which("ros2") or "",
+                )
+            return cls._local_environment
 
     @classmethod
     def execute(cls, command: str):
         """
         Executes a linux command either locally or remote (if a valid
-        SSH configuration is set in Settings)
+        SSH configuration is set in Settings, or a device is set with "on_device")
 
         Parameters:
             command (string): Command to execute
         """
         try:
-            if Settings.is_ssh_config_set():
-                try:
-                    # Execute command via SSH
-                    stdin, stdout, stderr = cls.ssh.exec_command(command)
-                except:
-                    # Close any possible previous SSH session
-                    cls.close_ssh()
-                    # Establish SSH connection
-                    try:
-                        cls.establish_ssh()
-                    except Exception as e:
-                        raise e
-
-                    # Try to execute the command again
-                    stdin, stdout, stderr = cls.ssh.exec_command(command)
-
-                if not stderr.read():
-                    return stdout.read().decode("utf-8")
+            if cls.is_remote():
+                # Execute command via SSH
+                stdout, stderr, _ = cls._run_on_session(
+                    lambda session: cls._run_measured(session, command)
+                )
+
+                if not stderr:
+                    return stdout.decode("utf-8")
                 else:
-                    raise CommandError(stderr.read())
+                    raise CommandError(stderr.decode("utf-8"))
             else:
                 try:
                     # Run the command and capture the output
@@ -91,6 +405,83 @@ class ShellCommands:
             raise e
 
     @classmethod
+    async def aexecute(cls, command: str) -> str:
+        """
+        Asynchronous version of "execute". The command runs in a worker thread of
+        the AsyncManager, on a connection dedicated to the asynchronous API, so
+        several commands can be awaited at the same time
+
+        Parameters:
+            command (string): Command to execute
+
+        Returns:
+            string: stdout of the command
+
+        Example:
+            recordings, nodes = await asyncio.gather(
+                sh.aexecute("ls ~/recordings"), sh.aexecute("ros2 node list")
+            )
+        """
+        return await AsyncManager.run_blocking(cls._execute_async, command)
+
+    @classmethod
+    def _execute_async(cls, command: str) -> str:
+        if not cls.is_remote():
+            return cls.execute_local(command)
+
+        stdout, stderr, _ = cls._run_on_session(
+            lambda session: cls._run_measured(session, command), role="async"
+        )
+
+        if not stderr:
+            return stdout.decode("utf-8")
+        else:
+            raise CommandError(stderr.decode("utf-8"))
+
+    @classmethod
+    def _run_measured(cls, session: SSHSession, command: str):
+        with Metrics.measure("execute"):
+            Metrics.count_request(len(command))
+            stdout, stderr, exit_code = session.run(command)
+            Metrics.count_response(len(stdout) + len(stderr))
+        return stdout, stderr, exit_code
+
+    @classmethod
+    def execute_stream(
+        cls, command: str, with_input: bool = False
+    ) -> Union[RemoteProcess, LocalProcess]:
+        """
+        Executes a linux command either locally or remote (if a valid SSH
+        configuration is set in Settings) without waiting for it to finish, so
+        that its output can be processed while it runs
+
+        Parameters:
+            command (string): Command to execute
+            with_input (bool, optional): if True, data can be sent to the stdin
+                of the command with "write" (always possible when remote)
+
+        Returns:
+            RemoteProcess or LocalProcess: running command. Iterating over it yields
+            the lines of stdout; once it finishes, "exit_code" and "stderr" hold its
+            exit code and error output
+
+        Example:
+            process = sh.execute_stream("ros2 topic list")
+            for line in process:
+                print(line, end="")
+            if process.exit_code != 0:
+                LogManager.error(process.stderr)
+        """
+        if cls.is_remote():
+            # Only the start of the command is measured
+            with Metrics.measure("execute_stream"):
+                Metrics.count_request(len(command))
+                return cls._run_on_session(lambda session: session.stream(command))
+        else:
+            return LocalProcess(command, with_input=with_input)
+
+    @classmethod
+    @Metrics.measure("execute_local")
     def execute_local(cls, command: str, timeout: int = 0):
         """
         Executes a Linux command locally.
@@ -162,9 +553,13 @@ class ShellCommands:
         """
         if command is None:
             cls.execute_local("gnome-terminal")
-        elif Settings.is_ssh_config_set() and not force_local:
+        elif cls.is_remote() and not force_local:
+            # Go through the master connection to the device instead of
+            # connecting again
+            device = cls.target_device()
+            SSHMaster.start(device, retry_failed=True)
             cls.execute_local(
-                f"gnome-terminal -- bash -c \"ssh -t {Settings.current_device.ssh_config.username}@{Settings.current_device.ssh_config.networks[Settings.current_device.ssh_config.selected_network].ip} '{command}'; exec bash\""
+                f"gnome-terminal -- bash -c \"ssh {SSHMaster.ssh_options(device)} -t {SSHMaster.destination(device)} '{command}'; exec bash\""
             )
         else:
             cls.execute_local(f'gnome-terminal -- bash -c "{command}; exec bash"')
@@ -174,9 +569,8 @@ class ShellCommands:
         """
         Closes a previously stablished SSH connections
         """
-        if cls.ssh is not None:
-            cls.ssh.close()
-            cls.ssh = None
+        if cls.is_remote():
+            SessionPool.close(cls.target_device().name)
 
     @classmethod
     def launch_tmux_from_dict(
@@ -203,84 +597,40 @@ class ShellCommands:
             )
         """
 
-        try:
-            # The "has-session" command generates a CommandError exception if the session didn't not yet exist
-            cls.execute(f'tmux has-session -t "{session_name}"')
-            session_existed = True
-
-            if not auto_attach:
-                LogManager.info(
-                    f"Session {session_name} already exists, not attaching to it"
-                )
-                return
-        except CommandError:
-            session_existed = False
-
-            # Start a new tmux session
-            cls.execute(f'tmux new-session -d -s "{session_name}"')
-
-            # Enable mouse control
-            cls.execute("tmux set -g mouse on")
-
-            # Create tmux windows and run the commands
-            for window_index, (window_name, window_commands) in enumerate(
-                commands.items(), start=1
-            ):
-                # Create tmux windows
-                if window_index == 1:
-                    cls.execute(
-                        f'tmux rename-window -t "{session_name}:1" "{window_name}"'
-                    )
-                else:
-                    cls.execute(
-                        f'tmux new-window -t "{session_name}" -n "{window_name}"'
-                    )
-
-                # Create tmux panes and run the commands
-                for pane_index, pane_command in enumerate(window_commands, start=1):
-                    # Run the command
-                    cls.execute(
-                        f'tmux send-keys -t "{session_name}:{window_index}.{pane_index}" "{pane_command}" C-m'
-                    )
+        # Each key of the dictionary is a window, and each of its elements a pane
+        tmux_commands = [
+            TmuxPaneCommand(command=pane_command, window=window_name)
+            for window_name, window_commands in commands.items()
+            for pane_command in window_commands
+        ]
 
-                    # If it is not the last command of the window
-                    if pane_index < len(window_commands):
-                        # Split the window
-                        cls.execute(
-                            f'tmux split-window -t "{session_name}:{window_index}" -h'
-                        )
+        # Create the session (if it did not yet exist) with a single call
+        session_existed = (
+            cls.execute(cls.tmux_launch_script(tmux_commands, session_name)).strip()
+            == "existed"
+        )
 
-                # If there are more than two commands on the window, set the layout to "tiled"
-                if len(window_commands) > 2:
-                    cls.execute(
-                        f"tmux select-layout -t {session_name}:{window_index} tiled"
-                    )
+        if session_existed and not auto_attach:
+            LogManager.info(
+                f"Session {session_name} already exists, not attaching to it"
+            )
+            return
 
         if auto_attach:
-            # Check if there is an SSH connection
-            if Settings.is_ssh_config_set():
-                try:
-                    # Open terminal and attach to remote tmux session
-                    cls.open_terminal(
-                        f'ssh {Settings.current_device.ssh_config.username}@{Settings.current_device.ssh_config.networks[Settings.current_device.ssh_config.selected_network].ip} -t tmux attach-session -t "{session_name}"'
-                    )
-                except Exception as e:
-                    raise e
-            else:
-                # Open terminal and attach to local tmux session
-                cls.open_terminal(f'tmux attach -t "{session_name}"')
+            # Open terminal and attach to the tmux session (through SSH if remote)
+            cls.open_terminal(f'tmux attach -t "{session_name}"')
 
         if session_existed:
             LogManager.info(
                 f"Attached to previously existing "
-                + ("remote " if Settings.is_ssh_config_set() else "")
+                + ("remote " if cls.is_remote() else "")
                 + f'Tmux session "{session_name}"'
             )
         else:
             LogManager.info(
                 f"Created "
                 + ("and attached to " if auto_attach else "")
-                + ("remote " if Settings.is_ssh_config_set() else "")
+                + ("remote " if cls.is_remote() else "")
                 + f'Tmux session "{session_name}"'
             )
 
@@ -288,8 +638,9 @@ class ShellCommands:
     @classmethod
     def launch_tmux(
         cls, commands: List[TmuxPaneCommand], session_name: str = "BirdWatch",
-            pre_launch_cmd: str= ""
-    ):
+            pre_launch_cmd: str= "", auto_attach: bool = True,
+            on_event: Callable[[str, str, str], Any] = None, cancel_file: str = None
+    ) -> bool:
         """
         Creates a tmux session and opens windows and panes running commands on
         them as specified by "commands"; and then opens a terminal and attaches to the
@@ -303,61 +654,56 @@ class ShellCommands:
             (in the order they appear in the list) and in which window they will be
             executed
             session_name (string, optional): name of the tmux session
-        """
-
-        try:
-            # The "has-session" command generates a CommandError exception if the session didn't not yet exist
-            cls.execute(f'tmux has-session -t "{session_name}"')
-
-            session_existed = True
-        except CommandError:
-            session_existed = False
-
-            # Start a new tmux session
-            cls.execute(f'tmux new-session -d -s "{session_name}"')
-
-            # Enable mouse control
-            cls.execute("tmux set -g mouse on")
+            auto_attach (bool, optional): if False, it will only create the tmux
+            session but not open a terminal attached to it
+            on_event (Callable, optional): function called with the event
+            ("started", "ready", "failed" or "cancelled"), the node and the reason
+            of the failure, as soon as each event happens on the target device
+            cancel_file (string, optional): file on the target device whose
+            creation stops the launch of the nodes not yet started
 
-            # Get list of windows
-            windows = list(OrderedDict.fromkeys(command.window for command in commands))
-            windows_dict = {}
-
-            # Create windows
-            for index, window in enumerate(windows, start=1):
-                if index == 1:
-                    cls.execute(f'tmux rename-window -t "{session_name}:1" "{window}"')
-                else:
-                    cls.execute(f'tmux new-window -t "{session_name}" -n "{window}"')
-                windows_dict[window] = {"index": index, "pane_qty": 0}
-
-            for command in commands:
-                # If it is not the first command of the window, split it
-                if windows_dict[command.window]["pane_qty"] > 0:
-                    cls.execute(
-                        f'tmux split-window -t "{session_name}:{windows_dict[command.window]["index"]}" -h'
-                    )
-                windows_dict[command.window]["pane_qty"] += 1
-
-                # If there are more than two commands on the window, set the layout to "tiled"
-                if windows_dict[command.window]["pane_qty"] > 2:
-                    cls.execute(
-                        f'tmux select-layout -t {session_name}:{windows_dict[command.window]["index"]} tiled'
-                    )
+        Returns:
+            bool: True if the session already existed
 
+        Raises:
+            CommandError: if a node was not ready in time, or not started because a
+            node it depends on failed (the others keep running)
+        """
 
-                # Run a command before the actual one
-                if pre_launch_cmd:
-                    cls.execute(
-                        f'tmux send-keys -t "{session_name}:{windows_dict[command.window]["index"]}.{windows_dict[command.window]["pane_qty"]}" "{pre_launch_cmd}" C-m'
-                    )
-                # Run the command
-                cls.execute(
-                    f'tmux send-keys -t "{session_name}:{windows_dict[command.window]["index"]}.{windows_dict[command.window]["pane_qty"]}" "{command.command}" C-m'
-                )
+        # Create the session (if it did not yet exist) with a single call, reading
+        # the events of the nodes as they are printed
+        failed_nodes = []
+        with cls.execute_stream(
+            cls.tmux_launch_script(commands, session_name, pre_launch_cmd, cancel_file)
+        ) as process:
+            lines = iter(process)
+            session_existed = next(lines, "").strip() == "existed"
+
+            for line in lines:
+                event, _, details = line.rstrip("\n").partition("\t")
+                node, _, reason = details.partition("\t")
+                if event == "failed":
+                    failed_nodes.append(f"{node}: {reason}")
+                if on_event is not None:
+                    on_event(event, node, reason)
+
+        if process.exit_code != 0:
+            raise CommandError(
+                process.stderr or f"Launch script exited with {process.exit_code}"
+            )
+        if failed_nodes:
+            raise CommandError(
+                f'Tmux session "{session_name}" was created but some nodes failed:\n'
+                + "\n".join(failed_nodes)
+            )
 
-                if command.delay_ms > 0:
-                    sleep(command.delay_ms / 1000)
+        if not auto_attach:
+            LogManager.info(
+                ("Found previously existing " if session_existed else "Created ")
+                + ("remote " if cls.is_remote() else "")
+                + f'Tmux session "{session_name}"'
+            )
+            return session_existed
 
         # Open terminal and attach to tmux session
         cls.open_terminal(f'tmux attach -t "{session_name}"')
@@ -365,54 +711,269 @@ class ShellCommands:
         if session_existed:
             LogManager.info(
                 f"Attached to previously existing "
-                + ("remote " if Settings.is_ssh_config_set() else "")
+                + ("remote " if cls.is_remote() else "")
                 + f'Tmux session "{session_name}"'
             )
         else:
             LogManager.info(
                 f"Created and attached to "
-                + ("remote " if Settings.is_ssh_config_set() else "")
+                + ("remote " if cls.is_remote() else "")
                 + f'Tmux session "{session_name}"'
             )
+        return session_existed
 
     @classmethod
-    def stop_tmux(
-        cls, session_name: str = "BirdWatch"
-    ):
+    def tmux_launch_script(
+        cls,
+        commands: List[TmuxPaneCommand],
+        session_name: str = "BirdWatch",
+        pre_launch_cmd: str = "",
+        cancel_file: str = None,
+    ) -> str:
         """
-        Creates a tmux session and opens windows and panes running commands on
-        them as specified by "commands"; and then opens a terminal and attaches to the
-        tmux session.
+        Generates a shell script that creates a tmux session and opens windows and
+        panes running commands on them as specified by "commands", waiting the
+        delay of each command on the target device itself. The script prints
+        "existed" if the session already existed (in which case nothing is done),
+        or "created" otherwise, followed by a line per event of the named commands
+        ("started <node>", "ready <node>"...; see LaunchScheduler)
 
-        In case the session of that name already existed, then it opens a terminal and
-        and attaches to it.
+        If any command depends on other ones or has a readiness condition, all the
+        panes are created first and then each command is run as soon as those it
+        depends on are ready (see LaunchScheduler)
 
         Parameters:
             commands (list[TmuxPaneCommand]): specifies the commands to be executed
             (in the order they appear in the list) and in which window they will be
             executed
             session_name (string, optional): name of the tmux session
+            pre_launch_cmd (string, optional): command to run in each pane before
+            the actual one
+            cancel_file (string, optional): file on the target device whose
+            creation stops the script before running the remaining commands
+
+        Returns:
+            string: the shell script
         """
+        # Run each command once those it depends on are ready, instead of in order
+        scheduled = any(
+            command.depends_on or command.ready is not None for command in commands
+        )
+        pane_targets = []
+        start_commands = []
+
+        script = TmuxScript()
+
+        # Start a new tmux session
+        script.tmux("new-session", "-d", "-s", session_name)
+        script.shell("echo created")
+
+        # Enable mouse control
+        script.tmux("set", "-g", "mouse", "on")
+
+        # Get list of windows
+        windows = list(OrderedDict.fromkeys(command.window for command in commands))
+        windows_dict = {}
+
+        # Create windows
+        for index, window in enumerate(windows, start=1):
+            if index == 1:
+                script.tmux("rename-window", "-t", f"{session_name}:1", window)
+            else:
+                script.tmux("new-window", "-t", session_name, "-n", window)
+            windows_dict[window] = {"index": index, "pane_qty": 0}
 
-        try:
-            # The "has-session" command generates a CommandError exception if the session didn't not yet exist
-            cls.execute(f'tmux has-session -t "{session_name}"')
+        for command in commands:
+            window_target = f'{session_name}:{windows_dict[command.window]["index"]}'
+
+            # Stop before the next command if the launch was cancelled
+            if cancel_file and not scheduled:
+                script.shell(f"[ ! -e {shlex.quote(cancel_file)} ] || exit 0")
+
+            # If it is not the first command of the window, split it
+            if windows_dict[command.window]["pane_qty"] > 0:
+                script.tmux("split-window", "-t", window_target, "-h")
+            windows_dict[command.window]["pane_qty"] += 1
 
-            session_existed = True
+            # If there are more than two commands on the window, set the layout to "tiled"
+            if windows_dict[command.window]["pane_qty"] > 2:
+                script.tmux("select-layout", "-t", window_target, "tiled")
+
+            pane_target = f'{window_target}.{windows_dict[command.window]["pane_qty"]}'
+
+            # Run a command before the actual one
+            if pre_launch_cmd:
+                script.tmux("send-keys", "-t", pane_target, pre_launch_cmd, "C-m")
+
+            # Run the command
+            if not scheduled:
+                script.tmux("send-keys", "-t", pane_target, command.command, "C-m")
+                if command.name:
+                    script.shell(
+                        f"printf 'started\\t%s\\n' {shlex.quote(command.name)}"
+                    )
 
-            cls.execute(f'tmux kill-session -t "{session_name}"')
-        except CommandError:
-            session_existed = False
+            # Label the pane with the node (pane options need tmux 3.0 or newer)
+            if command.name:
+                script.shell(
+                    f"tmux set-option -p -t {shlex.quote(pane_target)} "
+                    + f"@birdwatch_node {shlex.quote(command.name)} 2>/dev/null || true"
+                )
+
+            if scheduled:
+                start_command = TmuxScript()
+                start_command.tmux(
+                    "send-keys", "-t", pane_target, command.command, "C-m"
+                )
+                start_commands.append(start_command.render())
+                pane_targets.append(pane_target)
+            else:
+                script.sleep(command.delay_ms)
+                if command.name:
+                    script.shell(
+                        f"printf 'ready\\t%s\\n' {shlex.quote(command.name)}"
+                    )
+
+        if scheduled:
+            ros_version = (
+                cls.environment().ros_version
+                if any(
+                    command.ready is not None and command.ready.kind == "topic"
+                    for command in commands
+                )
+                else ""
+            )
+            script.shell(
+                LaunchScheduler.script(
+                    commands,
+                    pane_targets,
+                    start_commands,
+                    ros_version,
+                    pre_launch_cmd,
+                    cancel_file,
+                )
+            )
+
+        # Only create the session if it does not exist yet
+        return (
+            f"if tmux has-session -t {shlex.quote(session_name)} 2>/dev/null; then\n"
+            + "echo existed\n"
+            + "else\n"
+            + "set -e\n"
+            + script.render()
+            + "\nfi"
+        )
+
+    @classmethod
+    def stop_tmux(
+        cls, session_name: str = "BirdWatch",
+        on_result: Callable[[NodeStopResult], Any] = None
+    ) -> bool:
+        """
+        Stops the nodes running in a tmux session (see "stop_nodes") and then
+        closes the session
+
+        Parameters:
+            session_name (string, optional): name of the tmux session
+            on_result (Callable, optional): see "stop_nodes"
+
+        Returns:
+            bool: True if the session existed (and was stopped)
+        """
+        results = cls.stop_nodes(session_name, kill_session=True, on_result=on_result)
+        session_existed = results is not None
 
         if session_existed:
             LogManager.info(
-                f"Attached to previously existing "
-                + ("remote " if Settings.is_ssh_config_set() else "")
-                + f'Tmux session "{session_name} and stopped it"'
+                f"Stopped "
+                + ("remote " if cls.is_remote() else "")
+                + f'Tmux session "{session_name}"'
             )
         else:
             LogManager.info(
                 f"Tmux session did not exist: "
-                + ("remote " if Settings.is_ssh_config_set() else "")
+                + ("remote " if cls.is_remote() else "")
                 + f'Tmux session "{session_name}"'
-            )
\ No newline at end of file
+            )
+        return session_existed
+
+    @classmethod
+    def soft_stop_tmux(
+        cls, session_name: str = "BirdWatch",
+        on_result: Callable[[NodeStopResult], Any] = None
+    ) -> List[NodeStopResult]:
+        """
+        Stops the nodes running in a tmux session (see "stop_nodes"), keeping the
+        session open
+
+        Parameters:
+            session_name (string, optional): name of the tmux session
+            on_result (Callable, optional): see "stop_nodes"
+
+        Returns:
+            list[NodeStopResult]: how each pane was stopped (empty if the session
+            does not exist)
+        """
+        return cls.stop_nodes(session_name, on_result=on_result) or []
+
+    @classmethod
+    def stop_nodes(
+        cls,
+        session_name: str = "BirdWatch",
+        kill_session: bool = False,
+        on_result: Callable[[NodeStopResult], Any] = None,
+    ) -> List[NodeStopResult]:
+        """
+        Stops the commands running in all the panes of a tmux session at the same
+        time with a single call to the target device, sending SIGINT ('Ctrl+C')
+        and then, to the panes that did not exit in time, SIGTERM and SIGKILL
+        (see ShutdownEngine; the timeouts are set in Settings)
+
+        Parameters:
+            session_name (string, optional): name of the tmux session
+            kill_session (bool, optional): if True, the session is closed once all
+                the panes are stopped
+            on_result (Callable, optional): function called with the result of
+                each pane as soon as it is stopped
+
+        Returns:
+            list[NodeStopResult]: how each pane was stopped, or None if the session
+            does not exist
+        """
+        script = ShutdownEngine.script(
+            session_name,
+            Settings.shutdown_sigint_timeout_s,
+            Settings.shutdown_sigterm_timeout_s,
+            kill_session,
+        )
+
+        results = []
+        with cls.execute_stream(script) as process:
+            lines = iter(process)
+            if next(lines, "").strip() != "found":
+                process.wait()
+                session_existed = False
+            else:
+                session_existed = True
+                for line in lines:
+                    result = ShutdownEngine.parse(line)
+                    if result is None:
+                        continue
+                    results.append(result)
+
+                    if result.signal == "alive":
+                        LogManager.error(str(result))
+                    elif result.escalated:
+                        LogManager.warning(
+                            f"{result} (it did not exit after SIGINT)"
+                        )
+                    elif result.signal != "none":
+                        LogManager.info(str(result))
+                    if on_result is not None:
+                        on_result(result)
+
+        if process.exit_code != 0:
+            raise CommandError(
+                process.stderr or f"Shutdown script exited with {process.exit_code}"
+            )
+        return results if session_existed else None
@@ -0,0 +1,155 @@
+import shlex
+
+
+class NodeStopResult:
+    def __init__(self, pane: str, node: str, duration_s: float, signal: str):
+        """
+        How a node (or the command running in a pane) was stopped
+
+        Parameters:
+            pane (string): tmux pane (session:window.pane)
+            node (string): name of the node ("" if the pane is not labelled)
+            duration_s (float): seconds from the start of the shutdown until its
+                processes exited
+            signal (string): last signal sent: "INT", "TERM", "KILL", "none" (if
+                nothing was running) or "alive" (if it did not exit even with KILL)
+        """
+        self.pane = pane
+        self.node = node
+        self.duration_s = duration_s
+        self.signal = signal
+
+    @property
+    def name(self) -> str:
+        return self.node or self.pane
+
+    @property
+    def stopped(self) -> bool:
+        return self.signal != "alive"
+
+    @property
+    def escalated(self) -> bool:
+        return self.signal in ("TERM", "KILL", "alive")
+
+    def __str__(self):
+        if self.signal == "none":
+            return f"{self.name}: was not running"
+        if self.signal == "alive":
+            return f"{self.name}: still running after SIGKILL"
+        return f"{self.name}: stopped with SIG{self.signal} in {self.duration_s:.1f} s"
+
+
+class ShutdownEngine:
+    """
+    Generates the script that stops the commands running in the panes of a tmux
+    session with a single call to the target device. All the panes are stopped
+    at the same time: 'Ctrl+C' (SIGINT) is sent to each one, and if the process
+    tree of the pane has not exited after a timeout, SIGTERM and then SIGKILL are
+    sent to it. Letting the nodes handle SIGINT first gives them (e.g. a bag
+    recorder) the chance to close their files
+
+    The script prints "missing" if the session does not exist, or "found"
+    followed by a line per pane as soon as its processes exited, separated by
+    tabs: "stopped <pane> <node> <milliseconds> <signal>"
+    """
+
+    # Milliseconds waited after SIGKILL before giving up
+    kill_timeout_ms: int = 1000
+
+    @classmethod
+    def script(
+        cls,
+        session_name: str = "BirdWatch",
+        sigint_timeout_s: float = 10,
+        sigterm_timeout_s: float = 5,
+        kill_session: bool = False,
+    ) -> str:
+        """
+        Returns the shell script that stops the panes of the session
+
+        Parameters:
+            session_name (string, optional): name of the tmux session
+            sigint_timeout_s (float, optional): seconds to wait after SIGINT before
+                sending SIGTERM
+            sigterm_timeout_s (float, optional): seconds to wait after SIGTERM
+                before sending SIGKILL
+            kill_session (bool, optional): if True, the session is closed once all
+                the panes are stopped
+        """
+        session = shlex.quote(session_name)
+        lines = [
+            f"if ! tmux has-session -t {session} 2>/dev/null; then",
+            "  echo missing",
+            "  exit 0",
+            "fi",
+            "echo found",
+            # Milliseconds since the epoch (seconds if "date" does not support %N)
+            "bw_ms() {",
+            "  bw_now=$(date +%s%N)",
+            '  case "$bw_now" in',
+            "    *N) echo $(( $(date +%s) * 1000 )) ;;",
+            "    *) echo $(( bw_now / 1000000 )) ;;",
+            "  esac",
+            "}",
+            # Descendants of a process (the processes run from the shell of a pane)
+            "bw_tree() {",
+            '  for bw_child in $(pgrep -P "$1" 2>/dev/null); do',
+            '    echo "$bw_child"',
+            '    bw_tree "$bw_child"',
+            "  done",
+            "}",
+            # Waits for the descendants of a process to exit, at most $2 ms
+            "bw_wait_exit() {",
+            "  bw_deadline=$(( $(bw_ms) + $2 ))",
+            '  while [ -n "$(bw_tree "$1")" ]; do',
+            '    [ "$(bw_ms)" -ge "$bw_deadline" ] && return 1',
+            "    sleep 0.1",
+            "  done",
+            "}",
+            "bw_start=$(bw_ms)",
+            f"tmux list-panes -s -t {session} -F "
+            + shlex.quote(
+                "#{pane_id}\t#{pane_pid}\t#{pane_dead}\t"
+                + "#{session_name}:#{window_index}.#{pane_index}\t#{@birdwatch_node}"
+            )
+            + " | {",
+            "  while IFS=$(printf '\\t') read -r pane pid dead target node; do",
+            "    (",
+            "      signal=none",
+            '      if [ "$dead" != 1 ] && [ -n "$(bw_tree "$pid")" ]; then',
+            "        signal=INT",
+            '        tmux send-keys -t "$pane" C-c',
+            f'        if ! bw_wait_exit "$pid" {int(sigint_timeout_s * 1000)}; then',
+            "          signal=TERM",
+            '          kill -TERM $(bw_tree "$pid") 2>/dev/null',
+            f'          if ! bw_wait_exit "$pid" {int(sigterm_timeout_s * 1000)}; then',
+            "            signal=KILL",
+            '            kill -KILL $(bw_tree "$pid") 2>/dev/null',
+            f'            bw_wait_exit "$pid" {cls.kill_timeout_ms} || signal=alive',
+            "          fi",
+            "        fi",
+            "      fi",
+            "      printf 'stopped\\t%s\\t%s\\t%s\\t%s\\n' \"$target\" \"$node\" "
+            + '"$(( $(bw_ms) - bw_start ))" "$signal"',
+            "    ) &",
+            "  done",
+            "  wait",
+            "}",
+        ]
+        if kill_session:
+            lines.append(f"tmux kill-session -t {session} 2>/dev/null || true")
+        return "\n".join(lines)
+
+    @classmethod
+    def parse(cls, line: str) -> NodeStopResult:
+        """
+        Reads a "stopped" line printed by the script
+
+        Returns:
+            NodeStopResult: result of the pane, or None if the line is not one
+        """
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) != 5 or fields[0] != "stopped":
+            return None
+        _, pane, node, duration_ms, signal = fields
+        return NodeStopResult(pane, node, int(duration_ms) / 1000, signal)
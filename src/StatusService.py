@@ -0,0 +1,255 @@
+import shlex
+import threading
+import time
+import tkinter
+from typing import Any, Callable, List, Optional, Tuple
+
+from AsyncManager import AsyncManager
+from LogManager import LogManager
+from PollingScheduler import PollingScheduler
+from ShellCommands import ShellCommands as sh
+
+
+class TmuxPane:
+    def __init__(self, target: str, pid: int, dead: bool, command: str):
+        """
+        Pane of a tmux session on the target device
+
+        Parameters:
+            target (string): pane as "session:window.pane"
+            pid (int): PID of the process started in the pane
+            dead (bool): True if that process finished (and the pane was kept)
+            command (string): command currently running in the pane
+        """
+        self.target = target
+        self.pid = pid
+        self.dead = dead
+        self.command = command
+
+    @property
+    def session(self) -> str:
+        return self.target.rsplit(":", 1)[0]
+
+
+class StatusSnapshot:
+    def __init__(self, device_name: str):
+        """
+        State of the target device at a point in time, as gathered by the
+        StatusService. Each field is None if it could not be read
+
+        Parameters:
+            device_name (string): name of the device
+        """
+        self.device_name = device_name
+        # Time (as given by time.monotonic) at which the state was read
+        self.time = time.monotonic()
+        self.error: str = None
+
+        self.recorder_pids: List[int] = None
+        self.panes: List[TmuxPane] = None
+        # Total, used and free bytes of the file system of the recordings
+        self.disk: Tuple[int, int, int] = None
+        # Average number of running processes over 1, 5 and 15 minutes
+        self.load_average: Tuple[float, float, float] = None
+        # Total and available bytes of memory
+        self.memory: Tuple[int, int] = None
+
+    @property
+    def recording(self) -> Optional[bool]:
+        return None if self.recorder_pids is None else len(self.recorder_pids) > 0
+
+    def panes_of(self, session_name: str) -> List[TmuxPane]:
+        return [pane for pane in self.panes or [] if pane.session == session_name]
+
+
+class StatusService:
+    """
+    Gathers the state of the target device shown by the GUI (recorder, tmux
+    panes, free disk, load and memory) with a single command every
+    "interval_s" seconds, as a task of the PollingScheduler that runs while
+    any subscribed widget is shown. The widgets subscribe to the snapshots
+    instead of running their own commands
+
+    Example:
+        StatusService.subscribe(
+            lambda snapshot: label.configure(text=str(snapshot.load_average)),
+            widget=label,
+        )
+    """
+
+    interval_s: float = 2
+
+    # Functions to call with each snapshot, and the widget showing it (if any)
+    _subscribers: List[Tuple[Callable[[StatusSnapshot], None], Any]] = []
+    _snapshot: StatusSnapshot = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def subscribe(cls, callback: Callable[[StatusSnapshot], None], widget=None):
+        """
+        Calls a function in the Tk main thread with each new snapshot (starting
+        with the last one, if any)
+
+        Parameters:
+            callback (Callable): function called with the StatusSnapshot
+            widget (optional): widget showing the snapshots. The snapshots are
+                only gathered while any of the subscribed widgets is shown (or
+                there is a subscriber without widget)
+        """
+        with cls._lock:
+            cls._subscribers.append((callback, widget))
+            snapshot = cls._snapshot
+
+        PollingScheduler.register(
+            "status",
+            cls._update,
+            cls.interval_s,
+            priority=PollingScheduler.NORMAL,
+            visible_when=cls._any_subscriber_visible,
+        )
+
+        if snapshot is not None:
+            AsyncManager.call_in_tk(callback, snapshot)
+
+    @classmethod
+    def unsubscribe(cls, callback: Callable[[StatusSnapshot], None]):
+        """
+        Stops calling a function with the snapshots. The snapshots are no longer
+        gathered once there are no subscribers
+        """
+        with cls._lock:
+            cls._subscribers = [
+                subscriber for subscriber in cls._subscribers if subscriber[0] != callback
+            ]
+            if cls._subscribers:
+                return
+        PollingScheduler.unregister("status")
+
+    @classmethod
+    def snapshot(cls) -> StatusSnapshot:
+        """
+        Returns the last snapshot (None if none was gathered yet)
+        """
+        return cls._snapshot
+
+    @classmethod
+    def probe_command(cls, device) -> str:
+        """
+        Returns the command that prints the state of the device, in sections
+        separated by lines starting with "@@"
+        """
+        return "; ".join(
+            [
+                "echo @@recorder",
+                # Both ROS 1 and ROS 2 recorders, without matching this command
+                "pgrep -f '[r]os(bag|2 bag) record'",
+                "echo @@panes",
+                "tmux list-panes -a -F "
+                + "'#{session_name}:#{window_index}.#{pane_index} "
+                + "#{pane_pid} #{pane_dead} #{pane_current_command}' 2>/dev/null",
+                "echo @@disk",
+                f"df -Pk {shlex.quote(device.files.recordings.path)} 2>/dev/null",
+                "echo @@load",
+                "cat /proc/loadavg",
+                "echo @@memory",
+                "grep -E '^(MemTotal|MemAvailable):' /proc/meminfo",
+                "true",
+            ]
+        )
+
+    @classmethod
+    def probe(cls) -> StatusSnapshot:
+        """
+        Gathers the state of the target device
+
+        Returns:
+            StatusSnapshot: state of the device (with "error" set if the command
+            failed)
+        """
+        device = sh.target_device()
+        snapshot = StatusSnapshot(device.name if device is not None else "")
+
+        try:
+            output = sh.execute(cls.probe_command(device))
+        except Exception as e:
+            snapshot.error = str(e)
+            return snapshot
+
+        sections = {}
+        section = None
+        for line in output.splitlines():
+            if line.startswith("@@"):
+                section = line[2:]
+                sections[section] = []
+            elif section is not None and line.strip():
+                sections[section].append(line)
+
+        parsers = {
+            "recorder": cls._parse_recorder,
+            "panes": cls._parse_panes,
+            "disk": cls._parse_disk,
+            "load": cls._parse_load,
+            "memory": cls._parse_memory,
+        }
+        for name, parse in parsers.items():
+            try:
+                parse(snapshot, sections.get(name, []))
+            except (ValueError, IndexError, KeyError) as e:
+                LogManager.debug(f"Could not read the {name} state: {e}")
+
+        return snapshot
+
+    @staticmethod
+    def _parse_recorder(snapshot: StatusSnapshot, lines: List[str]):
+        snapshot.recorder_pids = [int(line) for line in lines]
+
+    @staticmethod
+    def _parse_panes(snapshot: StatusSnapshot, lines: List[str]):
+        snapshot.panes = []
+        for line in lines:
+            target, pid, dead, command = (line.split(" ", 3) + [""])[:4]
+            snapshot.panes.append(TmuxPane(target, int(pid), dead == "1", command))
+
+    @staticmethod
+    def _parse_disk(snapshot: StatusSnapshot, lines: List[str]):
+        # Header followed by: file system, total, used and available 1K blocks
+        fields = lines[1].split()
+        snapshot.disk = tuple(int(blocks) * 1024 for blocks in fields[1:4])
+
+    @staticmethod
+    def _parse_load(snapshot: StatusSnapshot, lines: List[str]):
+        snapshot.load_average = tuple(float(value) for value in lines[0].split()[:3])
+
+    @staticmethod
+    def _parse_memory(snapshot: StatusSnapshot, lines: List[str]):
+        values = {line.split(":")[0]: int(line.split()[1]) * 1024 for line in lines}
+        snapshot.memory = (values["MemTotal"], values["MemAvailable"])
+
+    @classmethod
+    def _update(cls):
+        snapshot = cls.probe()
+
+        with cls._lock:
+            cls._snapshot = snapshot
+            callbacks = [callback for callback, _ in cls._subscribers]
+        for callback in callbacks:
+            AsyncManager.call_in_tk(callback, snapshot)
+
+        if snapshot.error is not None:
+            # Makes the scheduler back off
+            raise ConnectionError(snapshot.error)
+
+    @classmethod
+    def _any_subscriber_visible(cls) -> bool:
+        # Called in the Tk main thread
+        with cls._lock:
+            widgets = [widget for _, widget in cls._subscribers]
+
+        for widget in widgets:
+            try:
+                if widget is None or widget.winfo_viewable():
+                    return True
+            except tkinter.TclError:
+                # Destroyed without unsubscribing
+                pass
+        return False
@@ -1,3 +1,4 @@
+from concurrent.futures import Future, wait
 from typing import List
 
 import customtkinter as ctk
@@ -6,7 +7,15 @@ import yaml
 import Widgets.ThemedCtkWidgets as tcw
 from FileManager import FileManager as fm
 from LogManager import LogManager
-from PopUpWindows import MessageWindow
+from Metrics import Metrics
+from AsyncManager import AsyncManager
+from LaunchJob import LaunchJob
+from PopUpWindows import (
+    FleetWindow,
+    LaunchTimelineWindow,
+    MessageWindow,
+    NodeOutputWindow,
+)
 from Settings import Settings
 from ShellCommands import ShellCommands as sh
 from ShellCommands import TmuxPaneCommand
@@ -84,88 +93,136 @@ class MissionPreparationTabView(tcw.CTkFrame):
             width=150,
             command=self.soft_stop_commands,
             tooltip_text="Stop each node in the Tmux session\n"
-                         + "'BirdWatch' by sending 'Ctrl+C' to each pane",
+                         + "'BirdWatch' by sending 'Ctrl+C' to each pane\n"
+                         + "(then SIGTERM and SIGKILL if it does not exit)",
         )
         self.soft_stop_btn.grid(row=2, column=1, pady=(0, 10), sticky="es")
 
+        # Add fleet button
+        self.fleet_btn = tcw.CTkButton(
+            self.buttons_frame,
+            text="Fleet",
+            width=150,
+            command=self.open_fleet_window,
+            tooltip_text="Run, stop or soft stop the nodes on several\n"
+            + "target devices at the same time",
+        )
+        self.fleet_btn.grid(row=2, column=0, pady=(0, 10), sticky="sw")
+
         self.popup_window = None
+        self.fleet_window = None
+        self.launch_window = None
 
+        # Launch running in the background
+        self.launch_job: LaunchJob = None
+
+    @Metrics.action("launch")
     def run_commands(self):
+        # Only one launch at a time
+        if self.launch_job is not None and self.launch_job.running:
+            self.open_launch_window()
+            return
+
         self.nodes_frame.order_nodes()
 
         # Create list of commands
         tmux_commands: List[TmuxPaneCommand] = []
 
-        for node, values in self.nodes_frame.nodes_config.items():
-            if ("run" in values) and values["run"] is True:
-                tmux_commands.append(
-                    TmuxPaneCommand(
-                        command=values["command"],
-                        window=values["window"] if "window" in values else "",
-                        delay_ms=int(values["delay_ms"]) if "delay_ms" in values else 0,
-                    )
-                )
-
         # Run all the commands
         try:
+            for node, values in self.nodes_frame.nodes_config.items():
+                if ("run" in values) and values["run"] is True:
+                    tmux_commands.append(TmuxPaneCommand.from_node(node, values))
+
             # source the workspace before launching the node
             source_cmd = "source " + Settings.current_device.files.workspace_path + "install/setup.{bash,zsh}"
-            sh.launch_tmux(tmux_commands, pre_launch_cmd=source_cmd)
+
+            # Launch in the background, showing the progress of each node
+            self.launch_job = LaunchJob(tmux_commands, pre_launch_cmd=source_cmd)
+            self.launch_job.start().add_done_callback(
+                lambda future: AsyncManager.call_in_tk(self.launch_finished, future)
+            )
+            self.open_launch_window()
 
             self.get_root().set_tab("Record")
         except Exception as e:
-            LogManager.error(f"Unexpected error when trying to run the nodes: {e} \n cmds:" + str(tmux_commands))
-            if (self.popup_window is None) or (not self.popup_window.winfo_exists()):
-                self.popup_window = MessageWindow(
-                    self, f"Could not run the nodes:\n{e}", title="Error"
-                )
+            self.show_launch_error(e)
+
+    def launch_finished(self, future: Future):
+        if future.cancelled() or not self.winfo_exists():
+            return
+        if future.exception() is not None:
+            self.show_launch_error(future.exception())
+
+    def show_launch_error(self, e: Exception):
+        LogManager.error(f"Unexpected error when trying to run the nodes: {e}")
+        if (self.popup_window is None) or (not self.popup_window.winfo_exists()):
+            self.popup_window = MessageWindow(
+                self, f"Could not run the nodes:\n{e}", title="Error"
+            )
+
+    def open_launch_window(self):
+        if (self.launch_window is None) or (not self.launch_window.winfo_exists()):
+            self.launch_window = LaunchTimelineWindow(self, self.launch_job)
 
+    @Metrics.action("stop")
     def stop_cmd(self):
+        # Do not start the nodes still waiting to be launched
+        launch = None
+        if self.launch_job is not None:
+            launch = self.launch_job.cancel()
+
         self.nodes_frame.order_nodes()
-        # Run all the commands
-        try:
-            # source the workspace before launching the node
+
+        def stop():
+            # Otherwise the launch could start nodes in the session being closed
+            if launch is not None:
+                wait([launch], timeout=LaunchJob.cancel_timeout_s)
             sh.stop_tmux()
-        except Exception as e:
-            LogManager.error(f"Unexpected error when trying to stop the nodes: {e} \n:")
-            if (self.popup_window is None) or (not self.popup_window.winfo_exists()):
-                self.popup_window = MessageWindow(
-                    self, f"Could not stop the nodes:\n{e}", title="Error"
-                )
 
+        # Stop the nodes in the background, as they can take a while to exit
+        AsyncManager.deliver(
+            self,
+            AsyncManager.run_blocking(stop),
+            lambda _: None,
+            self.show_stop_error,
+        )
+
+    @Metrics.action("soft stop")
     def soft_stop_commands(self):
-        try:
-            pane_list = (
-                sh.execute("tmux list-panes -at BirdWatch -F '#S:#I.#P'")
-                .strip()
-                .split("\n")
-            )
-        except Exception as e:
-            LogManager.error(
-                f'Could not find list of panes running in session "BirdWatch": {e}'
-            )
+        # Send 'Ctrl+C' to each pane, escalating to the panes that do not exit
+        def show_results(results: list):
+            if not results:
+                LogManager.warning(f'No panes found for session "BirdWatch"')
 
-        if not pane_list or pane_list == [""]:
-            LogManager.warning(f'No panes found for session "BirdWatch"')
-            return
+        AsyncManager.deliver(
+            self,
+            AsyncManager.run_blocking(sh.soft_stop_tmux),
+            show_results,
+            self.show_stop_error,
+        )
 
-        # Send 'Ctrl+C' to each pane
-        for pane in pane_list:
-            try:
-                sh.execute(f"tmux send-keys -t {pane} C-c")
-            except Exception as e:
-                LogManager.error(f'Could not terminate pane "{pane}": {e}')
+    def show_stop_error(self, e: Exception):
+        LogManager.error(f"Unexpected error when trying to stop the nodes: {e}")
+        if (self.popup_window is None) or (not self.popup_window.winfo_exists()):
+            self.popup_window = MessageWindow(
+                self, f"Could not stop the nodes:\n{e}", title="Error"
+            )
+
+    def open_fleet_window(self):
+        if (self.fleet_window is None) or (not self.fleet_window.winfo_exists()):
+            self.fleet_window = FleetWindow(self)
 
     def open_rviz(self):
         try:
-            ros_version = sh.execute('echo $ROS_VERSION')
+            ros_version = sh.environment().ros_version
             if ros_version == '1':
                 sh.execute_local(f"rviz -d {Settings.default_rviz1_config_file}", timeout=2)
             else:
                 sh.execute_local(f"rviz2 -d {Settings.default_rviz2_config_file}", timeout=2)
         except:
             try:
-                ros_version = sh.execute('echo $ROS_VERSION')
+                ros_version = sh.environment().ros_version
                 if ros_version == '1':
                     sh.execute_local(f"rviz", timeout=2)
                 else:
@@ -195,7 +252,7 @@ class NodesFrame(tcw.CTkScrollableFrame):
     def __init__(self, master):
         super().__init__(master)
 
-        self.columnconfigure((0, 1, 2, 3, 4), weight=1)
+        self.columnconfigure((0, 1, 2, 3, 4, 5), weight=1)
 
         # Add refresh button
         self.refresh_button = tcw.CTkButton(
@@ -217,7 +274,7 @@ class NodesFrame(tcw.CTkScrollableFrame):
         self.edit_button.grid(
             row=0,
             column=3,
-            columnspan=2,
+            columnspan=3,
             padx=10,
             pady=(10, 5),
             sticky="ne",
@@ -310,7 +367,7 @@ class NodesFrame(tcw.CTkScrollableFrame):
             self.no_file_label = tcw.CTkLabel(
                 self, text="Nodes could not be\nloaded with current settings."
             )
-            self.no_file_label.grid(row=2, column=0, pady=(0, 10), columnspan=5)
+            self.no_file_label.grid(row=2, column=0, pady=(0, 10), columnspan=6)
 
         # Add options
         self.node_entries: List[NodeEntry] = []
@@ -331,6 +388,7 @@ class NodesFrame(tcw.CTkScrollableFrame):
         # Set the height of the frame so it is not larger than it needs to be
         self.configure(height=self.get_slaves_total_height())
 
+    @Metrics.action("refresh nodes")
     def refresh(self):
         """
         Refresh the nodes list
@@ -341,6 +399,7 @@ class NodesFrame(tcw.CTkScrollableFrame):
             entry.delay_label.destroy()
             entry.node_label.destroy()
             entry.window_label.destroy()
+            entry.output_button.destroy()
 
         self.load_and_add_nodes()
 
@@ -421,6 +480,26 @@ class NodeEntry:
         self.window_label = tcw.CTkLabel(master, text=window)
         self.window_label.grid(row=row, column=4, pady=(0, 10), sticky="n")
 
+        # Add button to see the output of the node
+        self.output_window = None
+        self.output_button = tcw.CTkButton(
+            master,
+            text="Output",
+            width=0,
+            command=self.open_output_window,
+            tooltip_text="Shows the last lines written by the node\n"
+            + "and the new ones as they are written",
+        )
+        self.output_button.grid(
+            row=row, column=5, padx=(0, 10), pady=(0, 10), sticky="n"
+        )
+
+    def open_output_window(self):
+        if self.output_window is None or not self.output_window.winfo_exists():
+            self.output_window = NodeOutputWindow(self.master, self.node_name)
+        else:
+            self.output_window.focus()
+
     def update_run(self):
         self.master.nodes_config[self.node_name]["run"] = self.run_checkbox._check_state
         self.master.update_node_run_in_file(
@@ -1,3 +1,5 @@
+import asyncio
+import shlex
 import tkinter
 from datetime import datetime
 from typing import List
@@ -6,12 +8,18 @@ import customtkinter as ctk
 import yaml
 
 import Widgets.ThemedCtkWidgets as tcw
+from AsyncManager import AsyncManager
+from FileManager import DirectoryEntry
 from FileManager import FileManager as fm
 from IconManager import IconManager
 from LogManager import LogManager
+from Metrics import Metrics
 from PopUpWindows import ConfirmationWindow, MessageWindow
+from ProcessWatcher import ProcessWatcher
 from Settings import Settings
 from ShellCommands import ShellCommands as sh
+from SSHMaster import SSHMaster
+from TmuxControl import TmuxControl
 from Widgets.EntryWithLabel import EntryWithLabel
 from Widgets.FileDialog import FileDialog
 from Widgets.SafeButton import SafeButton
@@ -26,7 +34,7 @@ class RecordTopicsTabView(tcw.CTkFrame):
         self.configure(fg_color="transparent")
         self.columnconfigure((0, 1, 2), weight=1)
         self.rowconfigure(0, weight=1)
-        self.ros_version = sh.execute('echo $ROS_VERSION')
+        self.ros_version = sh.environment().ros_version
 
         # Add topics
         self.topics_frame = TopicsFrame(self)
@@ -89,9 +97,18 @@ class RecordTopicsTabView(tcw.CTkFrame):
         )
         self.record_btn.grid(row=2, column=2, sticky="se")
 
-        self.update_is_recording()
+        # Update the state of the recording only when it changes
+        self.recording_watcher = ProcessWatcher(
+            "rosbag record" if self.ros_version == "1" else "ros2 bag record",
+            self.update_is_recording,
+        )
+        self.update_is_recording(self.recording_watcher.poll())
+        self.recording_watcher.start()
+        self.bind("<Destroy>", self.on_destroy)
+
         self.window = None
 
+    @Metrics.action("record")
     def record_topics(self):
         """
         Starts recording the selected topics using tmux and ros2 bag
@@ -100,8 +117,10 @@ class RecordTopicsTabView(tcw.CTkFrame):
 
         # Check if tmux session exists
         try:
-            sh.execute(f"tmux has-session -t {tmux_session}")
-        except:
+            session = TmuxControl.session(tmux_session)
+        except Exception:
+            session = None
+        if session is None:
             LogManager.error("Tmux session does not exist. Cannot start recording")
             if self.window is None or not self.window.winfo_exists():
                 self.window = MessageWindow(
@@ -132,6 +151,7 @@ class RecordTopicsTabView(tcw.CTkFrame):
                     self, "No topics selected for recording", "Error"
                 )
 
+    @Metrics.action("stop recording")
     def stop_recording(self):
         """
         Stops the recording of the selected topics
@@ -140,14 +160,16 @@ class RecordTopicsTabView(tcw.CTkFrame):
 
         try:
             # Check if tmux session exists
-            sh.execute(f"tmux has-session -t {tmux_session}")
-        except:
+            session = TmuxControl.session(tmux_session)
+        except Exception:
+            session = None
+        if session is None:
             LogManager.error("Tmux session does not exist. Cannot stop recording")
             return
 
         # Check if the "rec" window already exists
-        list_windows_output = sh.execute(f"tmux list-windows -t {tmux_session}")
-        if "rec" not in list_windows_output:
+        rec_window = session.window("rec")
+        if rec_window is None:
             LogManager.error(
                 '"rec" window does not exist in Tmux session. Cannot stop recording'
             )
@@ -155,33 +177,35 @@ class RecordTopicsTabView(tcw.CTkFrame):
 
         try:
             # Send 'Ctrl+C' to the "rec" window
-            sh.execute(f"tmux send-keys -t {tmux_session}:rec C-c")
+            TmuxControl.run(
+                [f"send-keys -t {shlex.quote(session.target(rec_window))} C-c"],
+                tmux_session,
+            )
             LogManager.info("Stopped recording")
 
         except Exception as e:
             LogManager.error(f"Error stopping recording: {e}")
 
+    @Metrics.action("view recordings")
     def view_recordings(self):
         """
         Opens a window to backup the recorded files on the directory specified in the target device configuration file
         """
         # Load the list of all files in the specified recordings folder
         try:
-            if self.ros_version == '1':
-                recordings_list = fm.list_files(
-                    Settings.current_device.files.recordings.path
-                )
-            else:
-                recordings_list = fm.list_directories(
-                    Settings.current_device.files.recordings.path
-                )
+            # Bag files in ROS 1, directories in ROS 2 (with their sizes, for files)
+            recordings_list = [
+                entry
+                for entry in fm.scandir(Settings.current_device.files.recordings.path)
+                if (entry.is_file if self.ros_version == '1' else entry.is_dir)
+            ]
         except Exception as e:
             LogManager.error(f"Error loading recordings list: {e}")
             recordings_list = None
 
         # Check if the list is not empty
         if self.window is None or not self.window.winfo_exists():
-            if not recordings_list or recordings_list == [""]:
+            if not recordings_list:
                 self.window = MessageWindow(
                     self,
                     f"No recordings found in '{Settings.current_device.files.recordings.path}'",
@@ -190,17 +214,16 @@ class RecordTopicsTabView(tcw.CTkFrame):
             else:
                 self.window = backupRecordingsWindow(self, recordings_list)
 
-    def update_is_recording(self):
-        try:
-            if self.ros_version == '1':
-                search_string = 'rosbag record'
-            else:
-                search_string = 'ros2 bag record'
-            # grep -v $$ to exclude own process to ensure command works as expected locally
-            output = sh.execute(f"pgrep -f '{search_string}' | grep -v $$ || true")
-            self.recording = len(output) > 0
-        except:
-            self.recording = None
+    def update_is_recording(self, recording: bool):
+        """
+        Updates the widgets with the state of the recording
+
+        Parameters:
+            recording (bool): True if recording, False if not, or None if unknown
+        """
+        if not self.winfo_exists():
+            return
+        self.recording = recording
 
         if self.recording is None:
             self.recording_label.configure(text="Error: no info on recording")
@@ -218,7 +241,9 @@ class RecordTopicsTabView(tcw.CTkFrame):
             self.record_btn.configure(state=tkinter.NORMAL)
             self.move_map_btn.configure(state=tkinter.NORMAL)
 
-        self.after(1000, self.update_is_recording)
+    def on_destroy(self, event):
+        if event.widget is self:
+            self.recording_watcher.stop()
 
     def move_map(self):
         """
@@ -391,6 +416,7 @@ class TopicsFrame(tcw.CTkScrollableFrame):
         # Set the height of the frame so it is not larger than it needs to be
         self.configure(height=self.get_slaves_total_height())
 
+    @Metrics.action("refresh topics")
     def refresh(self):
         """
         Refreshes the topics list by reloading the topics file.
@@ -509,13 +535,13 @@ class backupRecordingsWindow(tcw.CTkToplevel):
     A window for backing up recordings with options to delete after backup.
     """
 
-    def __init__(self, master, file_list: List[str]):
+    def __init__(self, master, recordings: List[DirectoryEntry]):
         """
         Initializes the backupRecordingsWindow.
 
         Args:
             master: The parent widget.
-            file_list: A list of files to be backed up.
+            recordings: The recordings (files or directories) to be backed up.
         """
         super().__init__(master)
 
@@ -531,33 +557,31 @@ class backupRecordingsWindow(tcw.CTkToplevel):
 
         self.bagfiles: List[tcw.CTkCheckBox] = []
         self.bagfiles_selected: List[tkinter.BooleanVar] = []
-        self.ros_version = sh.execute('echo $ROS_VERSION')
+        self.ros_version = sh.environment().ros_version
 
-        # Add a label for each file in the file list
+        # Add a label for each file in the file list (the sizes are filled in
+        # once they are known)
+        file_list = [recording.name for recording in recordings]
         for index, file in enumerate(file_list, start=0):
             self.bagfiles_selected.append(tkinter.BooleanVar())
 
-            if self.ros_version == '1':
-                file_size = fm.get_file_size(
-                    f"{Settings.current_device.files.recordings.path}/{file}",
-                    human_readable=True,
-                )
-            else:
-                file_size = fm.get_directory_content_size(
-                    f"{Settings.current_device.files.recordings.path}/{file}",
-                    human_readable=True,
-                )
-
             self.bagfiles.append(
                 tcw.CTkCheckBox(
                     self.file_list,
-                    text=f"{file} ({file_size})",
+                    text=f"{file} (...)",
                     variable=self.bagfiles_selected[-1],
                     command=lambda: self.update_btn(),
                 )
             )
             self.bagfiles[-1].grid(row=index, column=0, padx=10, pady=5, sticky="nw")
 
+        # Get the sizes of all the recordings at the same time
+        AsyncManager.deliver(
+            self,
+            self.get_file_sizes(recordings),
+            lambda file_sizes: self.show_file_sizes(file_list, file_sizes),
+        )
+
         self.file_list.configure(height=self.file_list.get_slaves_total_height())
 
         # Switch to select between remote and local destination
@@ -683,6 +707,42 @@ class backupRecordingsWindow(tcw.CTkToplevel):
 
         self.window = None
 
+    async def get_file_sizes(self, recordings: List[DirectoryEntry]) -> List:
+        """
+        Gets the sizes of the recordings concurrently (the sizes of the files are
+        already known from the listing).
+
+        Args:
+            recordings: A list of recordings.
+
+        Returns:
+            A list with the human readable size of each recording (or the
+            exception raised when getting it).
+        """
+
+        async def get_size(recording: DirectoryEntry) -> str:
+            if not recording.is_dir:
+                return fm.format_size(recording.size)
+            return await fm.aget_directory_content_size(
+                f"{Settings.current_device.files.recordings.path}/{recording.name}",
+                human_readable=True,
+            )
+
+        return await asyncio.gather(
+            *[get_size(recording) for recording in recordings],
+            return_exceptions=True,
+        )
+
+    def show_file_sizes(self, file_list: List[str], file_sizes: List):
+        """
+        Adds the size of each recording to its checkbox.
+        """
+        for checkbox, file, file_size in zip(self.bagfiles, file_list, file_sizes):
+            if isinstance(file_size, Exception):
+                LogManager.error(f"Could not get the size of {file}: {file_size}")
+                file_size = "?"
+            checkbox.configure(text=f"{file} ({file_size})")
+
     def browse_directory(self):
         """
         Opens a file dialog to select the destination directory.
@@ -738,6 +798,7 @@ class backupRecordingsWindow(tcw.CTkToplevel):
             self.delete_button.configure(state="disabled")
             self.backup_button.configure(state="disabled")
 
+    @Metrics.action("backup")
     def backup(self):
         """
         Backs up the selected recordings to the specified destination.
@@ -763,6 +824,9 @@ class backupRecordingsWindow(tcw.CTkToplevel):
 
         # Generate the rsync command
         command = "rsync -avPh "
+        if download_to_local:
+            # Go through the master connection to the device
+            command += f"-e 'ssh {SSHMaster.ssh_options(Settings.current_device)}' "
         if self.delete_checkbox.get():
             command += "--remove-source-files "
 
@@ -838,7 +902,7 @@ class NameRecordWindow(tcw.CTkToplevel):
         self.master: RecordTopicsTabView = master
         self.topics = topics
         self.tmux_session = tmux_session
-        self.ros_version = sh.execute('echo $ROS_VERSION')
+        self.ros_version = sh.environment().ros_version
 
         self.file_name = tkinter.StringVar(
             value=datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
@@ -880,17 +944,19 @@ class NameRecordWindow(tcw.CTkToplevel):
             command = f"ros2 bag record {self.topics} -o {file_name} -s mcap --max-cache-size 1000000000 --storage-preset-profile zstd_fast"
 
         # Check if the "rec" window already exists
-        window_exists = False
-        list_windows_output = sh.execute(f"tmux list-windows -t {self.tmux_session}")
-        if "rec" in list_windows_output:
-            window_exists = True
+        session = TmuxControl.session(self.tmux_session)
+        commands = []
 
         # If the window does not exist, create it
-        if not window_exists:
-            sh.execute(f'tmux new-window -t "{self.tmux_session}" -n "rec"')
+        if session is None or session.window("rec") is None:
+            commands.append(f"new-window -t {shlex.quote(self.tmux_session)} -n rec")
 
         # Send the command to the "rec" window
-        sh.execute(f'tmux send-keys -t "BirdWatch:rec" "{command}" C-m')
+        commands.append(
+            f"send-keys -t {shlex.quote(self.tmux_session + ':rec')} "
+            + f"{shlex.quote(command)} C-m"
+        )
+        TmuxControl.run(commands, self.tmux_session)
 
         LogManager.info(f"Started recording topics to file {file_name}")
         LogManager.info(f"  Topics: {self.topics}")
@@ -0,0 +1,586 @@
+import re
+import shlex
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Tuple
+
+from LogManager import LogManager
+from ShellCommands import CommandError
+from ShellCommands import ShellCommands as sh
+
+
+class TmuxPaneState:
+    def __init__(
+        self,
+        pane_id: str,
+        index: int,
+        dead: bool,
+        pid: int,
+        command: str,
+        node: str = "",
+    ):
+        """
+        Pane of a tmux session, as last reported by tmux
+
+        Parameters:
+            pane_id (string): unique id of the pane (e.g. "%3")
+            index (int): index of the pane in its window
+            dead (bool): whether the command of the pane finished
+            pid (int): process id of the command of the pane
+            command (string): command currently running in the pane
+            node (string, optional): name of the node launched in the pane by
+                BirdWatch ("" if none)
+        """
+        self.pane_id = pane_id
+        self.index = index
+        self.dead = dead
+        self.pid = pid
+        self.command = command
+        self.node = node
+
+
+class TmuxWindowState:
+    def __init__(self, window_id: str, index: int, name: str):
+        """
+        Window of a tmux session, with its panes
+
+        Parameters:
+            window_id (string): unique id of the window (e.g. "@2")
+            index (int): index of the window in the session
+            name (string): name of the window
+        """
+        self.window_id = window_id
+        self.index = index
+        self.name = name
+        self.panes: List[TmuxPaneState] = []
+
+
+class TmuxSessionModel:
+    def __init__(self, name: str, windows: List[TmuxWindowState]):
+        """
+        Windows and panes of a tmux session, kept up to date by a
+        TmuxControlConnection
+
+        Parameters:
+            name (string): name of the session
+            windows (list[TmuxWindowState]): windows of the session, by index
+        """
+        self.name = name
+        self.windows = windows
+
+    def window(self, name: str) -> TmuxWindowState:
+        """
+        Returns the first window with the given name, or None if there is none
+        """
+        return next((window for window in self.windows if window.name == name), None)
+
+    def panes(self) -> List[Tuple[TmuxWindowState, TmuxPaneState]]:
+        """
+        Returns all the panes of the session, with their windows
+        """
+        return [(window, pane) for window in self.windows for pane in window.panes]
+
+    def node_pane(self, node: str) -> Tuple[TmuxWindowState, TmuxPaneState]:
+        """
+        Returns the pane in which a node was launched, with its window, or
+        (None, None) if there is none
+        """
+        return next(
+            ((window, pane) for window, pane in self.panes() if pane.node == node),
+            (None, None),
+        )
+
+    def target(self, window: TmuxWindowState, pane: TmuxPaneState = None) -> str:
+        """
+        Returns the tmux target of a window or pane (e.g. "BirdWatch:1.2")
+        """
+        target = f"{self.name}:{window.index}"
+        return target if pane is None else f"{target}.{pane.index}"
+
+
+class TmuxControlConnection:
+    """
+    Connection to a tmux session of the target device in control mode ("tmux
+    -C"), on a single long-lived channel. tmux reports every change of the
+    session (windows added, closed or renamed, panes split, ...) as it happens,
+    so the model of the session is updated without asking the device each time
+    it is needed. The output of the panes is only sent while a pane is
+    subscribed to (with tmux 3.2 or newer; older versions always send it)
+    """
+
+    # Notifications after which the windows and panes are listed again
+    STRUCTURE_CHANGES = {
+        "%layout-change",
+        "%pane-mode-changed",
+        "%session-changed",
+        "%session-renamed",
+        "%session-window-changed",
+        "%unlinked-window-add",
+        "%unlinked-window-close",
+        "%window-add",
+        "%window-close",
+        "%window-pane-changed",
+        "%window-renamed",
+    }
+    PANES_FORMAT = "\t".join(
+        [
+            "#{window_id}",
+            "#{window_index}",
+            "#{window_name}",
+            "#{pane_id}",
+            "#{pane_index}",
+            "#{pane_dead}",
+            "#{pane_pid}",
+            "#{@birdwatch_node}",
+            "#{pane_current_command}",
+        ]
+    )
+    # Escape sequences of the terminal (colors, cursor movements, titles, ...)
+    ESCAPE_SEQUENCES = re.compile(
+        r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)?|\x1b[@-_]"
+        + r"|[\x00-\x08\x0b-\x1f\x7f]"
+    )
+
+    # Lines of output kept per pane
+    output_lines: int = 500
+
+    def __init__(self, device, session_name: str):
+        """
+        Parameters:
+            device (Device): device on which the session runs
+            session_name (string): name of the tmux session
+        """
+        self.device = device
+        self.session_name = session_name
+
+        self.model: TmuxSessionModel = None
+        self.error: str = None
+        # Set once the session was listed for the first time (or attaching failed)
+        self.ready = threading.Event()
+
+        # Last lines of output of each pane, by pane id, and the line being written
+        self.outputs: Dict[str, Deque[str]] = {}
+        self._partial_lines: Dict[str, str] = {}
+        # Functions called with the new lines of each pane, by pane id
+        self._subscriptions: Dict[str, List[Callable[[List[str]], None]]] = {}
+        self._subscriptions_lock = threading.Lock()
+        # Functions subscribed whose pane is still being captured
+        self._capturing: List[Callable[[List[str]], None]] = []
+        # Whether tmux can stop sending the output ("no-output" flag, tmux >= 3.2)
+        self._output_control = True
+
+        self._process = None
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+        # Commands sent and waiting for their response, in order
+        self._pending: Deque[Tuple[str, Future]] = deque()
+        self._refresh_pending = False
+        self._refresh_again = False
+
+    def start(self):
+        with sh.on_device(self.device):
+            self._process = sh.execute_stream(
+                f"tmux -C attach -t {shlex.quote(self.session_name)}", with_input=True
+            )
+        self._thread = threading.Thread(
+            target=self._read,
+            name=f"TmuxControl {self.device.name}:{self.session_name}",
+            daemon=True,
+        )
+        self._thread.start()
+        # The output of the panes is only needed while subscribed to them
+        self.command("refresh-client -f no-output").add_done_callback(
+            self._check_output_control
+        )
+        self.refresh()
+
+    def close(self):
+        if self._process is not None:
+            self._process.close()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def command(self, command: str) -> Future:
+        """
+        Runs a tmux command through the connection
+
+        Parameters:
+            command (string): tmux command (without "tmux")
+
+        Returns:
+            Future: result with the lines of output of the command, or exception
+                (CommandError) if it failed
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((command, future))
+            try:
+                self._process.write(command + "\n")
+            except Exception as e:
+                self._pending.pop()
+                future.set_exception(e)
+        return future
+
+    def capture(self, pane_id: str, lines: int) -> List[str]:
+        """
+        Returns the last lines shown in a pane (including its scrollback)
+
+        Parameters:
+            pane_id (string): id of the pane
+            lines (int): number of lines to return at most
+        """
+        captured = self.command(self._capture_command(pane_id, lines)).result(
+            timeout=TmuxControl.timeout_s
+        )
+        return self._trim_capture(captured, lines)
+
+    def subscribe(
+        self, pane_id: str, listener: Callable[[List[str]], None], lines: int = 0
+    ) -> Future:
+        """
+        Calls a function with the new lines each time a pane writes complete
+        lines, until "unsubscribe" is called. The function is called in the
+        thread reading the connection, so it must return quickly
+
+        Parameters:
+            pane_id (string): id of the pane
+            listener (function): function called with the list of new lines
+            lines (int, optional): number of the last lines shown in the pane to
+                return, which the function is then only called with the lines
+                written after
+
+        Returns:
+            Future: result with the last lines shown in the pane (list[string])
+        """
+        with self._subscriptions_lock:
+            first = not self._subscriptions
+            if pane_id not in self._subscriptions:
+                # Anything received before is not followed by the new output
+                self._partial_lines.pop(pane_id, None)
+            self._subscriptions.setdefault(pane_id, []).append(listener)
+            if first and self._output_control:
+                self.command("refresh-client -f !no-output")
+
+            if lines <= 0:
+                future = Future()
+                future.set_result([])
+                return future
+
+            # Until the pane is captured, its output is already part of the capture
+            self._capturing.append(listener)
+            captured = self.command(self._capture_command(pane_id, lines))
+            cursor = self.command(
+                f"display-message -p -t {shlex.quote(pane_id)} '#{{cursor_x}}'"
+            )
+
+        future = Future()
+
+        def start(cursor: Future):
+            # Called in the thread reading the connection when the capture
+            # arrives, so no output is received between the two
+            with self._subscriptions_lock:
+                if listener in self._capturing:
+                    self._capturing.remove(listener)
+            try:
+                last_lines = self._trim_capture(captured.result(), lines)
+                if last_lines and cursor.result() != ["0"]:
+                    # The last line is still being written
+                    self._partial_lines[pane_id] = last_lines.pop()
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(last_lines)
+
+        cursor.add_done_callback(start)
+        return future
+
+    def unsubscribe(self, pane_id: str, listener: Callable[[List[str]], None]):
+        """
+        Stops calling a function added with "subscribe"
+        """
+        with self._subscriptions_lock:
+            listeners = self._subscriptions.get(pane_id, [])
+            if listener not in listeners:
+                return
+            listeners.remove(listener)
+            if listener in self._capturing:
+                self._capturing.remove(listener)
+            if not listeners:
+                del self._subscriptions[pane_id]
+                self._partial_lines.pop(pane_id, None)
+            if not self._subscriptions and self._output_control:
+                self.command("refresh-client -f no-output")
+
+    def refresh(self):
+        """
+        Lists the windows and panes of the session again (once the ones asked
+        before arrive, if any)
+        """
+        with self._lock:
+            if self._refresh_pending:
+                self._refresh_again = True
+                return
+            self._refresh_pending = True
+
+        future = self.command(
+            f"list-panes -s -t {shlex.quote(self.session_name)} "
+            + f"-F {shlex.quote(self.PANES_FORMAT)}"
+        )
+        future.add_done_callback(self._update_model)
+
+    def _check_output_control(self, future: Future):
+        if future.exception() is not None:
+            LogManager.debug(
+                f"tmux cannot stop sending the output of {self.session_name} "
+                + f"(3.2 or newer is needed): {future.exception()}"
+            )
+            self._output_control = False
+
+    def _update_model(self, future: Future):
+        with self._lock:
+            self._refresh_pending = False
+            # The session changed while it was being listed
+            again, self._refresh_again = self._refresh_again, False
+        if again and self.is_alive():
+            self.refresh()
+
+        try:
+            lines = future.result()
+        except Exception as e:
+            LogManager.debug(f"Could not list the panes of {self.session_name}: {e}")
+            self.ready.set()
+            return
+
+        windows: Dict[str, TmuxWindowState] = {}
+        for line in lines:
+            fields = line.split("\t")
+            if len(fields) < 9:
+                continue
+            window_id, window_index, window_name, pane_id, pane_index, dead, pid = (
+                fields[:7]
+            )
+            window = windows.get(window_id)
+            if window is None:
+                window = windows[window_id] = TmuxWindowState(
+                    window_id, int(window_index), window_name
+                )
+            window.panes.append(
+                TmuxPaneState(
+                    pane_id,
+                    int(pane_index),
+                    dead == "1",
+                    int(pid) if pid.isdigit() else None,
+                    "\t".join(fields[8:]),
+                    node=fields[7],
+                )
+            )
+
+        self.model = TmuxSessionModel(
+            self.session_name, sorted(windows.values(), key=lambda window: window.index)
+        )
+        if not again:
+            self.ready.set()
+
+    def _read(self):
+        block: List[str] = None
+        try:
+            for line in self._process:
+                line = line.rstrip("\n")
+
+                if block is not None:
+                    # Response to a command, until the line closing it
+                    if line.startswith(("%end ", "%error ")):
+                        self._finish_block(line, block)
+                        block = None
+                    else:
+                        block.append(line)
+                elif line.startswith("%begin "):
+                    block = []
+                elif line.startswith("%output "):
+                    _, pane_id, data = (line.split(" ", 2) + [""])[:3]
+                    self._add_output(pane_id, self._unescape(data))
+                elif line.startswith("%exit"):
+                    break
+                elif line.split(" ", 1)[0] in self.STRUCTURE_CHANGES:
+                    self.refresh()
+        except Exception as e:
+            LogManager.debug(f"Tmux control connection to {self.session_name} lost: {e}")
+        finally:
+            self._process.close()
+            self.model = None
+            with self._lock:
+                pending, self._pending = self._pending, deque()
+            for command, future in pending:
+                if not future.done():
+                    future.set_exception(
+                        CommandError(f"Tmux session {self.session_name} closed")
+                    )
+            self.ready.set()
+
+    def _finish_block(self, line: str, block: List[str]):
+        # The flags are 1 for the commands sent by this client, and 0 for the
+        # "attach" command that started it
+        fields = line.split(" ")
+        if len(fields) >= 4 and fields[3] == "0":
+            if line.startswith("%error "):
+                self.error = "\n".join(block)
+            return
+
+        with self._lock:
+            command, future = (
+                self._pending.popleft() if self._pending else (None, None)
+            )
+        if future is None:
+            return
+        if line.startswith("%error "):
+            future.set_exception(CommandError("\n".join(block)))
+        else:
+            future.set_result(block)
+
+    def _add_output(self, pane_id: str, data: str):
+        lines = (self._partial_lines.pop(pane_id, "") + data).split("\n")
+        if lines[-1]:
+            self._partial_lines[pane_id] = lines[-1]
+        if len(lines) == 1:
+            return
+
+        complete = [self._clean(line) for line in lines[:-1]]
+        self.outputs.setdefault(pane_id, deque(maxlen=self.output_lines)).extend(
+            complete
+        )
+        with self._subscriptions_lock:
+            listeners = [
+                listener
+                for listener in self._subscriptions.get(pane_id, [])
+                if listener not in self._capturing
+            ]
+        for listener in listeners:
+            try:
+                listener(complete)
+            except Exception as e:
+                LogManager.debug(f"Error handling the output of pane {pane_id}: {e}")
+
+    @staticmethod
+    def _capture_command(pane_id: str, lines: int) -> str:
+        return f"capture-pane -p -J -t {shlex.quote(pane_id)} -S -{int(lines)}"
+
+    @staticmethod
+    def _trim_capture(captured: List[str], lines: int) -> List[str]:
+        # Without the empty lines below the last output
+        while captured and not captured[-1].strip():
+            captured.pop()
+        return captured[-lines:]
+
+    @classmethod
+    def _clean(cls, line: str) -> str:
+        # What the line shows in the terminal: without escape sequences, and only
+        # the text written after the last carriage return
+        line = line.rstrip("\r").rsplit("\r", 1)[-1]
+        return cls.ESCAPE_SEQUENCES.sub("", line)
+
+    @staticmethod
+    def _unescape(data: str) -> str:
+        # tmux writes control characters and backslashes in octal (e.g. "\015")
+        return re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), data)
+
+
+class TmuxControl:
+    """
+    Keeps a control mode connection to the tmux sessions of the target devices
+    that BirdWatch works with, so that which windows and panes they have is
+    known without asking the device each time. Only the first lookup of a
+    session waits for the device
+
+    Example:
+        session = TmuxControl.session("BirdWatch")
+        if session is not None and session.window("rec") is not None:
+            sh.execute("tmux send-keys -t BirdWatch:rec C-c")
+    """
+
+    # Seconds to wait for the session to be listed when connecting
+    timeout_s: float = 10
+
+    _connections: Dict[Tuple[str, str], TmuxControlConnection] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def session(cls, session_name: str = "BirdWatch") -> TmuxSessionModel:
+        """
+        Returns the windows and panes of a tmux session on the target device,
+        connecting to it if needed
+
+        Parameters:
+            session_name (string, optional): name of the tmux session
+
+        Returns:
+            TmuxSessionModel: state of the session, or None if it does not exist
+        """
+        connection = cls.connection(session_name)
+        if not connection.ready.wait(cls.timeout_s):
+            raise TimeoutError(f"Tmux session {session_name} did not answer in time")
+        return connection.model
+
+    @classmethod
+    def connection(cls, session_name: str = "BirdWatch") -> TmuxControlConnection:
+        """
+        Returns the control mode connection to a tmux session on the target
+        device, connecting if it is not open (it may not be ready yet)
+        """
+        device = sh.target_device()
+        key = (device.name, session_name)
+        with cls._lock:
+            connection = cls._connections.get(key)
+            if connection is not None and connection.is_alive():
+                return connection
+
+            connection = cls._connections[key] = TmuxControlConnection(
+                device, session_name
+            )
+        connection.start()
+        return connection
+
+    @classmethod
+    def run(cls, commands: List[str], session_name: str = "BirdWatch") -> List[List[str]]:
+        """
+        Runs tmux commands through the connection to a session of the target
+        device, sending all of them at once
+
+        Parameters:
+            commands (list[string]): tmux commands (without "tmux")
+            session_name (string, optional): name of the tmux session
+
+        Returns:
+            list[list[string]]: lines of output of each command
+
+        Raises:
+            CommandError: if a command failed (or the session does not exist)
+        """
+        connection = cls.connection(session_name)
+        futures = [connection.command(command) for command in commands]
+        return [future.result(timeout=cls.timeout_s) for future in futures]
+
+    @classmethod
+    def invalidate(cls, session_name: str = "BirdWatch"):
+        """
+        Asks for the windows and panes of a session again (e.g. after changing
+        them), if connected to it. Lookups wait until they arrive
+        """
+        key = (sh.target_device().name, session_name)
+        with cls._lock:
+            connection = cls._connections.get(key)
+        if connection is not None and connection.is_alive():
+            connection.ready.clear()
+            connection.refresh()
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes the connections to all the sessions
+        """
+        with cls._lock:
+            connections = list(cls._connections.values())
+            cls._connections.clear()
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,838 @@
+import contextvars
+import hashlib
+import os
+import posixpath
+import queue
+import shlex
+import threading
+from collections import deque
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, List, Tuple
+
+import paramiko
+from paramiko.sftp import (
+    CMD_ATTRS,
+    CMD_DATA,
+    CMD_READ,
+    CMD_STAT,
+    CMD_STATUS,
+    CMD_WRITE,
+    int64,
+)
+from paramiko.sftp_attr import SFTPAttributes
+from paramiko.sftp_client import SFTPClient
+from paramiko.sftp_file import SFTPFile
+
+from LogManager import LogManager
+from SessionPool import PooledConnection
+from Settings import Settings
+from ShellCommands import CommandError
+from ShellCommands import ShellCommands as sh
+
+
+def _check_paramiko():
+    # The requests are pipelined with private methods of paramiko (see
+    # "_Requests"), so a version without them fails on import instead of in the
+    # middle of a transfer
+    missing = [
+        f"{owner.__name__}.{name}"
+        for owner, name in (
+            (SFTPClient, "_request"),
+            (SFTPClient, "_async_request"),
+            (SFTPClient, "_read_response"),
+            (SFTPClient, "_convert_status"),
+            (SFTPAttributes, "_from_msg"),
+        )
+        if not callable(getattr(owner, name, None))
+    ]
+    if missing:
+        raise ImportError(
+            f"paramiko {paramiko.__version__} has no {', '.join(missing)}, "
+            + "install the version of requirements.txt"
+        )
+
+
+_check_paramiko()
+
+
+class FileTransfer:
+    def __init__(self, src: str, dest: str, upload: bool):
+        """
+        Progress of the transfer of a file between the target device and the
+        local device
+
+        Parameters:
+            src (string): path of the file to transfer
+            dest (string): path of the destination file
+            upload (bool): True if the file is sent to the target device, False if
+                it is got from it
+        """
+        self.src = src
+        self.dest = dest
+        self.upload = upload
+
+        # "waiting", "transferring", "verifying", "done", "failed" or "cancelled"
+        self.state = "waiting"
+        # Bytes of the file, and bytes already in the destination (including the
+        # ones of a previous transfer that was resumed)
+        self.size = 0
+        self.transferred = 0
+        self.resumed_from = 0
+        # SHA-256 of the data transferred, and whether it was compared with the
+        # one of the file on the target device
+        self.digest: str = None
+        self.verified = False
+        self.error: Exception = None
+
+        self.start_time: float = None
+        self.end_time: float = None
+        # Time of the last progress notification
+        self._notified: float = 0.0
+
+    @property
+    def part_path(self) -> str:
+        """
+        Path to which the file is written until it is complete
+        """
+        return self.dest + TransferEngine.part_suffix
+
+    @property
+    def elapsed_s(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second transferred (not counting the resumed ones)
+        """
+        elapsed_s = self.elapsed_s
+        if elapsed_s == 0:
+            return 0.0
+        return (self.transferred - self.resumed_from) / elapsed_s
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def __repr__(self):
+        return (
+            f"FileTransfer({self.src!r} -> {self.dest!r}, {self.state}, "
+            + f"{self.transferred}/{self.size} B)"
+        )
+
+
+class TransferEngine:
+    # Appended to the destination until the file is complete, so that a
+    # transfer interrupted (e.g. by a dropped link) can be resumed
+    part_suffix: str = ".part"
+
+    # Bytes of each read or write request (the largest paramiko sends)
+    block_size: int = SFTPFile.MAX_REQUEST_SIZE
+    # Bytes requested without waiting for their answers by all the files at the
+    # start, and at least, whatever the speed of the link
+    min_in_flight: int = 4 * SFTPFile.MAX_REQUEST_SIZE
+    # Seconds between progress notifications of a file
+    progress_interval_s: float = 0.2
+
+    def __init__(
+        self,
+        files: List[Tuple[str, str]],
+        upload: bool = False,
+        resume: bool = True,
+        verify: bool = None,
+        channels: int = None,
+        max_requests: int = None,
+        on_progress: Callable[[FileTransfer], None] = None,
+        connection: PooledConnection = None,
+        make_directory: Callable[[str], None] = None,
+    ):
+        """
+        Transfers files between the target device and the local device over
+        SFTP, several of them at the same time, each over its own SFTP channel.
+        The requests of each file are pipelined: several reads (or writes) are
+        sent before waiting for the answers, so the round trips of a slow link
+        do not add up. The bytes waiting for an answer are limited to about twice
+        the bandwidth of the link times its round-trip time (both measured from
+        the answers), since more would only wait in the queues of the link and
+        delay everything else sent over it
+
+        Each file is written to "<dest>.part" and renamed once complete. If the
+        transfer is interrupted, the next one of the same file continues from
+        the bytes already in the ".part" file. Once complete, the SHA-256 of both
+        files are compared (with "sha256sum" on the target device); if they do
+        not match after resuming, the file is transferred again from the start
+
+        Parameters:
+            files (list[tuple[string, string]]): source and destination paths of
+                each file (already normalized)
+            upload (bool, optional): True to send the files to the target device,
+                False to get them from it
+            resume (bool, optional): if False, the ".part" files are not reused
+            verify (bool, optional): whether to compare the checksums (see
+                "transfer_verify_checksum" in Settings)
+            channels (int, optional): files transferred at the same time (see
+                "transfer_channels" in Settings)
+            max_requests (int, optional): maximum reads (or writes) of each file
+                sent without waiting for their answers (see
+                "transfer_max_requests" in Settings)
+            on_progress (function, optional): called (from a worker thread) with
+                the FileTransfer of a file when it progresses or changes state
+            connection (PooledConnection, optional): connection on which to open
+                the channels (by default, the main one to the target device)
+            make_directory (function, optional): called (from a worker thread)
+                with the directory of a file being sent if it does not exist, to
+                create it before trying again
+
+        Example:
+            engine = TransferEngine(
+                [(remote_path, local_path)], on_progress=lambda t: print(t.transferred)
+            )
+            engine.run()
+        """
+        self.transfers = [FileTransfer(src, dest, upload) for src, dest in files]
+        self.upload = upload
+        self.resume = resume
+        self.verify = Settings.transfer_verify_checksum if verify is None else verify
+        self.channels = max(1, channels or Settings.transfer_channels)
+        self.max_requests = max(1, max_requests or Settings.transfer_max_requests)
+        self.on_progress = on_progress
+        self.connection = connection
+        self.make_directory = make_directory
+        self.window = _InFlightWindow(
+            self.min_in_flight, self.channels * self.max_requests * self.block_size
+        )
+
+        self.cancelled = False
+        self.start_time: float = None
+        self.end_time: float = None
+
+    @property
+    def size(self) -> int:
+        return sum(transfer.size for transfer in self.transfers)
+
+    @property
+    def transferred(self) -> int:
+        return sum(transfer.transferred for transfer in self.transfers)
+
+    @property
+    def elapsed_s(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second transferred by all the files (not counting the resumed
+        ones)
+        """
+        elapsed_s = self.elapsed_s
+        if elapsed_s == 0:
+            return 0.0
+        return (
+            sum(
+                transfer.transferred - transfer.resumed_from
+                for transfer in self.transfers
+            )
+            / elapsed_s
+        )
+
+    def cancel(self):
+        """
+        Stops the transfers (the ".part" files are kept to resume them later). It
+        can be called from any thread
+        """
+        self.cancelled = True
+
+    def run(self) -> List[FileTransfer]:
+        """
+        Transfers the files, blocking until all of them finished
+
+        Returns:
+            list[FileTransfer]: transfer of each file
+
+        Raises:
+            Exception: the error of the first file that failed (once the others
+                finished), or if the transfers were cancelled
+        """
+        self.start_time = time.monotonic()
+        connection = self.connection or sh.get_connection()
+        try:
+            with ThreadPoolExecutor(max_workers=self.channels + 1) as executor:
+                # Each thread runs on a copy of the context, so it targets the same
+                # device and its requests count for the operation being measured
+                remote_digests = None
+                if self.verify and not self.upload:
+                    # Computed on the target device while the files are transferred
+                    remote_digests = executor.submit(
+                        contextvars.copy_context().run,
+                        self._remote_digests,
+                        [transfer.src for transfer in self.transfers],
+                    )
+
+                transfers = self.transfers
+                resume = self.resume
+                while transfers:
+                    self._transfer_all(executor, connection, transfers, resume)
+                    # The files whose ".part" file was not from the same file are
+                    # transferred again from the start
+                    transfers = self._finish(
+                        transfers,
+                        remote_digests.result() if remote_digests else None,
+                        retry=resume,
+                    )
+                    resume = False
+        finally:
+            self.end_time = time.monotonic()
+
+        if self.cancelled:
+            raise Exception("Operation cancelled")
+        for transfer in self.transfers:
+            if transfer.error is not None:
+                raise transfer.error
+        return self.transfers
+
+    def _transfer_all(
+        self,
+        executor: ThreadPoolExecutor,
+        connection: PooledConnection,
+        transfers: List[FileTransfer],
+        resume: bool,
+    ):
+        # Transfers the files to their ".part" files over several channels
+        pending: "queue.Queue[FileTransfer]" = queue.Queue()
+        for transfer in transfers:
+            pending.put(transfer)
+
+        workers = [
+            executor.submit(
+                contextvars.copy_context().run,
+                self._worker,
+                connection,
+                pending,
+                resume,
+            )
+            for _ in range(min(self.channels, len(transfers)))
+        ]
+        for worker in workers:
+            worker.result()
+
+    def _worker(
+        self,
+        connection: PooledConnection,
+        pending: "queue.Queue[FileTransfer]",
+        resume: bool,
+    ):
+        # Transfers files over its own SFTP channel until none is left
+        sftp = None
+        try:
+            while True:
+                try:
+                    transfer = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                if self.cancelled:
+                    self._set_state(transfer, "cancelled")
+                    continue
+
+                try:
+                    if sftp is None:
+                        sftp = connection.open_sftp()
+                    transfer.start_time = time.monotonic()
+                    self._set_state(transfer, "transferring")
+                    if self.upload:
+                        transfer.digest = self._upload(sftp, transfer, resume)
+                    else:
+                        transfer.digest = self._download(sftp, transfer, resume)
+                except Exception as e:
+                    self._fail(transfer, e)
+        finally:
+            if sftp is not None:
+                sftp.close()
+
+    def _finish(
+        self, transfers: List[FileTransfer], remote_digests: dict, retry: bool
+    ) -> List[FileTransfer]:
+        # Compares the checksums of the files transferred and renames their
+        # ".part" files. Returns the ones to transfer again from the start
+        transferred = [transfer for transfer in transfers if transfer.error is None]
+        if self.cancelled:
+            for transfer in transferred:
+                self._set_state(transfer, "cancelled")
+            return []
+        for transfer in transferred:
+            self._set_state(transfer, "verifying")
+
+        if self.upload:
+            # Checked and renamed on the target device with a single call
+            try:
+                results = self._finish_uploads(transferred)
+            except Exception as e:
+                for transfer in transferred:
+                    self._fail(transfer, e)
+                return []
+        else:
+            results = []
+            for transfer in transferred:
+                remote_digest = (remote_digests or {}).get(transfer.src)
+                if not self.verify or remote_digest is None:
+                    results.append("unverified")
+                elif remote_digest == transfer.digest:
+                    results.append("verified")
+                else:
+                    results.append("mismatch")
+
+        again = []
+        for transfer, result in zip(transferred, results):
+            if result == "mismatch" and retry and transfer.resumed_from > 0:
+                LogManager.warning(
+                    f"Checksum of {transfer.dest} does not match after resuming, "
+                    + "transferring it again from the start"
+                )
+                again.append(transfer)
+            elif result == "mismatch":
+                self._fail(
+                    transfer,
+                    IOError(
+                        f"Checksum of {transfer.dest} does not match the one of "
+                        + transfer.src
+                    ),
+                )
+            elif result == "failed":
+                self._fail(
+                    transfer, IOError(f"Could not rename {transfer.part_path}")
+                )
+            else:
+                if result == "unverified" and self.verify:
+                    LogManager.warning(
+                        f"Could not verify the checksum of {transfer.dest}"
+                    )
+                transfer.verified = result == "verified"
+                if not self.upload:
+                    # The destination is replaced only once it is complete
+                    os.replace(transfer.part_path, transfer.dest)
+                transfer.end_time = time.monotonic()
+                self._set_state(transfer, "done")
+        return again
+
+    def _finish_uploads(self, transfers: List[FileTransfer]) -> List[str]:
+        # Renames the ".part" files on the target device if their checksum
+        # matches. Returns "verified", "unverified", "mismatch" or "failed" for
+        # each file
+        if not transfers:
+            return []
+        if self.verify:
+            lines = [
+                "if command -v sha256sum >/dev/null 2>&1; then",
+                "  bw_verify=1",
+                "else",
+                "  bw_verify=0",
+                "fi",
+            ]
+        else:
+            lines = ["bw_verify=0"]
+        for transfer in transfers:
+            part_path = shlex.quote(transfer.part_path)
+            dest = shlex.quote(transfer.dest)
+            lines += [
+                'if [ "$bw_verify" = 0 ] || '
+                + f"[ \"$(sha256sum 2>/dev/null < {part_path} | cut -d ' ' -f 1)\" = "
+                + f"{shlex.quote(transfer.digest)} ]; then",
+                f"  if mv -f {part_path} {dest} 2>/dev/null; then",
+                '    [ "$bw_verify" = 1 ] && echo verified || echo unverified',
+                "  else",
+                "    echo failed",
+                "  fi",
+                "else",
+                "  echo mismatch",
+                "fi",
+            ]
+        results = sh.execute("\n".join(lines)).split()
+        if len(results) != len(transfers):
+            raise IOError("Could not rename the files transferred")
+        return results
+
+    def _remote_digests(self, paths: List[str]) -> dict:
+        # SHA-256 of files of the target device, computed with a single call
+        # (empty if "sha256sum" is not available)
+        lines = ["command -v sha256sum >/dev/null 2>&1 || exit 0"] + [
+            f"echo \"$(sha256sum 2>/dev/null < {shlex.quote(path)} | cut -d ' ' -f 1)\""
+            for path in paths
+        ]
+        try:
+            output = sh.execute("\n".join(lines))
+        except CommandError as e:
+            LogManager.warning(f"Could not compute the checksums: {e}")
+            return {}
+        digests = output.split("\n")
+        return {
+            path: digest.strip()
+            for path, digest in zip(paths, digests)
+            if digest.strip()
+        }
+
+    def _fail(self, transfer: FileTransfer, error: Exception):
+        transfer.error = error
+        transfer.end_time = time.monotonic()
+        if self.cancelled:
+            self._set_state(transfer, "cancelled")
+        else:
+            LogManager.error(
+                f"Error transferring {transfer.src} to {transfer.dest}: {error}"
+            )
+            self._set_state(transfer, "failed")
+
+    def _download(self, sftp: SFTPClient, transfer: FileTransfer, resume: bool):
+        # Returns the SHA-256 of the data written
+        requests = _Requests(sftp, self.window)
+        # The size is asked for without waiting, together with the opening
+        requests.send(None, 0, CMD_STAT, transfer.src)
+        with requests, sftp.open(transfer.src, "rb") as source:
+            _, t, msg = requests.receive()
+            if t != CMD_ATTRS:
+                raise IOError(f"Unexpected answer to the stat of {transfer.src}")
+            transfer.size = SFTPAttributes._from_msg(msg).st_size
+
+            offset = 0
+            if resume and os.path.exists(transfer.part_path):
+                offset = os.path.getsize(transfer.part_path)
+                if offset > transfer.size:
+                    offset = 0
+            self._start(transfer, offset)
+
+            digest = hashlib.sha256()
+            with open(transfer.part_path, "r+b" if offset else "wb") as destination:
+                if offset:
+                    self._hash(destination, offset, digest)
+                    destination.seek(offset)
+
+                next_offset = offset
+                while transfer.transferred < transfer.size:
+                    self._check_cancelled()
+
+                    # Keep up to "max_requests" reads waiting for their answer, as
+                    # long as the link does not have enough data in flight
+                    while (
+                        len(requests) < self.max_requests
+                        and next_offset < transfer.size
+                    ):
+                        length = min(self.block_size, transfer.size - next_offset)
+                        if not self.window.acquire(length, wait=len(requests) == 0):
+                            break
+                        requests.send(
+                            (next_offset, length),
+                            length,
+                            CMD_READ,
+                            source.handle,
+                            int64(next_offset),
+                            int(length),
+                        )
+                        next_offset += length
+
+                    (read_offset, length), t, msg = requests.receive()
+                    if t != CMD_DATA:
+                        raise IOError(f"Unexpected answer reading {transfer.src}")
+                    data = msg.get_string()
+                    if len(data) < length:
+                        # The server can answer with less data than requested
+                        data += self._read(
+                            sftp, source, read_offset + len(data), length - len(data)
+                        )
+
+                    destination.write(data)
+                    digest.update(data)
+                    self._advance(transfer, len(data))
+
+        return digest.hexdigest()
+
+    def _read(self, sftp: SFTPClient, source: SFTPFile, offset: int, length: int):
+        # Reads the rest of a block waiting for each answer
+        data = b""
+        while len(data) < length:
+            t, msg = sftp._request(
+                CMD_READ,
+                source.handle,
+                int64(offset + len(data)),
+                int(length - len(data)),
+            )
+            if t != CMD_DATA:
+                raise IOError("Unexpected answer reading the file")
+            chunk = msg.get_string()
+            if not chunk:
+                raise EOFError("The file is shorter than expected")
+            data += chunk
+        return data
+
+    def _upload(self, sftp: SFTPClient, transfer: FileTransfer, resume: bool):
+        # Returns the SHA-256 of the data read
+        transfer.size = os.path.getsize(transfer.src)
+
+        offset = 0
+        if resume:
+            try:
+                offset = sftp.stat(transfer.part_path).st_size
+            except FileNotFoundError:
+                pass
+            if offset > transfer.size:
+                offset = 0
+        self._start(transfer, offset)
+
+        digest = hashlib.sha256()
+        with open(transfer.src, "rb") as source:
+            if offset:
+                self._hash(source, offset, digest)
+                source.seek(offset)
+
+            mode = "r+" if offset else "w"
+            try:
+                destination = sftp.open(transfer.part_path, mode)
+            except FileNotFoundError:
+                if self.make_directory is None:
+                    raise
+                # The directory was removed after it was created
+                self.make_directory(posixpath.dirname(transfer.part_path))
+                destination = sftp.open(transfer.part_path, mode)
+
+            requests = _Requests(sftp, self.window)
+            with requests, destination:
+                write_offset = offset
+                while write_offset < transfer.size:
+                    self._check_cancelled()
+
+                    # Keep up to "max_requests" writes waiting for their answer,
+                    # as long as the link does not have enough data in flight
+                    length = min(self.block_size, transfer.size - write_offset)
+                    if len(requests) >= self.max_requests or not self.window.acquire(
+                        length, wait=len(requests) == 0
+                    ):
+                        length, _, _ = requests.receive()
+                        self._advance(transfer, length)
+                        continue
+
+                    data = source.read(length)
+                    if len(data) < length:
+                        self.window.release(length)
+                        raise EOFError(f"{transfer.src} is shorter than expected")
+                    digest.update(data)
+                    requests.send(
+                        length,
+                        length,
+                        CMD_WRITE,
+                        destination.handle,
+                        int64(write_offset),
+                        data,
+                    )
+                    write_offset += length
+
+                while len(requests) > 0:
+                    length, _, _ = requests.receive()
+                    self._advance(transfer, length)
+
+        return digest.hexdigest()
+
+    def _hash(self, file, size: int, digest):
+        # Adds the first bytes of a local file to the checksum
+        file.seek(0)
+        remaining = size
+        while remaining > 0:
+            data = file.read(min(1024 * 1024, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+
+    def _start(self, transfer: FileTransfer, offset: int):
+        transfer.resumed_from = offset
+        transfer.transferred = offset
+        transfer._notified = time.monotonic()
+        if offset:
+            LogManager.info(
+                f"Resuming the transfer of {transfer.src} at {offset} of "
+                + f"{transfer.size} bytes"
+            )
+        self._notify(transfer)
+
+    def _advance(self, transfer: FileTransfer, size: int):
+        transfer.transferred += size
+        now = time.monotonic()
+        if now - transfer._notified >= self.progress_interval_s:
+            transfer._notified = now
+            self._notify(transfer)
+
+    def _set_state(self, transfer: FileTransfer, state: str):
+        transfer.state = state
+        self._notify(transfer)
+
+    def _notify(self, transfer: FileTransfer):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(transfer)
+        except Exception as e:
+            LogManager.exception(f"Error notifying transfer progress: {e}")
+
+    def _check_cancelled(self):
+        if self.cancelled:
+            raise Exception("Operation cancelled")
+
+
+class _InFlightWindow:
+    def __init__(self, min_size: int, max_size: int):
+        """
+        Bytes that the channels of a transfer can request without waiting for
+        their answers, shared by all of them. It is kept at twice the bandwidth
+        of the link times its shortest round-trip time, both measured from the
+        answers: while the link is not full, the answers come back faster the
+        more is requested, so the window grows until it is
+
+        Parameters:
+            min_size (int): bytes that can always be requested
+            max_size (int): bytes that can be requested at most
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = min_size
+        self.in_flight = 0
+
+        # Bytes answered so far, the shortest round-trip time and the recent
+        # delivery rates (time measured and bytes per second)
+        self.delivered = 0
+        self.min_rtt_s: float = None
+        self.rates: Deque[Tuple[float, float]] = deque()
+
+        self._condition = threading.Condition()
+
+    def acquire(self, length: int, wait: bool) -> bool:
+        """
+        Counts bytes as requested if they fit in the window (if nothing is in
+        flight they always fit)
+
+        Parameters:
+            length (int): bytes to request
+            wait (bool): if True, waits until they fit instead of failing. Only
+                the channels without requests waiting for their answers can wait
+
+        Returns:
+            bool: whether the bytes can be requested
+        """
+        with self._condition:
+            while self.in_flight > 0 and self.in_flight + length > self.size:
+                if not wait:
+                    return False
+                self._condition.wait()
+            self.in_flight += length
+            return True
+
+    def release(self, length: int, sent: Tuple[float, int] = None):
+        """
+        Counts bytes requested as answered
+
+        Parameters:
+            length (int): bytes requested
+            sent (tuple, optional): time when the request was sent and bytes
+                answered at that time (as returned by "sent"), to measure the link
+                with. Not given for requests that were not answered
+        """
+        with self._condition:
+            self.in_flight -= length
+            if sent is not None:
+                self.delivered += length
+                self._measure(*sent)
+            self._condition.notify_all()
+
+    def sent(self) -> Tuple[float, int]:
+        """
+        Returns the state of the window when a request is sent, for "release"
+        """
+        with self._condition:
+            return time.monotonic(), self.delivered
+
+    def _measure(self, sent_time: float, delivered: int):
+        # Must be called holding the condition
+        now = time.monotonic()
+        rtt_s = max(now - sent_time, 1e-6)
+        if self.min_rtt_s is None or rtt_s < self.min_rtt_s:
+            self.min_rtt_s = rtt_s
+
+        # Bytes answered while the request was in flight
+        self.rates.append((now, (self.delivered - delivered) / rtt_s))
+        while self.rates and now - self.rates[0][0] > max(1.0, 10 * self.min_rtt_s):
+            self.rates.popleft()
+        bandwidth = max(rate for _, rate in self.rates)
+
+        self.size = int(
+            min(self.max_size, max(self.min_size, 2 * bandwidth * self.min_rtt_s))
+        )
+
+
+class _Requests:
+    def __init__(self, sftp: SFTPClient, window: _InFlightWindow):
+        """
+        Requests on a file sent without waiting for their answers, answered in
+        the order they were sent. They are sent with SFTPClient._async_request
+        and their answers read with SFTPClient._read_response, as SFTPFile does
+        to prefetch, which hands the answers to other requests to
+        "_async_response". These private methods were tested with paramiko 3.0
+        to 5.0 and are checked on import. The answers that arrive while waiting
+        for an earlier one are kept until they are received. The bytes of the
+        requests must be acquired from the window before sending them, and are
+        released when they are answered (or when leaving the "with" block)
+        """
+        self.sftp = sftp
+        self.window = window
+        self.pending = deque()
+        self.answers = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # The requests abandoned no longer count as in flight
+        while self.pending:
+            _, _, length, _ = self.pending.popleft()
+            self.window.release(length)
+
+    def send(self, context, length: int, t: int, *args):
+        """
+        Sends a request, keeping the context given with it
+
+        Parameters:
+            context: returned with the answer
+            length (int): bytes acquired from the window for the request
+            t (int): type of request
+        """
+        sent = self.window.sent()
+        num = self.sftp._async_request(self, t, *args)
+        self.pending.append((num, context, length, sent))
+
+    def receive(self) -> tuple:
+        """
+        Waits for the answer to the oldest request
+
+        Returns:
+            tuple: context of the request, type and message of the answer
+
+        Raises:
+            IOError: if the request failed
+        """
+        num, context, length, sent = self.pending[0]
+        if num in self.answers:
+            t, msg = self.answers.pop(num)
+            if t == CMD_STATUS:
+                self.sftp._convert_status(msg)
+        else:
+            t, msg = self.sftp._read_response(num)
+        self.pending.popleft()
+        self.window.release(length, sent)
+        return context, t, msg
+
+    def _async_response(self, t, msg, num):
+        # Called by the SFTP client with the answers to other requests
+        self.answers[num] = (t, msg)
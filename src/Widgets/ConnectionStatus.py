@@ -0,0 +1,46 @@
+import Widgets.ThemedCtkWidgets as tcw
+from ConnectionSupervisor import ConnectionSupervisor, LinkState
+from Settings import Settings
+
+
+class ConnectionStatus(tcw.CTkLabel):
+    def __init__(self, master, update_interval_ms: int = 1000):
+        """
+        Label showing the state of the SSH link to the current device (and its
+        round-trip time), as measured by the ConnectionSupervisor. Clicking on it
+        while waiting to reconnect makes the next attempt right away
+
+        Parameters:
+            master: the parent widget
+            update_interval_ms (optional, int): time between updates of the label
+        """
+        super().__init__(
+            master,
+            text="",
+            tooltip_text="State of the connection to the target device\n"
+            + "(click to reconnect right away if it was lost)",
+        )
+        self.update_interval_ms = update_interval_ms
+
+        self.bind("<Button-1>", lambda event: self.reconnect())
+
+        self.update_status()
+
+    def update_status(self):
+        if not Settings.is_ssh_config_set():
+            self.configure(text="Local device")
+        else:
+            status = ConnectionSupervisor.status(Settings.current_device.name)
+            if status.state == LinkState.CONNECTED:
+                text = f"● {status}"
+            elif status.state == LinkState.DISCONNECTED:
+                text = f"○ {status}"
+            else:
+                text = f"◌ {status}"
+            self.configure(text=text)
+
+        self.after(self.update_interval_ms, self.update_status)
+
+    def reconnect(self):
+        if Settings.is_ssh_config_set():
+            ConnectionSupervisor.reconnect_now(Settings.current_device.name)
@@ -0,0 +1,58 @@
+import Widgets.ThemedCtkWidgets as tcw
+from StatusService import StatusService, StatusSnapshot
+
+
+class DeviceStatus(tcw.CTkLabel):
+    def __init__(self, master, session_name: str = "BirdWatch"):
+        """
+        Label showing the load, memory and free disk of the target device, and
+        how many nodes are running in the tmux session, as gathered by the
+        StatusService
+
+        Parameters:
+            master: the parent widget
+            session_name (optional, string): name of the tmux session whose panes
+                to count
+        """
+        super().__init__(master, text="", tooltip_text=" ")
+        self.session_name = session_name
+
+        StatusService.subscribe(self.show_snapshot, widget=self)
+        self.bind("<Destroy>", self.on_destroy)
+
+    def show_snapshot(self, snapshot: StatusSnapshot):
+        if not self.winfo_exists():
+            return
+
+        if snapshot.error is not None:
+            self.configure(text="")
+            self.tooltip.text = f"No status of {snapshot.device_name}"
+            return
+
+        parts = []
+        if snapshot.load_average is not None:
+            parts.append(f"Load {snapshot.load_average[0]:.2f}")
+        if snapshot.memory is not None:
+            total, available = snapshot.memory
+            parts.append(f"Memory {100 * (total - available) / total:.0f}%")
+        if snapshot.disk is not None:
+            parts.append(f"{snapshot.disk[2] / 1024**3:.1f} GB free")
+        if snapshot.panes is not None:
+            panes = snapshot.panes_of(self.session_name)
+            if panes:
+                running = sum(not pane.dead for pane in panes)
+                parts.append(f"{running}/{len(panes)} panes running")
+        self.configure(text="  |  ".join(parts))
+
+        # List of the panes of the session and what runs in each of them
+        self.tooltip.text = "\n".join(
+            [f"State of {snapshot.device_name}"]
+            + [
+                f"{pane.target}: " + ("finished" if pane.dead else pane.command)
+                for pane in snapshot.panes_of(self.session_name)
+            ]
+        )
+
+    def on_destroy(self, event):
+        if event.widget is self:
+            StatusService.unsubscribe(self.show_snapshot)
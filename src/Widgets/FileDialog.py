@@ -9,6 +9,7 @@ from pathlib import Path
 from IconManager import IconManager
 from typing import List, Callable
 from LogManager import LogManager
+from Metrics import Metrics
 import threading
 import re
 
@@ -281,6 +282,7 @@ class FileDialog(tcw.CTkToplevel):
             self.delete_btn.configure(image=IconManager.delete.icon_gray)
             self.delete_btn.configure(state="disabled")
 
+    @Metrics.action("browse files")
     def move_to(self, directory: str):
         """
         Move to the specified directory.
@@ -488,23 +490,30 @@ class ElementList(tcw.CTkScrollableFrame):
         self.directory = directory
         self.element_type = "directory" if file_type is None else "file"
 
-        if not fm.exists(directory, force_local=self.master.run_local):
+        try:
+            attributes = fm.get_attributes(directory, force_local=self.master.run_local)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Directory does not exist: {directory}")
 
-        if not stat.S_ISDIR(
-            fm.get_attributes(directory, force_local=self.master.run_local).st_mode
-        ):
+        if not stat.S_ISDIR(attributes.st_mode):
             raise NotADirectoryError(f"Path is not a directory: {directory}")
 
-        # Get the list of the directories and files
-        directories = fm.list_directories(directory, force_local=self.master.run_local)
-        directories.sort()
+        # Get the directories and files with their types in a single listing
+        self.entries = {
+            entry.name: entry
+            for entry in fm.scandir(directory, force_local=self.master.run_local)
+        }
+
+        directories = sorted(
+            name for name, entry in self.entries.items() if entry.is_dir
+        )
         if not show_hidden:
             directories = [d for d in directories if not d.startswith(".")]
 
         if file_type is not None:
-            files = fm.list_files(directory, force_local=self.master.run_local)
-            files.sort()
+            files = sorted(
+                name for name, entry in self.entries.items() if entry.is_file
+            )
             if not show_hidden:
                 files = [f for f in files if not f.startswith(".")]
             if file_type is not None:
@@ -553,22 +562,9 @@ class ElementList(tcw.CTkScrollableFrame):
             self.currently_selected = element
             self.master.enable_ctrl_btns(True)
 
-            if (
-                stat.S_ISDIR(
-                    fm.get_attributes(
-                        self.directory + element.label.cget("text"),
-                        force_local=self.master.run_local,
-                    ).st_mode
-                )
-                and self.element_type == "directory"
-            ) or (
-                stat.S_ISREG(
-                    fm.get_attributes(
-                        self.directory + element.label.cget("text"),
-                        force_local=self.master.run_local,
-                    ).st_mode
-                )
-                and self.element_type == "file"
+            entry = self.entries[element.label.cget("text")]
+            if (entry.is_dir and self.element_type == "directory") or (
+                entry.is_file and self.element_type == "file"
             ):
                 self.master.select_button.configure(state="normal")
 
@@ -579,12 +575,7 @@ class ElementList(tcw.CTkScrollableFrame):
         Parameters:
             element: The element that was double clicked.
         """
-        if stat.S_ISDIR(
-            fm.get_attributes(
-                self.directory + element.label.cget("text"),
-                force_local=self.master.run_local,
-            ).st_mode
-        ):
+        if self.entries[element.label.cget("text")].is_dir:
             self.master.move_to(self.directory + element.label.cget("text"))
         else:
             self.master.select_command(self.directory + element.label.cget("text"))
@@ -823,6 +814,7 @@ class ElementPropertiesWindow(tcw.CTkToplevel):
             self.update_content_loading_label()
 
             # Start a thread to get the content size (if the directory has many subdirectories and files, this can take a while)
+            self.cancel_event = threading.Event()
             self.thread = threading.Thread(target=self.update_content_size)
             self.thread.start()
         else:
@@ -869,6 +861,7 @@ class ElementPropertiesWindow(tcw.CTkToplevel):
                 self.element_path,
                 force_local=self.master.run_local,
                 human_readable=True,
+                cancel_event=self.cancel_event,
             )
         except Exception as e:
             return
@@ -893,8 +886,9 @@ class ElementPropertiesWindow(tcw.CTkToplevel):
         """
         Destroy the element properties window.
         """
-        if fm.cancel_function():
-            if hasattr(self, "thread") and self.thread.is_alive():
+        if hasattr(self, "cancel_event"):
+            self.cancel_event.set()
+            if self.thread.is_alive():
                 self.thread.join(timeout=2)
                 if self.thread.is_alive():
                     LogManager.error(
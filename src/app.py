@@ -21,6 +21,16 @@ from SelectDevice import DeviceSelectionFrame
 import signal
 from Widgets.CollapsibleLogBox import CollapsibleLoggingTextbox
 from Settings import Settings
+from AsyncManager import AsyncManager
+from SessionPool import SessionPool
+from ConnectionSupervisor import ConnectionSupervisor
+from SSHMaster import SSHMaster
+from TmuxControl import TmuxControl
+from Widgets.ConnectionStatus import ConnectionStatus
+from Widgets.DeviceStatus import DeviceStatus
+from PollingScheduler import PollingScheduler
+from Metrics import Metrics
+from PopUpWindows import MetricsWindow
 
 def thread(func):
     @wraps(func)
@@ -71,6 +81,26 @@ class App(ctk.CTk):
         # Set the root app
         Settings.set_root_app(self)
 
+        # Start the event loop of the asynchronous API
+        AsyncManager.start(self)
+
+        # Start watching the SSH links to the devices
+        ConnectionSupervisor.start()
+
+        # Write the measurements of the remote operations periodically
+        if Settings.metrics_file is not None:
+            PollingScheduler.register(
+                "metrics",
+                lambda: Metrics.flush(Settings.metrics_file),
+                Settings.metrics_flush_interval_s,
+                priority=PollingScheduler.LOW,
+                remote=False,
+            )
+
+        # Show the measurements of the remote operations with Ctrl+Shift+D
+        self.metrics_window = None
+        self.bind_all("<Control-D>", lambda event: self.open_metrics_window())
+
         # Add logging textbox
         self.add_logging_textbox()
 
@@ -138,6 +168,15 @@ class App(ctk.CTk):
         # Set the textbox for the LogManager
         LogManager.set_textbox(self.logging_textbox.logging_textbox)
 
+    def open_metrics_window(self):
+        """
+        Open the window with the measurements of the remote operations
+        """
+        if self.metrics_window is None or not self.metrics_window.winfo_exists():
+            self.metrics_window = MetricsWindow(self)
+        else:
+            self.metrics_window.focus()
+
     def ctrl_c_handler(self, signum, frame):
         """
         Handler for Ctrl-C signal
@@ -165,6 +204,14 @@ class App(ctk.CTk):
         """
         Exit the main app
         """
+        PollingScheduler.stop()
+        if Settings.metrics_file is not None:
+            Metrics.flush(Settings.metrics_file)
+        AsyncManager.stop()
+        ConnectionSupervisor.stop()
+        TmuxControl.close_all()
+        SessionPool.close_all()
+        SSHMaster.stop_all()
         self.quit()
 
 
@@ -203,6 +250,14 @@ class RootFrame(tcw.CTkFrame):
         self.record_tabview = RecordTopicsTabView(self.tabs.tab("Record"))
         self.record_tabview.grid(row=0, column=0, sticky="nesw")
 
+        # Add state of the connection to the target device
+        self.connection_status = ConnectionStatus(self)
+        self.connection_status.grid(row=1, column=0, padx=20, sticky="e")
+
+        # Add load, memory, disk and nodes of the target device
+        self.device_status = DeviceStatus(self)
+        self.device_status.grid(row=1, column=0, padx=20, sticky="w")
+
         self.set_tab()
 
     def set_tab(self, tab: str = "Mission Preparation"):
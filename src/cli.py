@@ -87,18 +87,12 @@ class BirdWatchCli:
         # Create list of commands
         tmux_commands: List[TmuxPaneCommand] = []
 
-        for node, values in self.nodes_config.items():
-            if ("run" in values) and values["run"] is True:
-                tmux_commands.append(
-                    TmuxPaneCommand(
-                        command=values["command"],
-                        window=values["window"] if "window" in values else "",
-                        delay_ms=int(values["delay_ms"]) if "delay_ms" in values else 0,
-                    )
-                )
-
         # Run all the commands
         try:
+            for node, values in self.nodes_config.items():
+                if ("run" in values) and values["run"] is True:
+                    tmux_commands.append(TmuxPaneCommand.from_node(node, values))
+
             # source the workspace before launching the node
             source_cmd = "source " + Settings.current_device.files.workspace_path + "install/setup.{bash,zsh}"
             sh.launch_tmux(tmux_commands, pre_launch_cmd=source_cmd)